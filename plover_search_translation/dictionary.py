@@ -3,28 +3,77 @@ Dictionary entry point for Plover.
 """
 
 import sys
+import os
 import json
-from typing import Tuple, Dict, List, Optional, TypeVar, Callable, Any, Set, Iterable, Mapping
+import hashlib
+from typing import Tuple, Dict, List, Optional, TypeVar, Callable, Any, Set, Iterable, Mapping, Sequence
 import typing
 from subprocess import Popen
 import subprocess
 from threading import Lock, Thread
 import functools
-import re
 import math
 
 from plover.steno_dictionary import StenoDictionary  # type: ignore
 from plover import log  # type: ignore
+from plover.resource import resource_filename, resource_timestamp  # type: ignore
 
-from . import manager, lib
-from .lib import Entry, with_print_exception, Outline
-
-from fuzzywuzzy import fuzz  # type: ignore
+from . import manager, lib, usage, scorer, index, search, snapshot, sqlite_store
+from .lib import Entry, with_print_exception, Outline, Operation
+from .jst import write_jst
 
 current_dictionary: Optional["Dictionary"]=None
 
 T=TypeVar("T", bound=Callable)
 
+FileState=Tuple[int, int, bytes]
+"""
+Modification time (in nanoseconds), size and SHA-256 digest of a file.
+"""
+
+
+def diff_entries(old: Sequence[Entry], new: Iterable[Entry])->Tuple[
+		List[Entry], List[Tuple[Entry, Entry]], List[Entry], Set[Entry]]:
+	"""
+	Compute the modifications that turn a dictionary with entries ``old`` into one loaded from ``new``.
+
+	Return (removed entries, (old, new) pairs of edited entries, added entries, invalid entries of ``new``).
+	An entry is edited if its brief is kept but something else changes.
+	Invalid entries are dropped in the same way as `Dictionary._add_multiple` does.
+	"""
+	valid: List[Entry]=[]
+	invalid: Set[Entry]=set()
+	seen: Set[Entry]=set()
+	briefs: Set[Outline]=set()
+	for entry in new:
+		if entry in seen or entry.brief in briefs:
+			invalid.add(entry)
+			continue
+		seen.add(entry)
+		if entry.brief: briefs.add(entry.brief)
+		valid.append(entry)
+
+	old_set={*old}
+	removed_by_brief: Dict[Outline, Entry]={}
+	removed: List[Entry]=[]
+	for entry in old:
+		if entry not in seen:
+			if entry.brief and entry.brief in briefs:
+				removed_by_brief[entry.brief]=entry
+			else:
+				removed.append(entry)
+	edited: List[Tuple[Entry, Entry]]=[]
+	added: List[Entry]=[]
+	for entry in valid:
+		if entry in old_set: continue
+		old_entry=removed_by_brief.get(entry.brief) if entry.brief else None
+		if old_entry is None:
+			added.append(entry)
+		else:
+			edited.append((old_entry, entry))
+	return removed, edited, added, invalid
+
+
 def with_lock(function: T)->T:
 	@functools.wraps(function)
 	def result(self, *args, **kwargs)->Any:
@@ -37,13 +86,6 @@ def with_lock(function: T)->T:
 	return typing.cast(T, result)  # TODO?
 
 
-WORD_RX=re.compile(r"\w+|\S")
-
-
-def split_words(s: str)->List[str]:
-	return WORD_RX.findall(s)
-
-
 def ngrams(s: str, n: int)->Iterable[str]:
 	"""
 	Return all n-grams in the string.
@@ -81,31 +123,77 @@ def edit_distance_mod(query: str, a: str)->int:
 	return f[-1]  # (might be positive or negative because of the heuristic above)
 
 
-def match_score(query: str, entry: Entry)->Any: # comparable (for the same value of query), larger is better
+def edit_distance_mod_packed(query: str, a: str)->int:
 	"""
-	Return the match score for searching.
+	Same result as :func:`edit_distance_mod` (including the bonus lookup ``a[-1]`` at the first character of ``a``),
+	computed with O(log(len(a))) operations on big integers per character of the query,
+	instead of a loop over the characters of ``a``.
+
+	Substituting ``u[i]=f[i]-i``, the recurrence of a row becomes ``u'=prefix_min(x)`` where
+	``x[i]=min(u[i]+3, u[i-1]-1-bonus)`` if ``query[j]==a[i-1]``, otherwise ``u[i]+3``.
+	The values of ``u`` are stored biased, one per field of ``width`` bits of a single integer
+	(the top bit of each field is a guard bit used for the comparisons),
+	and the prefix minimum is computed by log-step doubling.
 	"""
-	# quickly filter out unlikely entries first for performance
-	if query==entry.translation or query==entry.description or lib.text_to_outline(query)==entry.brief:
-		return (math.inf, 0)
-
-	words=query.split()
-	for i, word in enumerate(words):
-		if word[-1:].lower() in ("e", "i", "y"):
-			words[i]=word[:-1]
-
-	return (
-			all(word in entry.description or word in entry.translation for word in words),
-			max(
-			fuzz.ratio(query, x)
-			for x in [entry.translation] + entry.description.split("|")
-			)
-			)
-
-class Dictionary(StenoDictionary):
+	n=len(a)
+	m=len(query)
+	bias=2*m+2  # u >= -2m
+	width=(5*m+bias+8).bit_length()+1
+	field_mask=(1<<width)-1
+	ones=((1<<(width*(n+1)))-1)//field_mask
+	all_mask=ones*field_mask
+	guards=ones<<(width-1)
+	infinity=(1<<(width-1))-1
+	infinities=ones*infinity
+
+	def minimum(x: int, y: int)->int:
+		greater_equal=(((x|guards)-y)&guards)>>(width-1)
+		select_y=(greater_equal<<width)-greater_equal
+		return (y&select_y)|(x&~select_y)
+
+	zeros="0"*(width-1)
+	equal: Dict[str, int]={
+			c: int("".join(zeros+("1" if x==c else "0") for x in reversed(a))+zeros+"0", 2)
+			for c in set(query) if c in a
+			}
+	def bonus_fields(c: str)->int:
+		result=(equal.get(c, 0)<<width)&ones
+		if n and a[-1]==c:
+			result|=1<<width
+		return result
+
+	u=ones*bias
+	previous_character=""
+	for j, c in enumerate(query):
+		match=equal.get(c, 0)
+		x=u+3*ones
+		if match:
+			subtract=match
+			if j:
+				subtract+=match&bonus_fields(previous_character)
+			match_mask=match*field_mask
+			diagonal=(((u<<width)&all_mask)&match_mask)-subtract
+			x=minimum(x, (diagonal&match_mask)|(infinities&~match_mask))
+		shift=1
+		while shift<=n:
+			shifted=((x<<(width*shift))&all_mask)|(infinities&((1<<(width*shift))-1))
+			x=minimum(x, shifted)
+			shift*=2
+		u=x
+		previous_character=c
+	return ((u>>(width*n))&field_mask)-bias+n
+
+
+class Dictionary(StenoDictionary, search.Searcher):
 	"""
 	Dictionary class.
 	"""
+	write_index_cache: bool=True
+	"""
+	Whether the index cache (see `_write_index_cache`) is written after loading a file whose cache is missing or
+	out of date. Set to False in a subclass by read-only tools, which shouldn't create files next to the dictionary.
+	"""
+
 	def __init__(self)->None:
 		super().__init__()
 		
@@ -116,7 +204,47 @@ class Dictionary(StenoDictionary):
 		Whether to pick an entry (and close the dialog immediately)
 		when the dialog is open and the user write an outline in the current_dictionary.
 		"""
+		self.federated_search: bool=False
+		"""
+		Whether the dialog opened from this dictionary searches all the enabled JST dictionaries
+		instead of only this one. New entries are still added to this dictionary.
+		"""
+		self.snapshot_search: bool=False
+		"""
+		Whether the dialog opened from this dictionary searches in the GUI process,
+		on snapshots of the searched dictionaries (see :mod:`.snapshot`).
+		"""
+		self.low_memory: bool=False
+		"""
+		Whether the descriptions are kept in a temporary file instead of in memory (see :class:`.lib.DiskEntry`),
+		for huge dictionaries on machines with little memory. Searching is slower.
+		Takes effect when the dictionary is loaded.
+
+		The savings are limited (about 15% of the memory used by a dictionary of 100000 entries,
+		see ``benchmark.py memory``): the entry objects, the briefs and the translations stay in memory,
+		and so do the search indexes. The largest of them is the word index, which holds every word
+		of the descriptions (about 33MB for 100000 entries); the suffix array of the substring index
+		is only memory-mapped when it's loaded from the index cache, in both modes.
+		"""
+		self._descriptions: Optional[lib.DescriptionStore]=None
+		"""
+		Where the descriptions of the entries are stored in low-memory mode.
+		"""
 		self.entries: List[Entry]=[]
+		self.generation: int=0
+		"""
+		Incremented whenever the entries or the pick statistics change.
+		"""
+		self._file_state: Optional[FileState]=None
+		"""
+		State of the file when it was last loaded or saved, to detect modifications by other programs.
+		"""
+		self._saves_in_progress: int=0
+		self._save_count: int=0
+		"""
+		Number of saves started. Plover saves to a temporary file, then replaces the file:
+		in between, the file is older than the recorded state, it must not be reloaded (see `save`).
+		"""
 		self.lock: Lock=Lock()
 		"""
 		A lock to ensure that there's no race condition when the dictionary is accessed
@@ -127,8 +255,31 @@ class Dictionary(StenoDictionary):
 		Dictionary that maps from the brief to the entry object.
 		"""
 
+		self.scorer: scorer.Scorer=scorer.get_scorer(scorer.DEFAULT_SCORER)
+		"""
+		The scorer used for searching, selected with the ``scorer`` field of the JST header.
+		"""
+		self.usage: usage.UsageStats=usage.UsageStats()
+		"""
+		Pick statistics of the entries, used to rank the frequently picked entries higher.
+		"""
+
+		self._substring_index: index.SubstringIndex=index.SubstringIndex()
+		self._outline_trie: index.OutlineTrie=index.OutlineTrie()
+		self._outline_tree: index.BKTree=index.BKTree()
+		self._word_index: index.WordIndex=index.WordIndex()
+		self._indexes: List[index.Index]=[self._substring_index, self._outline_trie, self._outline_tree, self._word_index]
+		"""
+		All the search indexes, which are updated by `_add`, `_edit`, `_edit_multiple` and `_remove`.
+		"""
+
 		self._longest_key=1
 
+		self._index_build: Optional[Thread]=None
+		"""
+		The thread that builds the search indexes, see `_build_indexes`.
+		"""
+
 	@with_lock
 	def __del__(self)->None:
 		if manager.instance and manager.instance.is_showing(self):
@@ -150,8 +301,11 @@ class Dictionary(StenoDictionary):
 						}) +
 					"}{^}")
 
-		result=self.dict[key].translation  # might raise KeyError
+		entry=self.dict[key]  # might raise KeyError
+		result=entry.translation
 		if self.pick_on_write and manager.instance and manager.instance.is_showing(self):
+			self.usage.record(entry)
+			self.generation+=1
 			manager.instance.last_translation=result
 			result="{:command:plover_search_translation_close_dialog}"+result
 			# (must close the dialog before sending the commands)
@@ -263,6 +417,8 @@ class Dictionary(StenoDictionary):
 
 				This can be safely set to ``False`` if it's guaranteed that the entry has a brief (outline).
 		"""
+		if self._descriptions is not None:
+			entry=lib.DiskEntry(entry, self._descriptions)
 		if entry.brief:
 			assert entry.brief!=(self.search_stroke,)
 			if entry.brief in self.dict:
@@ -272,11 +428,15 @@ class Dictionary(StenoDictionary):
 		else:
 			if check and entry in self.entries:
 				return False
+		if self._descriptions is None:
+			entry.search_fields  # precompute (not cached by DiskEntry)
 		self.entries.append(entry)
+		self.generation+=1
+		for search_index in self._indexes: search_index.add(entry)
 		return True
 
 	def _recalculate_longest_key(self)->None:
-		self._longest_key=max(len(outline) for outline in self.dict)
+		self._longest_key=max((len(outline) for outline in self.dict), default=1)
 
 	def _edit(self, old: Entry, new: Entry)->bool:
 		"""
@@ -294,6 +454,9 @@ class Dictionary(StenoDictionary):
 		if new.brief in self.dict and new.brief!=old.brief:
 			return False
 
+		if self._descriptions is not None:
+			new=lib.DiskEntry(new, self._descriptions)
+
 		if old.brief:
 			assert self.dict[old.brief]==old  # dictionary consistency, because (old in entries)
 			del self.dict[old.brief]
@@ -308,10 +471,66 @@ class Dictionary(StenoDictionary):
 			assert old.brief
 			self._recalculate_longest_key()
 
+		if self._descriptions is None:
+			new.search_fields  # precompute (not cached by DiskEntry)
 		self.entries[i]=new
+		self.generation+=1
+		for search_index in self._indexes: search_index.replace(old, new)
+		self.usage.rename(old, new)
 
 		return True
 
+	def _edit_multiple(self, edits: Iterable[Tuple[Entry, Entry]])->Set[Entry]:
+		"""
+		Like calling `_edit` on each (old, new) pair in order, but faster:
+		the entry list is scanned once instead of once per edit.
+
+		Return the set of the new entries whose edit is not successful.
+
+		Internal method. Does not lock.
+		"""
+		positions: Optional[Dict[Entry, int]]=None
+		failed: Set[Entry]=set()
+		recalculate_longest_key=False
+		for old, new in edits:
+			if old==new: continue
+			if positions is None:
+				positions={entry: i for i, entry in enumerate(self.entries)}
+			i=positions[old]  # might raise KeyError for invalid `old` value
+
+			if new in positions or (new.brief in self.dict and new.brief!=old.brief):
+				failed.add(new)
+				continue
+
+			if self._descriptions is not None:
+				new=lib.DiskEntry(new, self._descriptions)
+
+			if old.brief:
+				assert self.dict[old.brief]==old
+				del self.dict[old.brief]
+
+			if new.brief:
+				assert new.brief!=(self.search_stroke,)
+				self.dict[new.brief]=new
+				if self._longest_key<len(new.brief): self._longest_key=len(new.brief)
+
+			if old.brief!=new.brief and len(old.brief)==self._longest_key:
+				recalculate_longest_key=True
+
+			if self._descriptions is None:
+				new.search_fields  # precompute (not cached by DiskEntry)
+			del positions[old]
+			positions[new]=i
+			self.entries[i]=new
+			for search_index in self._indexes: search_index.replace(old, new)
+			self.usage.rename(old, new)
+
+		if recalculate_longest_key:
+			self._recalculate_longest_key()
+		if positions is not None:
+			self.generation+=1
+		return failed
+
 
 	def _remove(self, entry: Entry)->None:
 		"""
@@ -326,6 +545,31 @@ class Dictionary(StenoDictionary):
 		old_length=len(self.entries)
 		self.entries=[x for x in self.entries if entry!=x]
 		assert old_length-1==len(self.entries), (self.entries, old_length, entry)
+		self.generation+=1
+		for search_index in self._indexes: search_index.remove(entry)
+		self.usage.discard(entry)
+
+	def _remove_multiple(self, entries: Set[Entry])->None:
+		"""
+		Like calling `_remove` on each entry, but faster.
+
+		Internal method. Does not lock.
+		"""
+		if not entries: return
+		for entry in entries:
+			if entry.brief:
+				assert entry.brief!=(self.search_stroke,)
+				assert self.dict[entry.brief]==entry
+				del self.dict[entry.brief]
+		old_length=len(self.entries)
+		self.entries=[x for x in self.entries if x not in entries]
+		assert old_length-len(entries)==len(self.entries)
+		if any(len(entry.brief)==self._longest_key for entry in entries):
+			self._recalculate_longest_key()
+		self.generation+=1
+		for entry in entries:
+			for search_index in self._indexes: search_index.remove(entry)
+			self.usage.discard(entry)
 
 	@with_print_exception
 	@with_lock
@@ -358,6 +602,78 @@ class Dictionary(StenoDictionary):
 		"""
 		self._remove(entry)
 
+	def _check_batch(self, operations: Sequence[Operation])->bool:
+		"""
+		Return whether all the operations would succeed if `_add`, `_edit` and `_remove` were called in order.
+
+		Internal method. Does not lock.
+		"""
+		entries: Set[Entry]={*self.entries}
+		briefs: Set[Outline]={*self.dict}
+		def brief_available(brief: Outline)->bool:
+			return brief not in briefs and brief!=(self.search_stroke,)
+		for operation in operations:
+			if operation[0]=="add":
+				_kind, entry=operation
+				if entry.brief:
+					if not brief_available(entry.brief): return False
+					briefs.add(entry.brief)
+				elif entry in entries:
+					return False
+				entries.add(entry)
+			elif operation[0]=="edit":
+				_kind, old, new=operation
+				if old==new: continue
+				if old not in entries or new in entries: return False
+				if new.brief and new.brief!=old.brief and not brief_available(new.brief): return False
+				entries.remove(old)
+				briefs.discard(old.brief)
+				entries.add(new)
+				if new.brief: briefs.add(new.brief)
+			elif operation[0]=="remove":
+				_kind, entry=operation
+				if entry not in entries: return False
+				entries.remove(entry)
+				briefs.discard(entry.brief)
+			else:
+				return False
+		return True
+
+	def _apply_batch(self, operations: Sequence[Operation])->bool:
+		"""
+		Internal method. Does not lock.
+
+		See :meth:`apply_batch`.
+		"""
+		if not self._check_batch(operations):
+			return False
+		removed: Set[Entry]=set()
+		for operation in operations:
+			if operation[0]=="remove":
+				removed.add(operation[1])
+				continue
+			# consecutive removals are done at once, because each `_remove` copies the entry list
+			self._remove_multiple(removed)
+			removed=set()
+			if operation[0]=="add":
+				successful=self._add(operation[1])
+			else:
+				successful=self._edit(operation[1], operation[2])
+			assert successful
+		self._remove_multiple(removed)
+		return True
+
+	@with_print_exception
+	@with_lock
+	def apply_batch(self, operations: Sequence[Operation])->bool:
+		"""
+		Apply the operations (see :data:`.lib.Operation`) in order, with the lock held once.
+
+		Return True if all of them succeed.
+		Otherwise, return False and don't modify the dictionary.
+		"""
+		return self._apply_batch(operations)
+
 	def _add_multiple(self, entries: Iterable[Entry])->Set[Entry]:
 		"""
 		Add multiple entries to the dictionary quickly.
@@ -377,24 +693,53 @@ class Dictionary(StenoDictionary):
 			seen.add(entry)
 		return invalid_entries
 
+	def _load_header(self, data: Dict[str, Any], filename: str)->None:
+		"""
+		Set the fields stored in the JST header (see `_header`) from the loaded JSON data.
+		"""
+		self.search_stroke=data["search_stroke"]
+		self.accept_stroke=data["accept_stroke"]
+		if "pick_on_write" in data:
+			self.pick_on_write=data["pick_on_write"]
+		if "federated_search" in data:
+			self.federated_search=data["federated_search"]
+		if "snapshot_search" in data:
+			self.snapshot_search=data["snapshot_search"]
+		if "low_memory" in data:
+			self.low_memory=data["low_memory"]
+		if "scorer" in data:
+			try:
+				self.scorer=scorer.get_scorer(data["scorer"])
+			except RuntimeError as e:
+				log.warning(f"{e}, using the default scorer for {filename}")
+
 	def _load_nolock(self, filename: str)->None:
-		with open(filename, "r", encoding='u8') as f:
-			data=json.load(f)
+		with open(filename, "rb") as f:
+			content=f.read()
+		data=json.loads(content.decode("u8"))
 		version=data.get("version", 1)
 		if version==1:
-			self.search_stroke=data["search_stroke"]
-			self.accept_stroke=data["accept_stroke"]
-			if "pick_on_write" in data:
-				self.pick_on_write=data["pick_on_write"]
+			self._load_header(data, filename)
 
 			self.entries=[]
 			self._longest_key=1
+			self._descriptions=lib.DescriptionStore() if self.low_memory else None
 
 			invalid_entries=self._add_multiple(Entry.from_tuple(x) for x in data["entries"])
 
 			assert self.longest_key>=1
 			if invalid_entries:
 				log.warning(f"There are invalid entries in the dictionary -- {invalid_entries}")
+
+			self._record_file_state(filename, content)
+			if not self._load_index_cache(filename):
+				self._build_indexes(cache_filename=filename if self.write_index_cache else None)
+
+			try:
+				self.usage.load(usage.sidecar_path(filename), self.entries)
+			except Exception:
+				log.warning(f"Cannot load the usage statistics of {filename}, they are ignored")
+				self.usage=usage.UsageStats()
 		else:
 			assert False, f"Unsupported dictionary version: {version}"
 
@@ -406,28 +751,132 @@ class Dictionary(StenoDictionary):
 		"""
 		self._load_nolock(filename)
 
+	def _header(self)->Dict[str, Any]:
+		"""
+		Return the fields of the JST file other than ``version`` and ``entries``.
+		"""
+		return {
+				"search_stroke": self.search_stroke,
+				"accept_stroke": self.accept_stroke,
+				"pick_on_write": self.pick_on_write,
+				"federated_search": self.federated_search,
+				"snapshot_search": self.snapshot_search,
+				"low_memory": self.low_memory,
+				"scorer": self.scorer.name,
+				}
+
 	def _save_nolock(self, filename: str)->None:
 		with open(filename, "w", encoding='u8') as f:
-			#data={
-			#		"search_stroke": self.search_stroke,
-			#		"accept_stroke": self.accept_stroke,
-			#		"entries": [x.tuple() for x in self.entries]
-			#		}
-			#json.dump(data, f,
-			#		indent=0, ensure_ascii=False)
-			f.write('{\n'
-					'"version": 1,\n'
-					'"search_stroke": ' + json.dumps(self.search_stroke) + ',\n'
-					'"accept_stroke": ' + json.dumps(self.accept_stroke) + ',\n'
-					'"pick_on_write": ' + json.dumps(self.pick_on_write) + ',\n'
-					'"entries": [\n' +
-					",\n".join(
-						json.dumps(entry.tuple(), ensure_ascii=False) for entry in self.entries
-						) +
-					'\n'
-					']\n'
-					'}\n'
-					)
+			write_jst(f, self._header(), self.entries)
+		self._record_file_state(filename)
+
+	def _record_file_state(self, filename: str, content: Optional[bytes]=None)->None:
+		"""
+		Record the state of the file, which has just been loaded (with the given content) or saved.
+
+		Internal method, does not lock.
+		"""
+		stat=os.stat(filename)
+		if content is None:
+			with open(filename, "rb") as f:
+				content=f.read()
+		self._file_state=(stat.st_mtime_ns, stat.st_size, hashlib.sha256(content).digest())
+
+	def reload_if_changed(self)->bool:
+		"""
+		If the file has been modified by another program since it was last loaded or saved,
+		apply the difference to the dictionary (instead of reloading it from scratch).
+
+		The file is parsed and compared before locking, the lock is only held while the difference is applied.
+		The indexes are updated incrementally, and the pick statistics of the unmodified entries are kept.
+
+		Return whether the dictionary is modified. The dictionary must not be already locked.
+		"""
+		filename=self.path
+		file_state=self._file_state
+		save_count=self._save_count
+		if not filename or file_state is None or self._saves_in_progress:
+			return False
+		try:
+			stat=os.stat(filename)
+		except FileNotFoundError:
+			return False
+		if (stat.st_mtime_ns, stat.st_size)==file_state[:2]:
+			return False
+
+		with open(filename, "rb") as f:
+			content=f.read()
+		new_file_state: FileState=(stat.st_mtime_ns, stat.st_size, hashlib.sha256(content).digest())
+		if new_file_state[2]==file_state[2]:
+			return self._touched(new_file_state, save_count)
+		try:
+			data=json.loads(content.decode("u8"))
+		except ValueError:
+			return False  # probably being written, try again later
+		version=data.get("version", 1)
+		if version!=1:
+			log.warning(f"Unsupported dictionary version: {version} -- {filename}")
+			return False
+		new_entries=[Entry.from_tuple(x) for x in data["entries"]]
+		for entry in new_entries: entry.search_fields  # precompute
+
+		generation=self.generation
+		difference=diff_entries(list(self.entries), new_entries)
+		return self._apply_reload(filename, data, new_entries, generation, difference, new_file_state, stat.st_mtime,
+				save_count)
+
+	@with_lock
+	def _touched(self, file_state: FileState, save_count: int)->bool:
+		"""
+		See `reload_if_changed`.
+		"""
+		if not self._saves_in_progress and self._save_count==save_count:
+			self._file_state=file_state
+		return False
+
+	@with_lock
+	def _apply_reload(self, filename: str, data: Dict[str, Any], new_entries: List[Entry], generation: int,
+			difference: Tuple[List[Entry], List[Tuple[Entry, Entry]], List[Entry], Set[Entry]],
+			file_state: FileState, timestamp: float, save_count: int)->bool:
+		"""
+		See `reload_if_changed`. ``difference`` is computed against the entries at ``generation``,
+		from the file read when ``save_count`` saves were started.
+		"""
+		if self._saves_in_progress or self._save_count!=save_count:
+			return False  # the file that was read is older than the saved entries
+		if self.generation!=generation:
+			difference=diff_entries(self.entries, new_entries)  # modified in the meantime
+		removed, edited, added, invalid_entries=difference
+
+		self._load_header(data, filename)
+		# each step scans the entry list at most once, so that the lock isn't held for too long on large dictionaries
+		self._remove_multiple({*removed})
+		invalid_entries|=self._edit_multiple(edited)
+		for entry in added:
+			# no need to check: the entries that are kept and the added ones are distinct valid entries of the file
+			if not self._add(entry, check=False):
+				invalid_entries.add(entry)
+		if invalid_entries:
+			log.warning(f"There are invalid entries in the dictionary -- {invalid_entries}")
+
+		self._file_state=file_state
+		self.timestamp=timestamp  # so that Plover doesn't reload it again
+		return bool(removed or edited or added)
+
+	def save(self)->None:
+		"""
+		Save the dictionary (see :meth:`plover.steno_dictionary.StenoDictionary.save`).
+
+		The file is not reloaded while it's being saved, see `reload_if_changed`.
+		"""
+		with self.lock:
+			self._saves_in_progress+=1
+			self._save_count+=1
+		try:
+			super().save()
+		finally:
+			with self.lock:
+				self._saves_in_progress-=1
 
 	@with_lock
 	@with_print_exception
@@ -437,18 +886,190 @@ class Dictionary(StenoDictionary):
 		"""
 		self._save_nolock(filename)
 
-	def _search(self, query: str)->List[Entry]:
+	def _build_indexes(self, substring_index_only: bool=False, cache_filename: Optional[str]=None)->None:
 		"""
-		Return the entries that match the query.
+		Start building the suffix array of the substring index and the BK-tree of the briefs
+		in a background thread.
+
+		If ``cache_filename`` is given, the index cache of that file is written once they're built
+		(see `_write_index_cache`).
+
+		Internal method, does not lock.
+		"""
+		builds=[self._substring_index.start_build(self.entries)]
+		if not substring_index_only:
+			builds.append(self._outline_tree.start_build(self.entries))
+			builds.append(self._word_index.start_build(self.entries))
+		if cache_filename is not None:
+			generation=self.generation
+			builds.append(lambda: self._write_index_cache(cache_filename, generation))
+		self._start_index_build(builds)
+
+	def _start_index_build(self, builds: List[Callable[[], None]])->None:
+		"""
+		Run the ``start_build`` results of the indexes in a background thread.
+
+		Internal method, does not lock.
+		"""
+		self._index_build=Thread(
+				target=lambda: [build() for build in builds],
+				name="plover_search_translation index build",
+				daemon=True,
+				)
+		self._index_build.start()
+
+	def _load_index_cache(self, filename: str)->bool:
+		"""
+		Use the indexes of the index cache of the file (see :func:`.snapshot.cache_path`) instead of building them,
+		if it's written for the current content of the file. Return whether it's used.
+		The word index is not cached, it's still built in the background.
+
+		The entries are still parsed from the file, only the suffix array and the BK-tree are taken from the cache:
+		the entries are needed anyway, and decoding them from the cache is not faster than parsing the JSON.
+
+		Internal method, does not lock. Must be called right after the file is loaded.
+		"""
+		assert self._file_state is not None
+		path=snapshot.cache_path(filename)
+		try:
+			cache=snapshot.Snapshot(path)
+		except FileNotFoundError:
+			return False
+		except Exception:
+			log.warning(f"Cannot read the index cache {path}, the indexes are rebuilt")
+			return False
+		if cache.content_hash!=self._file_state[2].hex() or cache.entry_count()!=len(self.entries):
+			return False
+		suffix_array=cache.suffix_array(self.entries)
+		outline_tree=cache.outline_tree(self.entries)
+		if suffix_array is None or outline_tree is None:
+			return False
+		self._substring_index.install(suffix_array)
+		self._outline_tree.install(*outline_tree)
+		self._start_index_build([self._word_index.start_build(self.entries)])
+		return True
+
+	def _write_index_cache(self, filename: str, generation: int)->None:
+		"""
+		Write the index cache of the file, if the dictionary is still at ``generation``
+		(the generation loaded from the file) and its indexes are built.
+
+		Run in the thread that builds the indexes, once they're built.
+		"""
+		with self.lock:
+			if self.generation!=generation or self._file_state is None: return
+			suffix_array, added, removed=self._substring_index.state()
+			outline_tree=self._outline_tree.export()
+			if suffix_array is None or added or removed or outline_tree is None: return
+			data=snapshot.SnapshotData(
+					dictionary=filename,
+					generation=generation,
+					scorer=self.scorer.name,
+					entries=list(self.entries),
+					boosts={},
+					hot=[],
+					suffix_array=suffix_array,
+					added=[],
+					removed=set(),
+					content_hash=self._file_state[2].hex(),
+					outline_tree=outline_tree,
+					)
+		try:
+			snapshot.write_snapshot(snapshot.cache_path(filename), data)
+		except OSError as e:
+			log.warning(f"Cannot write the index cache of {filename}: {e}")
+
+	def wait_for_indexes(self)->None:
+		"""
+		Wait until the search indexes started by the latest load are built.
+
+		The matches up to typos need the word index, and the order of equally good outline prefix matches depends on
+		whether the substring index is built (see :meth:`.search.Searcher._search_scored`),
+		so scripts that compare results should call this first.
+		"""
+		index_build=self._index_build
+		if index_build is not None:
+			index_build.join()
+
+	def _candidates(self, words: Sequence[str], deadline: Optional[float]=None)->Optional[List[Entry]]:
+		if self._substring_index.needs_rebuild():
+			self._build_indexes(substring_index_only=True)
+		return self._substring_index.candidates(words, deadline)
+
+	def _with_outline_prefix(self, prefix: str, limit: int)->List[Entry]:
+		return self._outline_trie.with_prefix(prefix, limit)
+
+	def _entries_with_close_word(self, word: str)->Dict[Entry, None]:
+		return self._word_index.entries_with_close_word(word)
+
+	def _outlines_within(self, outline: Outline, max_distance: int)->List[Tuple[int, Entry]]:
+		"""
+		See :meth:`.search.Searcher._outlines_within`.
+
+		The BK-tree is used if it's built, otherwise all the briefs are compared.
 
 		Internal method, does not lock.
 		"""
-		if query=="":
-			return self.entries[:100]
-		return sorted(
-				self.entries,
-				key=lambda entry: match_score(query, entry),
-				reverse=True)[:100]
+		result=self._outline_tree.within(outline, max_distance)
+		if result is None:
+			result=super()._outlines_within(outline, max_distance)
+		return result
+
+	@with_lock
+	def search_scored(self, query: str)->List[Tuple[Any, Entry]]:
+		"""
+		See :meth:`_search_scored`.
+		"""
+		return self._search_scored(query)
+
+	@with_lock
+	def search_page_scored(self, query: str, offset: int, count: int=100)->Tuple[List[Tuple[Any, Entry]], bool]:
+		"""
+		See :meth:`.search.Searcher._search_page`.
+		"""
+		return self._search_page(query, offset, count)
+
+	@with_lock
+	def outlines_within(self, outline: Outline, max_distance: int)->List[Tuple[int, Entry]]:
+		"""
+		See :meth:`_outlines_within`.
+		"""
+		return self._outlines_within(outline, max_distance)
+
+	@with_lock
+	def search_hot_scored(self, query: str)->List[Tuple[Any, Entry]]:
+		"""
+		See :meth:`_search_hot_scored`.
+		"""
+		return self._search_hot_scored(query)
+
+	@with_lock
+	def record_pick(self, entry: Entry)->None:
+		"""
+		Record that the entry is picked by the user.
+		"""
+		self.usage.record(entry)
+		self.generation+=1
+
+	@with_lock
+	def snapshot_data(self)->snapshot.SnapshotData:
+		"""
+		Return the data to write to a snapshot of the dictionary, see :func:`.snapshot.write_snapshot`.
+
+		This is cheap: the entries and the suffix array are immutable, only the lists are copied.
+		"""
+		suffix_array, added, removed=self._substring_index.state()
+		return snapshot.SnapshotData(
+				dictionary=self.path,
+				generation=self.generation,
+				scorer=self.scorer.name,
+				entries=list(self.entries),
+				boosts=self.usage.boosts(),
+				hot=list(self.usage.hot()),
+				suffix_array=suffix_array,
+				added=added,
+				removed=removed,
+				)
 
 	@with_lock
 	def search(self, query: str)->List[Entry]:
@@ -457,6 +1078,24 @@ class Dictionary(StenoDictionary):
 		"""
 		return self._search(query)
 
+	@with_lock
+	def search_until(self, query: str, deadline: float)->Tuple[List[Entry], bool]:
+		"""
+		Like :meth:`search`, but return once ``deadline`` (a :func:`time.monotonic` value) passes,
+		with the best matches found so far. Also return whether the result is complete.
+
+		See :meth:`.search.Searcher._search_scored_until`.
+		"""
+		result, complete=self._search_scored_until(query, deadline)
+		return [entry for _score, entry in result], complete
+
+	@with_lock
+	def search_scored_until(self, query: str, deadline: float)->Tuple[List[Tuple[Any, Entry]], bool]:
+		"""
+		See :meth:`.search.Searcher._search_scored_until`.
+		"""
+		return self._search_scored_until(query, deadline)
+
 	def _reverse_lookup(self, translation: str, case_sensitive: bool)->List[Tuple[str, ...]]:
 		"""
 		Return the list of outlines that matches the translation.
@@ -467,7 +1106,7 @@ class Dictionary(StenoDictionary):
 			return [entry.brief for entry in self.entries if entry.translation==translation]
 		else:
 			translation=translation.casefold()
-			return [entry.brief for entry in self.entries if entry.translation.casefold()==translation]
+			return [entry.brief for entry in self.entries if entry.search_fields.translation_casefolded==translation]
 
 	@with_lock
 	def reverse_lookup(self, value: str)->List[Tuple[str, ...]]:
@@ -482,3 +1121,225 @@ class Dictionary(StenoDictionary):
 		Refer to the method in StenoDictionary class.
 		"""
 		return self._reverse_lookup(value, case_sensitive=False)
+
+
+class SqliteDictionary(Dictionary):
+	"""
+	Dictionary stored in an SQLite database (``.jstdb`` file, see :mod:`.sqlite_store`), for huge dictionaries.
+
+	The entries are not kept in memory: lookups, modifications and reverse lookups are queries on the database,
+	and searches score the entries that the FTS5 table finds to contain the query words
+	(or all the entries, streamed from the database, if there are few of them).
+	Modifications are committed when the dictionary is saved, which happens right after each one.
+
+	Unlike :class:`Dictionary`, query words with typos don't match (there's no word index),
+	and the ``low_memory`` and ``snapshot_search`` header fields are ignored.
+	JST dictionaries are converted with ``plover-search-translation-jst-tool to-sqlite``.
+	"""
+	def __init__(self)->None:
+		super().__init__()
+		self._store: sqlite_store.Store=sqlite_store.Store()
+		self.entries=sqlite_store.EntrySequence(self._store)  # type: ignore
+		self.dict=sqlite_store.BriefMapping(self._store)  # type: ignore
+		self._indexes=[]
+
+	@with_lock
+	def clear(self)->None:
+		"""
+		Clear the dictionary. ``search_stroke`` remains.
+		"""
+		self._store.clear()
+		self._longest_key=1
+		self.generation+=1
+
+	def _add(self, entry: Entry, check: bool=True)->bool:
+		"""
+		Internal method. Does not lock.
+
+		See :meth:`add`. Duplicates are rejected by the database constraints, so ``check`` is ignored.
+		"""
+		if entry.brief:
+			assert entry.brief!=(self.search_stroke,)
+		if not self._store.add(entry):
+			return False
+		if self._longest_key<len(entry.brief): self._longest_key=len(entry.brief)
+		self.generation+=1
+		return True
+
+	def _recalculate_longest_key(self)->None:
+		self._longest_key=self._store.longest_key()
+
+	def _edit(self, old: Entry, new: Entry)->bool:
+		"""
+		Internal method. Does not lock.
+
+		See :meth:`edit`.
+		"""
+		if old==new: return True
+		if old not in self.entries:
+			raise ValueError(f"{old} is not in the dictionary")
+		if new in self.entries:
+			return False  # because new!=old
+		if new.brief and new.brief!=old.brief and new.brief in self.dict:
+			return False
+		if new.brief:
+			assert new.brief!=(self.search_stroke,)
+		self._store.update(old, new)
+		if self._longest_key<len(new.brief): self._longest_key=len(new.brief)
+		if old.brief!=new.brief and len(old.brief)==self._longest_key:
+			self._recalculate_longest_key()
+		self.generation+=1
+		self.usage.rename(old, new)
+		return True
+
+	def _edit_multiple(self, edits: Iterable[Tuple[Entry, Entry]])->Set[Entry]:
+		"""
+		See :meth:`Dictionary._edit_multiple`. Each edit looks the entries up in the database.
+
+		Internal method. Does not lock.
+		"""
+		return {new for old, new in edits if not self._edit(old, new)}
+
+	def _remove(self, entry: Entry)->None:
+		"""
+		Internal method. Does not lock.
+		"""
+		self._remove_multiple({entry})
+
+	def _remove_multiple(self, entries: Set[Entry])->None:
+		"""
+		Internal method. Does not lock.
+		"""
+		if not entries: return
+		removed=self._store.remove(entries)
+		assert removed==len(entries), entries
+		if any(len(entry.brief)==self._longest_key for entry in entries):
+			self._recalculate_longest_key()
+		self.generation+=1
+		for entry in entries:
+			self.usage.discard(entry)
+
+	def _check_batch(self, operations: Sequence[Operation])->bool:
+		"""
+		See :meth:`Dictionary._check_batch`. The entries and the briefs are looked up in the database,
+		only the modifications made by the earlier operations are kept in sets.
+
+		Internal method. Does not lock.
+		"""
+		added: Set[Entry]=set()
+		removed: Set[Entry]=set()
+		added_briefs: Set[Outline]=set()
+		removed_briefs: Set[Outline]=set()
+		def contains(entry: Entry)->bool:
+			return entry in added or (entry not in removed and entry in self.entries)
+		def brief_available(brief: Outline)->bool:
+			return (brief not in added_briefs and (brief in removed_briefs or brief not in self.dict)
+					and brief!=(self.search_stroke,))
+		def add(entry: Entry)->None:
+			added.add(entry)
+			removed.discard(entry)
+			if entry.brief:
+				added_briefs.add(entry.brief)
+				removed_briefs.discard(entry.brief)
+		def remove(entry: Entry)->None:
+			removed.add(entry)
+			added.discard(entry)
+			if entry.brief:
+				removed_briefs.add(entry.brief)
+				added_briefs.discard(entry.brief)
+		for operation in operations:
+			if operation[0]=="add":
+				_kind, entry=operation
+				if entry.brief:
+					if not brief_available(entry.brief): return False
+				elif contains(entry):
+					return False
+				add(entry)
+			elif operation[0]=="edit":
+				_kind, old, new=operation
+				if old==new: continue
+				if not contains(old) or contains(new): return False
+				if new.brief and new.brief!=old.brief and not brief_available(new.brief): return False
+				remove(old)
+				add(new)
+			elif operation[0]=="remove":
+				_kind, entry=operation
+				if not contains(entry): return False
+				remove(entry)
+			else:
+				return False
+		return True
+
+	def _add_multiple(self, entries: Iterable[Entry])->Set[Entry]:
+		"""
+		See :meth:`Dictionary._add_multiple`.
+		Does not lock.
+		"""
+		return {entry for entry in entries if not self._add(entry)}
+
+	def _load_nolock(self, filename: str)->None:
+		self._store.open(filename)
+		self._load_header(self._store.header(), filename)
+		self.low_memory=False
+		self.snapshot_search=False
+		self._recalculate_longest_key()
+		self.generation+=1
+		try:
+			self.usage.load(usage.sidecar_path(filename), sqlite_store.EntrySet(self._store))
+		except Exception:
+			log.warning(f"Cannot load the usage statistics of {filename}, they are ignored")
+			self.usage=usage.UsageStats()
+
+	def _save_nolock(self, filename: str)->None:
+		self._store.set_header(self._header())
+		self._store.save(filename)
+
+	def save(self)->None:
+		"""
+		Commit the modifications to the database.
+
+		(Plover's implementation writes a new file and replaces the old one, which would copy the whole database)
+		"""
+		assert not self.readonly
+		filename=resource_filename(self.path)
+		self._save(filename)
+		self.timestamp=resource_timestamp(filename)
+
+	@with_lock
+	def reload_if_changed(self)->bool:
+		"""
+		If another program has committed modifications to the database since the last call,
+		invalidate the state that depends on the entries. (the entries are always read from the database)
+
+		Return whether the dictionary is modified. The dictionary must not be already locked.
+		"""
+		if not self._store.changed_externally():
+			return False
+		self._recalculate_longest_key()
+		self.generation+=1
+		return True
+
+	def _candidates(self, words: Sequence[str], deadline: Optional[float]=None)->Optional[List[Entry]]:
+		return self._store.containing(words, deadline)
+
+	def _with_outline_prefix(self, prefix: str, limit: int)->List[Entry]:
+		return self._store.with_brief_prefix(prefix, limit)
+
+	def _entries_with_close_word(self, word: str)->Dict[Entry, None]:
+		return {}
+
+	def _outlines_within(self, outline: Outline, max_distance: int)->List[Tuple[int, Entry]]:
+		"""
+		See :meth:`.search.Searcher._outlines_within`. All the briefs are compared.
+
+		Internal method, does not lock.
+		"""
+		return search.Searcher._outlines_within(self, outline, max_distance)
+
+	def _reverse_lookup(self, translation: str, case_sensitive: bool)->List[Tuple[str, ...]]:
+		"""
+		Return the list of outlines that matches the translation.
+
+		Internal method, does not lock.
+		"""
+		return self._store.with_translation(translation, case_sensitive)
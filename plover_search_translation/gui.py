@@ -8,7 +8,7 @@ is handled in .process module.
 
 from __future__ import annotations
 
-from typing import Tuple, List, Any
+from typing import Tuple, List, Any, Optional
 import typing
 import functools
 
@@ -94,6 +94,15 @@ class SearchTranslationDialog(QDialog, Ui_SearchTranslationDialog):
 			return 0
 		return row
 
+	def rows(self)->List[int]:
+		"""
+		Get the indices of the selected rows in increasing order, or ``[row()]`` if none is selected.
+
+		Raise RuntimeError if there's no row.
+		"""
+		rows=sorted({index.row() for index in self.matches.selectionModel().selectedRows()})
+		return rows or [self.row()]
+
 	def refresh_vertical_header(self, row: int)->None:
 		item=self.matches.verticalHeaderItem(row)
 		if item is None:
@@ -105,7 +114,21 @@ class SearchTranslationDialog(QDialog, Ui_SearchTranslationDialog):
 		for row in range(self.matches.rowCount()):
 			self.refresh_vertical_header(row)
 
-	def set_row_data(self, row: int, entry: Entry)->None:
+	def get_row_source(self, row: int)->Optional[str]:
+		"""
+		Get the path of the dictionary the entry in the row comes from,
+		or None if it's the dictionary the dialog is opened from.
+		"""
+		item=self.matches.item(row, 0)
+		if item is None:
+			return None
+		return item.data(Qt.ItemDataRole.UserRole)
+
+	def set_row_data(self, row: int, entry: Entry, source: Optional[str]=None)->None:
+		"""
+		Parameters:
+			source: see :meth:`get_row_source`.
+		"""
 		data=entry.tuple()
 
 		for i in range(3):
@@ -114,3 +137,6 @@ class SearchTranslationDialog(QDialog, Ui_SearchTranslationDialog):
 				item=QTableWidgetItem()
 				self.matches.setItem(row, i, item)
 			item.setText("/".join(data[2]) if i==2 else data[i])
+			item.setToolTip(source or "")
+			if i==0:
+				item.setData(Qt.ItemDataRole.UserRole, source)
@@ -0,0 +1,830 @@
+"""
+Search indexes of a dictionary.
+
+The dictionary calls :meth:`Index.add` and :meth:`Index.remove` (with its lock held)
+whenever an entry is added or removed, so that the indexes never need to be rebuilt from scratch
+because of a modification.
+"""
+
+import array
+import bisect
+import functools
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .lib import Entry, Outline
+
+
+class Index:
+	"""
+	Base class of the search indexes.
+	"""
+	def add(self, entry: Entry)->None:
+		raise NotImplementedError
+
+	def remove(self, entry: Entry)->None:
+		raise NotImplementedError
+
+	def replace(self, old: Entry, new: Entry)->None:
+		"""
+		Called when ``old`` is edited into ``new``. Same as :meth:`remove` then :meth:`add`,
+		but the indexes of the briefs don't need to be updated if the brief is unchanged.
+		"""
+		self.remove(old)
+		self.add(new)
+
+
+@dataclass(frozen=True)
+class _SuffixArray:
+	entries: List[Entry]
+	"""
+	The entries the suffix array is built from. Entries are referred to by their index in this list.
+	"""
+	text: bytes
+	"""
+	The distinct tokens (maximal runs of non-whitespace characters) of the descriptions and translations,
+	UTF-8 encoded, each followed by a newline.
+	"""
+	token_starts: "array.array[int]"
+	"""
+	Offset of each token in :attr:`text`, in increasing order.
+	"""
+	suffixes: "array.array[int]"
+	"""
+	Offsets in :attr:`text` of the suffixes that start at a character boundary,
+	sorted by their first :data:`SUFFIX_SORT_LENGTH` bytes.
+	"""
+	postings: List["array.array[int]"]
+	"""
+	For each token, the sorted indices of the entries that contain it.
+	"""
+
+
+SUFFIX_SORT_LENGTH: int=32
+"""
+Only this many bytes of each suffix are taken into account for sorting.
+Longer query words are located by their prefix, then verified.
+"""
+
+MAX_DELTA_FRACTION: float=0.25
+"""
+Rebuild the suffix array once the entries added or removed since it was built
+make up more than this fraction of the dictionary.
+"""
+
+
+def _build_suffix_array(entries: List[Entry])->_SuffixArray:
+	token_ids: Dict[str, int]={}
+	postings: List["array.array[int]"]=[]
+	for entry_index, entry in enumerate(entries):
+		for token in set(entry.search_fields.haystack.split()):
+			token_id=token_ids.get(token)
+			if token_id is None:
+				token_id=token_ids[token]=len(postings)
+				postings.append(array.array("i"))
+			postings[token_id].append(entry_index)
+
+	encoded_tokens=[token.encode("u8") for token in token_ids]
+	token_starts=array.array("i")
+	offset=0
+	for encoded_token in encoded_tokens:
+		token_starts.append(offset)
+		offset+=len(encoded_token)+1
+	text=b"\n".join(encoded_tokens)+b"\n"
+
+	# bucket the suffixes by their first byte to keep the individual sorts small
+	buckets: List[List[int]]=[[] for _ in range(256)]
+	appends=[bucket.append for bucket in buckets]
+	for position, byte in enumerate(text):
+		appends[byte](position)
+	suffixes=array.array("i")
+	for byte, bucket in enumerate(buckets):
+		if byte==0x0a or 0x80<=byte<0xc0:
+			continue  # newline or UTF-8 continuation byte
+		bucket.sort(key=lambda position: text[position:position+SUFFIX_SORT_LENGTH])
+		suffixes.extend(bucket)
+
+	return _SuffixArray(
+			entries=entries,
+			text=text,
+			token_starts=token_starts,
+			suffixes=suffixes,
+			postings=postings,
+			)
+
+
+class SubstringIndex(Index):
+	"""
+	Find the entries whose description or translation contains every query word,
+	by intersecting the posting lists of the words instead of scanning all the entries.
+
+	Because a query word contains no whitespace, it's contained in an entry iff it's contained in one of its tokens.
+	A suffix array over the distinct tokens gives the tokens containing a word,
+	and the posting lists map tokens to entries.
+
+	The suffix array is built in the background, from a snapshot of the entries.
+	Entries added or removed afterwards are recorded separately and taken into account by :meth:`candidates`.
+	"""
+	def __init__(self)->None:
+		self._suffix_array: Optional[_SuffixArray]=None
+		self._snapshot: Optional[List[Entry]]=None
+		"""
+		The entries that the suffix array (being built or already built) corresponds to.
+		None if no build has been started.
+		"""
+		self._added: Dict[Entry, None]={}
+		"""
+		Entries added since the snapshot (used as an ordered set).
+		"""
+		self._removed: Set[Entry]=set()
+		"""
+		Entries of the snapshot removed since the snapshot.
+		"""
+		self._install_lock: threading.Lock=threading.Lock()
+
+	def start_build(self, entries: Sequence[Entry])->Callable[[], None]:
+		"""
+		Take a snapshot of the entries, and return a function that builds the suffix array for it.
+
+		The returned function doesn't need the dictionary lock, and is meant to be run in a background thread.
+		Until it finishes, :meth:`candidates` returns None.
+		"""
+		snapshot=list(entries)
+		with self._install_lock:
+			self._snapshot=snapshot
+			self._suffix_array=None
+		self._added={}
+		self._removed=set()
+
+		def build()->None:
+			suffix_array=_build_suffix_array(snapshot)
+			with self._install_lock:
+				if self._snapshot is snapshot:  # otherwise another build has been started
+					self._suffix_array=suffix_array
+		return build
+
+	def install(self, suffix_array: _SuffixArray)->None:
+		"""
+		Use a suffix array built beforehand (see :mod:`.snapshot`) for the given entries,
+		instead of building it.
+		"""
+		with self._install_lock:
+			self._snapshot=suffix_array.entries
+			self._suffix_array=suffix_array
+		self._added={}
+		self._removed=set()
+
+	def add(self, entry: Entry)->None:
+		if self._snapshot is None: return
+		if entry in self._removed:
+			self._removed.discard(entry)
+		else:
+			self._added[entry]=None
+
+	def remove(self, entry: Entry)->None:
+		if self._snapshot is None: return
+		if entry in self._added:
+			del self._added[entry]
+		else:
+			self._removed.add(entry)
+
+	def needs_rebuild(self)->bool:
+		"""
+		Return whether too many entries have been modified since the snapshot.
+		"""
+		if self._snapshot is None: return False
+		return len(self._added)+len(self._removed)>max(1000, len(self._snapshot)*MAX_DELTA_FRACTION)
+
+	def state(self)->Tuple[Optional[_SuffixArray], List[Entry], Set[Entry]]:
+		"""
+		Return the suffix array (None if it's not built yet),
+		the entries added since its snapshot, and the entries of the snapshot removed since then.
+		"""
+		return self._suffix_array, list(self._added), set(self._removed)
+
+	def candidates(self, words: Sequence[str], deadline: Optional[float]=None)->Optional[List[Entry]]:
+		"""
+		Return the entries whose description or translation contains all the ``words``,
+		in the order they were added to the dictionary (approximately).
+
+		The words must not contain whitespace.
+		Return None if the suffix array is not ready, if the words don't restrict the result,
+		or if ``deadline`` (a :func:`time.monotonic` value) passes before the result is computed.
+		"""
+		suffix_array=self._suffix_array
+		if suffix_array is None:
+			return None
+		removed=self._removed
+		entries=suffix_array.entries
+		return find_candidates(
+				suffix_array,
+				words,
+				lambda i: None if entries[i] in removed else entries[i],
+				self._added,
+				deadline)
+
+
+def _token_ids(suffix_array: _SuffixArray, word: bytes)->Set[int]:
+	"""
+	Return the ids of the tokens that contain ``word``, which may be a superset
+	if ``word`` is longer than :data:`SUFFIX_SORT_LENGTH`.
+	"""
+	text=suffix_array.text
+	suffixes=suffix_array.suffixes
+	prefix=word[:SUFFIX_SORT_LENGTH]
+	length=len(prefix)
+	low=bisect.bisect_left(suffixes, prefix, key=lambda position: text[position:position+length])
+	high=bisect.bisect_right(suffixes, prefix, lo=low, key=lambda position: text[position:position+length])
+	token_starts=suffix_array.token_starts
+	return {bisect.bisect_right(token_starts, suffixes[i])-1 for i in range(low, high)}
+
+
+def find_candidates(suffix_array: _SuffixArray, words: Sequence[str],
+		entry_at: Callable[[int], Optional[Entry]], added: Iterable[Entry],
+		deadline: Optional[float]=None)->Optional[List[Entry]]:
+	"""
+	Implementation of :meth:`SubstringIndex.candidates`.
+
+	The entries of the suffix array are not accessed directly, but through ``entry_at``,
+	which returns None for the entries that have been removed since.
+	``added`` are the entries that are not in the suffix array.
+
+	Only the ``text``, ``token_starts``, ``suffixes`` and ``postings`` fields of the suffix array are used,
+	they can be any sequence type of the same element type (see :mod:`.snapshot`).
+	"""
+	words=[word for word in words if word]
+	if not words:
+		return None
+
+	per_word: List[List[Sequence[int]]]=[
+			[suffix_array.postings[token_id] for token_id in _token_ids(suffix_array, word.encode("u8"))]
+			for word in words
+			]
+	per_word.sort(key=lambda postings: sum(map(len, postings)))
+	entry_indices: Optional[Set[int]]=None
+	for postings in per_word:
+		if entry_indices is not None and sum(map(len, postings))>len(entry_indices)*8:
+			break  # not worth intersecting, the remaining words are checked below
+		word_entry_indices: Set[int]=set()
+		for posting in postings:
+			word_entry_indices.update(posting)
+		entry_indices=word_entry_indices if entry_indices is None else entry_indices&word_entry_indices
+		if not entry_indices: break
+		if deadline is not None and time.monotonic()>=deadline: return None
+	assert entry_indices is not None
+
+	def contains_all_words(entry: Entry)->bool:
+		haystack=entry.search_fields.haystack
+		return all(word in haystack for word in words)
+
+	result: List[Entry]=[]
+	for count, i in enumerate(sorted(entry_indices), 1):
+		entry=entry_at(i)
+		if entry is not None and contains_all_words(entry):
+			result.append(entry)
+		if deadline is not None and count%1024==0 and time.monotonic()>=deadline: return None
+	result.extend(entry for entry in added if contains_all_words(entry))
+	return result
+
+
+class _TrieNode:
+	__slots__=("children", "entry")
+
+	def __init__(self)->None:
+		self.children: Dict[str, "_TrieNode"]={}
+		self.entry: Optional[Entry]=None
+
+
+class OutlineTrie(Index):
+	"""
+	Trie of the briefs, keyed by stroke, to find all the entries whose brief starts with a partial outline.
+	"""
+	def __init__(self)->None:
+		self._root: _TrieNode=_TrieNode()
+
+	def add(self, entry: Entry)->None:
+		if not entry.brief: return
+		node=self._root
+		for stroke in entry.brief:
+			child=node.children.get(stroke)
+			if child is None:
+				child=node.children[stroke]=_TrieNode()
+			node=child
+		assert node.entry is None, (node.entry, entry)
+		node.entry=entry
+
+	def remove(self, entry: Entry)->None:
+		if not entry.brief: return
+		path: List[_TrieNode]=[self._root]
+		for stroke in entry.brief:
+			path.append(path[-1].children[stroke])
+		assert path[-1].entry==entry
+		path[-1].entry=None
+		# remove the nodes that became empty
+		for stroke, parent, node in zip(reversed(entry.brief), reversed(path[:-1]), reversed(path)):
+			if node.children or node.entry is not None:
+				break
+			del parent.children[stroke]
+
+	def replace(self, old: Entry, new: Entry)->None:
+		if old.brief!=new.brief or not new.brief:
+			super().replace(old, new)
+			return
+		node=self._root
+		for stroke in old.brief:
+			node=node.children[stroke]
+		assert node.entry==old
+		node.entry=new
+
+	def with_prefix(self, prefix: str, limit: int)->List[Entry]:
+		"""
+		Return (at most ``limit``) entries whose brief starts with ``prefix``, shorter briefs first.
+
+		``prefix`` is a partial outline with the strokes separated by ``/``.
+		All strokes but the last one must match exactly, the last stroke only needs to be a prefix of the stroke
+		(so ``STPH/`` matches the briefs with at least two strokes, the first one being ``STPH``).
+		"""
+		*complete_strokes, partial_stroke=prefix.split("/")
+		node=self._root
+		for stroke in complete_strokes:
+			child=node.children.get(stroke)
+			if child is None:
+				return []
+			node=child
+		level: List[_TrieNode]=[
+				child for stroke, child in node.children.items()
+				if stroke.startswith(partial_stroke)
+				]
+		result: List[Entry]=[]
+		while level and len(result)<limit:
+			result.extend(node.entry for node in level if node.entry is not None)
+			level=[child for node in level for child in node.children.values()]
+		return result[:limit]
+
+
+@functools.lru_cache(maxsize=None)
+def stroke_key_bits(stroke: str)->int:
+	"""
+	Return the set of keys of a stroke (such as ``KWR-``, ``TKPWOEU`` or ``-FT``) as a bit mask.
+
+	Keys before the vowels and the hyphen are left-hand keys, keys after them are right-hand keys.
+	Unknown characters (such as digits) are treated as keys of their own.
+	"""
+	bits=0
+	right=False
+	for c in stroke:
+		if c=="-":
+			right=True
+			continue
+		if c in "AO*EU":
+			right=True
+			key=c
+		elif c=="#":
+			key=c
+		else:
+			key=("-" if right else "")+c
+		bits|=1<<_key_bit(key)
+	return bits
+
+
+_key_bits: Dict[str, int]={
+		key: bit
+		for bit, key in enumerate([*"#STKPWHRAO*EU", *("-"+key for key in "FRPBLGTSDZ")])
+		}
+
+def _key_bit(key: str)->int:
+	return _key_bits.setdefault(key, len(_key_bits))
+
+
+def outline_key_bits(outline: Sequence[str])->Tuple[int, ...]:
+	return tuple(stroke_key_bits(stroke) for stroke in outline)
+
+
+def outline_distance(a: Sequence[int], b: Sequence[int])->int:
+	"""
+	Edit distance between two outlines, given as the key bit masks of their strokes (see :func:`outline_key_bits`).
+
+	Substituting a stroke costs the number of keys that differ,
+	inserting or deleting a stroke costs its number of keys plus one. This is a metric.
+	"""
+	previous=[0]
+	for y in b:
+		previous.append(previous[-1]+bin(y).count("1")+1)
+	for x in a:
+		x_cost=bin(x).count("1")+1
+		current=[previous[0]+x_cost]
+		for j, y in enumerate(b):
+			current.append(min(
+				previous[j]+bin(x^y).count("1"),
+				previous[j+1]+x_cost,
+				current[j]+bin(y).count("1")+1,
+				))
+		previous=current
+	return previous[-1]
+
+
+class _BKNode:
+	__slots__=("strokes", "entry", "children")
+
+	def __init__(self, strokes: Tuple[int, ...], entry: Entry)->None:
+		self.strokes: Tuple[int, ...]=strokes
+		self.entry: Optional[Entry]=entry
+		"""
+		None if the entry has been removed (the node is kept to keep the tree valid).
+		"""
+		self.children: Dict[int, "_BKNode"]={}
+
+
+class BKTree(Index):
+	"""
+	BK-tree of the briefs under :func:`outline_distance`, to find the outlines close to a given outline.
+
+	Like :class:`SubstringIndex`, it's built in the background from a snapshot of the entries;
+	modifications made during the build are applied once it finishes, and directly afterwards.
+	Once more than half of the nodes are of removed entries, it's rebuilt in the background in the same way.
+	"""
+	def __init__(self)->None:
+		self._root: Optional[_BKNode]=None
+		self._ready: bool=False
+		self._pending: List[Tuple[bool, Entry]]=[]
+		"""
+		Modifications (is_addition, entry) made while the tree is being built.
+		"""
+		self._size: int=0
+		self._removed_count: int=0
+		self._node_of: Dict[Outline, _BKNode]={}
+		"""
+		The node of the entry with each brief, so that removing an entry doesn't need to search the tree.
+		"""
+		self._lock: threading.Lock=threading.Lock()
+		self._snapshot: Optional[List[Entry]]=None
+
+	def _insert(self, entry: Entry)->None:
+		strokes=outline_key_bits(entry.brief)
+		if self._root is None:
+			self._root=self._node_of[entry.brief]=_BKNode(strokes, entry)
+			self._size+=1
+			return
+		node=self._root
+		while True:
+			distance=outline_distance(strokes, node.strokes)
+			if distance==0 and node.entry is None and node.strokes==strokes:
+				node.entry=entry  # reuse the node of a removed entry
+				self._node_of[entry.brief]=node
+				self._removed_count-=1
+				return
+			child=node.children.get(distance)
+			if child is None:
+				node.children[distance]=self._node_of[entry.brief]=_BKNode(strokes, entry)
+				self._size+=1
+				return
+			node=child
+
+	def _delete(self, entry: Entry)->None:
+		node=self._node_of.get(entry.brief)
+		if node is not None and node.entry==entry:
+			del self._node_of[entry.brief]
+			node.entry=None
+			self._removed_count+=1
+		if self._removed_count*2>self._size and self._ready:
+			# not rebuilt synchronously: the caller may hold the dictionary lock
+			build=self._prepare_build([node.entry for node in self._node_of.values() if node.entry is not None])
+			threading.Thread(target=build, name="plover_search_translation BK-tree rebuild", daemon=True).start()
+
+	def _rebuild(self, entries: Sequence[Entry])->None:
+		self._root=None
+		self._size=0
+		self._removed_count=0
+		self._node_of={}
+		for entry in entries:
+			self._insert(entry)
+
+	def start_build(self, entries: Sequence[Entry])->Callable[[], None]:
+		"""
+		See :meth:`SubstringIndex.start_build`.
+		"""
+		with self._lock:
+			return self._prepare_build([entry for entry in entries if entry.brief])
+
+	def _prepare_build(self, snapshot: List[Entry])->Callable[[], None]:
+		"""
+		See :meth:`start_build`. Must be called with the lock held.
+		"""
+		self._snapshot=snapshot
+		self._ready=False
+		self._pending=[]
+
+		def build()->None:
+			tree=BKTree()
+			tree._rebuild(snapshot)
+			with self._lock:
+				if self._snapshot is not snapshot: return  # another build has been started
+				self._root, self._size, self._removed_count, self._node_of=(
+						tree._root, tree._size, tree._removed_count, tree._node_of)
+				pending=self._pending
+				self._pending=[]
+				self._ready=True
+				for i, (is_addition, entry) in enumerate(pending):
+					if not self._ready:  # a rebuild has been started by _delete, it gets the remaining modifications
+						self._pending+=pending[i:]
+						break
+					(self._insert if is_addition else self._delete)(entry)
+		return build
+
+	def export(self)->Optional[Tuple[List[Entry], List[int], List[int]]]:
+		"""
+		Return the entry, the index of the parent (-1 for the root) and the distance to the parent of each node,
+		parents first, so that :meth:`install` can recreate the tree without computing the distances.
+
+		Return None if the tree is not built, or if it has nodes of removed entries.
+		"""
+		with self._lock:
+			if not self._ready or self._removed_count: return None
+			entries: List[Entry]=[]
+			parents: List[int]=[]
+			distances: List[int]=[]
+			stack: List[Tuple[_BKNode, int, int]]=[(self._root, -1, 0)] if self._root else []
+			while stack:
+				node, parent, distance=stack.pop()
+				assert node.entry is not None
+				index=len(entries)
+				entries.append(node.entry)
+				parents.append(parent)
+				distances.append(distance)
+				stack.extend((child, index, child_distance) for child_distance, child in node.children.items())
+			return entries, parents, distances
+
+	def install(self, entries: Sequence[Entry], parents: Sequence[int], distances: Sequence[int])->None:
+		"""
+		Use a tree exported by :meth:`export`, instead of building it.
+		"""
+		nodes: List[_BKNode]=[]
+		for entry, parent, distance in zip(entries, parents, distances):
+			node=_BKNode(outline_key_bits(entry.brief), entry)
+			if parent>=0:
+				nodes[parent].children[distance]=node
+			nodes.append(node)
+		with self._lock:
+			self._snapshot=[*entries]
+			self._root=nodes[0] if nodes else None
+			self._size=len(nodes)
+			self._removed_count=0
+			self._node_of={entry.brief: node for entry, node in zip(entries, nodes)}
+			self._pending=[]
+			self._ready=True
+
+	def add(self, entry: Entry)->None:
+		if not entry.brief: return
+		with self._lock:
+			if self._ready: self._insert(entry)
+			elif self._snapshot is not None: self._pending.append((True, entry))
+
+	def remove(self, entry: Entry)->None:
+		if not entry.brief: return
+		with self._lock:
+			if self._ready: self._delete(entry)
+			elif self._snapshot is not None: self._pending.append((False, entry))
+
+	def replace(self, old: Entry, new: Entry)->None:
+		if old.brief!=new.brief or not new.brief:
+			super().replace(old, new)
+			return
+		with self._lock:
+			if self._ready:
+				node=self._node_of[old.brief]
+				assert node.entry==old
+				node.entry=new
+			elif self._snapshot is not None:
+				self._pending+=[(False, old), (True, new)]
+
+	def within(self, outline: Sequence[str], max_distance: int)->Optional[List[Tuple[int, Entry]]]:
+		"""
+		Return the (distance, entry) pairs of the entries whose brief is within ``max_distance`` of ``outline``,
+		closest first.
+
+		Return None if the tree is not built yet.
+		"""
+		strokes=outline_key_bits(outline)
+		with self._lock:
+			if not self._ready: return None
+			result: List[Tuple[int, Entry]]=[]
+			stack=[self._root] if self._root else []
+			while stack:
+				node=stack.pop()
+				distance=outline_distance(strokes, node.strokes)
+				if distance<=max_distance and node.entry is not None:
+					result.append((distance, node.entry))
+				for child_distance, child in node.children.items():
+					if distance-max_distance<=child_distance<=distance+max_distance:
+						stack.append(child)
+		result.sort(key=lambda item: (item[0], item[1].brief))
+		return result
+
+
+WORD_RX=re.compile(r"\w+|\S")
+
+
+def split_words(s: str)->List[str]:
+	return WORD_RX.findall(s)
+
+
+MIN_WORD_LENGTH: int=3
+"""
+Shorter words (and the punctuation characters, which :func:`split_words` returns as words of their own)
+are not indexed by :class:`WordIndex`.
+"""
+
+DELETE_PREFIX_LENGTH: int=7
+"""
+Only the deletions of this many first characters of each word are indexed, as in SymSpell.
+Longer words share the entries of their prefix, and the candidates are verified with :func:`typo_distance`.
+"""
+
+
+def max_typos(word: str)->int:
+	"""
+	Return the number of typos tolerated in a query word.
+	"""
+	return 0 if len(word)<4 else 1 if len(word)<8 else 2
+
+
+def _deletes(word: str, max_distance: int)->Set[str]:
+	"""
+	Return the strings obtained by deleting at most ``max_distance`` characters of the prefix of ``word``.
+	"""
+	level={word[:DELETE_PREFIX_LENGTH]}
+	result=set(level)
+	for _ in range(max_distance):
+		level={item[:i]+item[i+1:] for item in level for i in range(len(item))}
+		result|=level
+	return result
+
+
+def typo_distance(a: str, b: str, limit: int)->int:
+	"""
+	Optimal string alignment distance between ``a`` and ``b`` (Levenshtein distance where swapping
+	two adjacent characters counts as one typo), or ``limit+1`` if it's larger than ``limit``.
+	"""
+	if abs(len(a)-len(b))>limit:
+		return limit+1
+	before_previous: List[int]=[]
+	previous=list(range(len(b)+1))
+	for i, x in enumerate(a, 1):
+		current=[i]
+		for j, y in enumerate(b, 1):
+			distance=min(previous[j]+1, current[j-1]+1, previous[j-1]+(x!=y))
+			if i>1 and j>1 and x==b[j-2] and a[i-2]==y:
+				distance=min(distance, before_previous[j-2]+1)
+			current.append(distance)
+		if min(current)>limit:
+			return limit+1
+		before_previous, previous=previous, current
+	return min(previous[-1], limit+1)
+
+
+class WordIndex(Index):
+	"""
+	Symmetric deletion index (as in SymSpell) of the words of the descriptions and translations,
+	to find the entries that contain a word within a few typos of a query word.
+
+	Each word is indexed under the strings obtained by deleting up to two characters of it,
+	so that the close words of a query word are found by looking up its own deletions,
+	instead of comparing it to the whole vocabulary. Words are compared casefolded.
+
+	Like :class:`BKTree`, it's built in the background from a snapshot of the entries.
+	"""
+	def __init__(self)->None:
+		self._postings: Dict[str, Dict[Entry, None]]={}
+		"""
+		The entries (as an ordered set) that contain each word.
+		"""
+		self._deletes: Dict[str, List[str]]={}
+		"""
+		The words under each deletion, see :func:`_deletes`.
+		"""
+		self._ready: bool=False
+		self._pending: List[Tuple[bool, Entry]]=[]
+		"""
+		Modifications (is_addition, entry) made while the index is being built.
+		"""
+		self._lock: threading.Lock=threading.Lock()
+		self._snapshot: Optional[List[Entry]]=None
+
+	def start_build(self, entries: Sequence[Entry])->Callable[[], None]:
+		"""
+		See :meth:`SubstringIndex.start_build`.
+		"""
+		snapshot=list(entries)
+		with self._lock:
+			self._snapshot=snapshot
+			self._ready=False
+			self._pending=[]
+
+		def build()->None:
+			built=WordIndex()
+			for entry in snapshot:
+				built._insert(entry)
+			with self._lock:
+				if self._snapshot is not snapshot: return  # another build has been started
+				self._postings, self._deletes=built._postings, built._deletes
+				for is_addition, entry in self._pending:
+					(self._insert if is_addition else self._delete)(entry)
+				self._pending=[]
+				self._ready=True
+		return build
+
+	def add(self, entry: Entry)->None:
+		with self._lock:
+			if self._ready: self._insert(entry)
+			elif self._snapshot is not None: self._pending.append((True, entry))
+
+	def remove(self, entry: Entry)->None:
+		with self._lock:
+			if self._ready: self._delete(entry)
+			elif self._snapshot is not None: self._pending.append((False, entry))
+
+	def replace(self, old: Entry, new: Entry)->None:
+		"""
+		Like :meth:`Index.replace`, but the deletions of the words that both entries contain are not recomputed.
+		"""
+		with self._lock:
+			if self._ready:
+				old_words=self._words(old)
+				new_words=self._words(new)
+				for word in old_words-new_words:
+					self._delete_word(old, word)
+				for word in old_words&new_words:
+					postings=self._postings[word]
+					del postings[old]
+					postings[new]=None
+				for word in new_words-old_words:
+					self._insert_word(new, word)
+			elif self._snapshot is not None:
+				self._pending+=[(False, old), (True, new)]
+
+	@staticmethod
+	def _words(entry: Entry)->Set[str]:
+		return {word for word in split_words(entry.search_fields.haystack.casefold()) if len(word)>=MIN_WORD_LENGTH}
+
+	def _insert(self, entry: Entry)->None:
+		for word in self._words(entry):
+			self._insert_word(entry, word)
+
+	def _insert_word(self, entry: Entry, word: str)->None:
+		postings=self._postings.get(word)
+		if postings is None:
+			postings=self._postings[word]={}
+			for delete in _deletes(word, 2 if len(word)>=6 else 1):
+				self._deletes.setdefault(delete, []).append(word)
+		postings[entry]=None
+
+	def _delete(self, entry: Entry)->None:
+		for word in self._words(entry):
+			self._delete_word(entry, word)
+
+	def _delete_word(self, entry: Entry, word: str)->None:
+		postings=self._postings[word]
+		del postings[entry]
+		if not postings:
+			del self._postings[word]
+			for delete in _deletes(word, 2 if len(word)>=6 else 1):
+				words=self._deletes[delete]
+				words.remove(word)
+				if not words: del self._deletes[delete]
+
+	def close_words(self, word: str)->List[Tuple[int, str]]:
+		"""
+		Return the (distance, word) pairs of the indexed words within :func:`max_typos` of ``word``
+		(see :func:`typo_distance`), closest first.
+
+		Return an empty list if the index is not built yet.
+		"""
+		word=word.casefold()
+		limit=max_typos(word)
+		if not limit: return []
+		candidates: Set[str]=set()
+		with self._lock:
+			if not self._ready: return []
+			for delete in _deletes(word, limit):
+				candidates.update(self._deletes.get(delete, ()))
+		result: List[Tuple[int, str]]=[]
+		for candidate in candidates:
+			distance=typo_distance(word, candidate, limit)
+			if distance<=limit:
+				result.append((distance, candidate))
+		result.sort()
+		return result
+
+	def entries_with_close_word(self, word: str)->Dict[Entry, None]:
+		"""
+		Return the entries (as an ordered set) that contain a word close to ``word``, see :meth:`close_words`.
+		"""
+		result: Dict[Entry, None]={}
+		close_words=self.close_words(word)
+		with self._lock:
+			for _distance, close_word in close_words:
+				result.update(self._postings.get(close_word, {}))
+		return result
@@ -0,0 +1,129 @@
+"""
+Incremental JSON reading, for dictionary files that are too large to parse in one go.
+
+Only a bounded buffer of the file is kept in memory; values are decoded one by one.
+"""
+
+import json
+import re
+from typing import IO, Any, Iterator, Tuple
+
+_decoder=json.JSONDecoder()
+_WHITESPACE_RX=re.compile(r"[ \t\n\r]*")
+
+
+class Reader:
+	"""
+	Read JSON tokens and values from a text stream.
+
+	Containers can either be decoded as a whole with :meth:`value`,
+	or iterated over with :meth:`iter_object`/:meth:`iter_array`.
+	"""
+	def __init__(self, file: IO[str], chunk_size: int=1<<16)->None:
+		self.file: IO[str]=file
+		self.chunk_size: int=chunk_size
+		self.buffer: str=""
+		self.position: int=0
+		self.eof: bool=False
+
+	def _fill(self)->bool:
+		"""
+		Read one more chunk into the buffer, dropping the consumed part.
+
+		Return False if the end of the file is reached.
+		"""
+		if self.eof: return False
+		chunk=self.file.read(self.chunk_size)
+		if not chunk:
+			self.eof=True
+			return False
+		self.buffer=self.buffer[self.position:]+chunk
+		self.position=0
+		return True
+
+	def peek(self)->str:
+		"""
+		Skip whitespace, then return the next character without consuming it.
+
+		Return the empty string at the end of the file.
+		"""
+		while True:
+			self.position=_WHITESPACE_RX.match(self.buffer, self.position).end()  # type: ignore
+			if self.position<len(self.buffer):
+				return self.buffer[self.position]
+			if not self._fill():
+				return ""
+
+	def expect(self, characters: str)->str:
+		"""
+		Consume and return the next (non-whitespace) character, which must be one of ``characters``.
+		"""
+		c=self.peek()
+		if not c or c not in characters:
+			raise ValueError(f"Invalid JSON: expected one of {characters!r}, got {c!r}")
+		self.position+=1
+		return c
+
+	def value(self)->Any:
+		"""
+		Decode the next complete JSON value.
+		"""
+		self.peek()
+		while True:
+			try:
+				result, end=_decoder.raw_decode(self.buffer, self.position)
+			except json.JSONDecodeError:
+				# the value might be cut off at the end of the buffer
+				if self._fill(): continue
+				raise
+			if end==len(self.buffer) and self._fill():
+				continue  # a number might be cut off at the end of the buffer
+			self.position=end
+			return result
+
+	def iter_object(self)->Iterator[str]:
+		"""
+		Iterate over the keys of the next JSON object.
+
+		The caller must consume the value corresponding to each key
+		before requesting the next key.
+		"""
+		self.expect("{")
+		if self.peek()=="}":
+			self.position+=1
+			return
+		while True:
+			key=self.value()
+			if not isinstance(key, str):
+				raise ValueError(f"Invalid JSON: object key must be a string, got {key!r}")
+			self.expect(":")
+			yield key
+			if self.expect(",}")=="}":
+				return
+
+	def iter_array(self)->Iterator[int]:
+		"""
+		Iterate over the indices of the next JSON array.
+
+		The caller must consume each element before requesting the next one.
+		"""
+		self.expect("[")
+		if self.peek()=="]":
+			self.position+=1
+			return
+		index=0
+		while True:
+			yield index
+			index+=1
+			if self.expect(",]")=="]":
+				return
+
+
+def iter_object_items(file: IO[str])->Iterator[Tuple[str, Any]]:
+	"""
+	Iterate over the (key, value) pairs of a file containing a single JSON object,
+	such as a Plover JSON dictionary.
+	"""
+	reader=Reader(file)
+	for key in reader.iter_object():
+		yield key, reader.value()
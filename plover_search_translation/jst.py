@@ -0,0 +1,69 @@
+"""
+Streaming reading and writing of JST dictionary files.
+
+Does not depend on Plover, so it can be used by the command-line tools.
+"""
+
+import json
+from typing import IO, Any, Dict, Iterable, Iterator
+
+from .lib import Entry
+from .jsonstream import Reader
+
+
+class JstReader:
+	"""
+	Iterate over the entries of a JST file without loading all of them into memory.
+
+	The header fields (everything other than ``entries``) are collected into :attr:`header`;
+	the fields located before ``entries`` (which is always the case for files written by :func:`write_jst`)
+	are available once :meth:`read_header` returns.
+	"""
+	def __init__(self, file: IO[str])->None:
+		self._reader: Reader=Reader(file)
+		self._keys: Iterator[str]=self._reader.iter_object()
+		self._at_entries: bool=False
+		self.header: Dict[str, Any]={}
+
+	def read_header(self)->Dict[str, Any]:
+		"""
+		Read the fields up to ``entries``, and return :attr:`header`.
+		"""
+		if self._at_entries: return self.header
+		for key in self._keys:
+			if key=="entries":
+				self._at_entries=True
+				break
+			self.header[key]=self._reader.value()
+		return self.header
+
+	def __iter__(self)->Iterator[Entry]:
+		self.read_header()
+		if not self._at_entries:
+			return
+		for _index in self._reader.iter_array():
+			yield Entry.from_tuple(self._reader.value())
+		self._at_entries=False
+		for key in self._keys:
+			self.header[key]=self._reader.value()
+
+
+def write_jst(f: IO[str], header: Dict[str, Any], entries: Iterable[Entry])->None:
+	"""
+	Write a version 1 JST dictionary, one entry per line.
+
+	``header`` should contain the fields other than ``version`` and ``entries``.
+	"""
+	f.write('{\n'
+			'"version": 1,\n')
+	for key, value in header.items():
+		if key in ("version", "entries"): continue
+		f.write(json.dumps(key) + ': ' + json.dumps(value) + ',\n')
+	f.write('"entries": [\n')
+	separator=""
+	for entry in entries:
+		f.write(separator + json.dumps(entry.tuple(), ensure_ascii=False))
+		separator=",\n"
+	f.write('\n'
+			']\n'
+			'}\n')
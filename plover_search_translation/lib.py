@@ -1,4 +1,5 @@
 import functools
+import mmap
 import time
 import threading
 import typing
@@ -13,6 +14,12 @@ if typing.TYPE_CHECKING:
 
 Outline=Tuple[str, ...]
 
+HARNESS_ENVIRONMENT_VARIABLE: str="PLOVER_SEARCH_TRANSLATION_HARNESS"
+"""
+If this environment variable is set, the GUI process registers the functions used by the latency benchmark
+(see :mod:`.scripts.benchmark`) to drive the dialog.
+"""
+
 T=TypeVar("T", bound=Callable)
 
 def with_print_exception(function: T)->T:
@@ -33,6 +40,29 @@ def text_to_outline(s: str)->Outline:
 	return tuple(s.replace('/', ' ').split())
 
 
+@dataclass(frozen=True)
+class SearchFields:
+	"""
+	Normalized fields of an entry that are used for searching.
+
+	They don't depend on the query, so they're computed once per entry.
+	"""
+	alternatives: Tuple[str, ...]
+	"""
+	The translation, followed by the alternatives in the description (separated by ``|``).
+	"""
+	haystack: str
+	"""
+	The description and the translation separated by a newline.
+	A string without whitespace is contained in it iff it's contained in one of them.
+	"""
+	translation_casefolded: str
+	outline: str
+	"""
+	The brief, with the strokes separated by ``/``.
+	"""
+
+
 @dataclass(frozen=True)
 class Entry:  # field order is important
 	translation: str
@@ -42,6 +72,17 @@ class Entry:  # field order is important
 	def valid(self)->bool:
 		return bool(self.description and self.translation)
 
+	@functools.cached_property
+	def search_fields(self)->SearchFields:
+		"""
+		Computed on first access. :class:`.dictionary.Dictionary` accesses it when the entry is added.
+		"""
+		return _search_fields(self)
+
+	def __reduce__(self)->Any:
+		# don't pickle the cached search_fields
+		return (Entry, self.tuple())
+
 	def __str__(self)->str:
 		return f"({self.brief} -> {self.translation} | {self.description})"
 
@@ -58,6 +99,94 @@ class Entry:  # field order is important
 				)
 
 
+def _search_fields(entry: Entry)->SearchFields:
+	description=entry.description
+	return SearchFields(
+			alternatives=(entry.translation, *description.split("|")),
+			haystack=description+"\n"+entry.translation,
+			translation_casefolded=entry.translation.casefold(),
+			outline="/".join(entry.brief),
+			)
+
+
+class DescriptionStore:
+	"""
+	Append-only temporary file of UTF-8 encoded descriptions, memory-mapped for reading, see :class:`DiskEntry`.
+
+	The space of the descriptions of removed entries is only reclaimed when the dictionary is loaded again
+	(with a new store).
+	"""
+	def __init__(self)->None:
+		self._file=tempfile.TemporaryFile()
+		self._size: int=0
+		self._mapped: Optional[mmap.mmap]=None
+		"""
+		Mapping of the first (at least) ``len(self._mapped)`` bytes of the file.
+		It's replaced when a description after its end is read.
+		"""
+		self._lock: threading.Lock=threading.Lock()
+
+	def add(self, description: str)->Tuple[int, int]:
+		"""
+		Append the description, return its offset and length (in bytes).
+		"""
+		data=description.encode("u8")
+		with self._lock:
+			offset=self._size
+			self._file.write(data)
+			self._size+=len(data)
+		return offset, len(data)
+
+	def read(self, offset: int, length: int)->str:
+		mapped=self._mapped
+		if mapped is None or offset+length>len(mapped):
+			if not length: return ""
+			with self._lock:
+				if self._mapped is None or offset+length>len(self._mapped):
+					self._file.flush()
+					self._mapped=mmap.mmap(self._file.fileno(), self._size, access=mmap.ACCESS_READ)
+				mapped=self._mapped
+		return mapped[offset:offset+length].decode("u8")
+
+
+class DiskEntry(Entry):
+	"""
+	An entry whose description is kept in a :class:`DescriptionStore` instead of in memory (low-memory mode,
+	see :attr:`.dictionary.Dictionary.low_memory`). Its search fields are computed on each access instead of cached.
+
+	It's equal to, and has the same hash as, the :class:`Entry` with the same fields.
+	"""
+	def __init__(self, entry: Entry, store: DescriptionStore)->None:
+		object.__setattr__(self, "translation", entry.translation)
+		object.__setattr__(self, "brief", entry.brief)
+		object.__setattr__(self, "_store", store)
+		object.__setattr__(self, "_location", store.add(entry.description))
+		object.__setattr__(self, "_hash", hash(entry))
+
+	@property  # type: ignore
+	def description(self)->str:  # type: ignore
+		return self._store.read(*self._location)  # type: ignore
+
+	@property  # type: ignore
+	def search_fields(self)->SearchFields:  # type: ignore
+		return _search_fields(self)
+
+	def __hash__(self)->int:
+		return self._hash  # type: ignore
+
+	def __eq__(self, other: Any)->bool:
+		if not isinstance(other, Entry):
+			return NotImplemented
+		return self._hash==hash(other) and self.tuple()==other.tuple()  # type: ignore
+
+
+Operation=Tuple[Any, ...]
+"""
+A modification of a dictionary, see :meth:`.dictionary.Dictionary.apply_batch`:
+``("add", entry)``, ``("edit", old, new)`` or ``("remove", entry)``.
+"""
+
+
 def throttle(seconds: float)->Callable[[T], T]:
 	r"""
 	Wait for <seconds> seconds, collect all the function calls, then only call the last function.
@@ -8,25 +8,72 @@ and also Plover's extension plugin entry point.
 from __future__ import annotations
 
 import sys
+import os
+import itertools
+import shutil
 import subprocess
+import tempfile
+import threading
 import traceback
 import typing
+from concurrent.futures import ThreadPoolExecutor
 if typing.TYPE_CHECKING:
 	from plover.engine import StenoEngine  # type: ignore
-	from typing import Optional, List, Dict, Union, Tuple, Any
-	from .lib import Entry
+	from typing import Optional, List, Dict, Union, Tuple, Any, Callable
+	from .lib import Entry, Operation
 	from .dictionary import Dictionary
 
 from subprocess_connection import Message
 
+from . import rpc, trace
 from .lib import with_print_exception, Outline, inject_translation
+from .search import merge_pages, merge_scored, diff_results
+
+
+WATCH_INTERVAL: float=2
+"""
+Time (in seconds) between two checks of the JST files for modifications by other programs.
+"""
+
+RESULT_HISTORY: int=4
+"""
+Number of results of :meth:`Manager.search_diff` kept, which can be the base of the next result.
+"""
 
 
 class Manager:
 	def __init__(self, engine: StenoEngine)->None:
 		self._engine: StenoEngine=engine
 		self._message: Optional[Message]=None
+		self._rpc: Optional[rpc.Server]=None
 		self._dictionary: Optional[Dictionary]=None
+		self._dictionaries: List[Dictionary]=[]
+		"""
+		All the dictionaries searched by the dialog.
+		Contains only ``_dictionary`` unless federated search is enabled.
+		"""
+		self._dialog_lock: threading.Lock=threading.Lock()
+		"""
+		Guards ``_dictionary`` and ``_dictionaries``: the dialog can be closed while its requests
+		are running on the worker threads of the RPC server, see :meth:`_dialog_dictionaries`.
+		"""
+		self._executor: Optional[ThreadPoolExecutor]=None
+		self._snapshot_directory: Optional[str]=None
+		self._snapshots: Dict[str, Tuple[int, str]]={}
+		"""
+		Map from the path of a dictionary to the generation and the path of its latest snapshot.
+		"""
+		self._snapshot_ids: Dict[str, int]={}
+		"""
+		Map from the path of a dictionary to the prefix of the file names of its snapshots.
+		"""
+		self._stop_watching: threading.Event=threading.Event()
+		self._results: Dict[int, List[Tuple[str, Entry]]]={}
+		"""
+		The latest results of :meth:`search_diff`, by id.
+		"""
+		self._result_ids=itertools.count()
+		self._results_lock: threading.Lock=threading.Lock()
 
 		from plover import config  # type: ignore
 		config.Config._OPTIONS["plover_search_translation_column_width"]=config.json_option(
@@ -47,6 +94,7 @@ class Manager:
 		Called when Plover starts (or the extension plugin is enabled)
 		"""
 		assert self._message is None
+		trace.start("Plover")
 		self._message=Message(
 				subprocess.Popen([sys.executable, "-m", "plover_search_translation.process"],
 					stdin=subprocess.PIPE,
@@ -55,20 +103,32 @@ class Manager:
 				)
 
 		self._message.register_call(self.show_error)
-		self._message.register_call(self.remove_translation)
-		self._message.register_call(self.picked)
-
-		self._message.register_func(self.add_translation)
-		self._message.register_func(self.edit_translation)
-		self._message.register_func(self.search)
-		self._message.register_func(self.lookup)
-
 		self._message.register_call(self.save_column_width)
-		self._message.register_func(self.get_column_width)
+		self._message.register_func(self.trace_clock)
+		self._message.register_call(self.trace_events)
+
+		self._rpc=rpc.Server(self._message)
+		function: Callable[..., Any]
+		for function in (self.add_translation, self.edit_translation, self.remove_translation, self.apply_batch,
+				self.generation, self.picked):
+			self._rpc.register(function, rpc.LANE_ORDERED)
+		for function in (self.lookup, self.get_column_width):
+			self._rpc.register(function, rpc.LANE_INTERACTIVE)
+		for function in (self.search, self.search_hot, self.search_page, self.search_diff):
+			self._rpc.register(function, rpc.LANE_SEARCH)
+		self._rpc.start()
 
 		self._message.start()
 
-		self._dictionary=None
+		self._executor=ThreadPoolExecutor(thread_name_prefix="plover_search_translation")
+		self._snapshot_directory=tempfile.mkdtemp(prefix="plover_search_translation-")
+		self._snapshots={}
+		self._snapshot_ids={}
+
+		self._stop_watching=threading.Event()
+		threading.Thread(target=self._watch, name="plover_search_translation watch", daemon=True).start()
+
+		self._close_dictionaries()
 
 		global instance
 		instance=self
@@ -83,9 +143,39 @@ class Manager:
 		"""
 		global instance
 		instance=None
+		self._stop_watching.set()
 		assert self._message
 		self._message.stop()
 		self._message=None
+		assert self._rpc
+		self._rpc.stop()
+		self._rpc=None
+		assert self._executor
+		self._executor.shutdown(wait=False)
+		self._executor=None
+		assert self._snapshot_directory is not None
+		shutil.rmtree(self._snapshot_directory, ignore_errors=True)
+		self._snapshot_directory=None
+
+		from .dictionary import Dictionary
+		for dictionary in self._engine.dictionaries.dicts:
+			if isinstance(dictionary, Dictionary):
+				dictionary.usage.save()
+		trace.write()
+
+	def _watch(self)->None:
+		"""
+		Periodically apply the modifications made to the JST files by other programs
+		(for example file synchronization tools), see :meth:`.dictionary.Dictionary.reload_if_changed`.
+		"""
+		from .dictionary import Dictionary
+		while not self._stop_watching.wait(WATCH_INTERVAL):
+			for dictionary in self._engine.dictionaries.dicts:
+				if isinstance(dictionary, Dictionary):
+					try:
+						dictionary.reload_if_changed()
+					except Exception:
+						self.show_error(traceback.format_exc())
 
 	def save_column_width(self, value: Any)->None:
 		self._engine["plover_search_translation_column_width"]=value
@@ -97,19 +187,73 @@ class Manager:
 		from plover import log  # type: ignore
 		log.error(message)
 
-	def picked(self, entry: Optional[Entry])->None:
+	def trace_clock(self)->float:
 		"""
-		This function is called when the subprocess picks an entry.
+		Return the current time of the trace clock, see :func:`.trace.clock_offset`.
 		"""
-		assert self._dictionary is not None
+		return trace.now()
+
+	def trace_events(self, events: List[Dict[str, Any]])->None:
+		"""
+		Called when the GUI process sends its trace events, converted to the clock of this process.
+		"""
+		if trace.tracer is None: return
+		trace.tracer.add_events(events)
+		trace.write()
+
+	def _dialog_dictionaries(self)->Tuple[Optional[Dictionary], List[Dictionary]]:
+		"""
+		Return the dictionary the dialog is opened from (None if the dialog is closed) and all the searched dictionaries.
+
+		A request must take them once, instead of reading the attributes several times.
+		"""
+		with self._dialog_lock:
+			return self._dictionary, self._dictionaries
+
+	def _close_dictionaries(self)->Tuple[Optional[Dictionary], List[Dictionary]]:
+		"""
+		Forget the dictionaries of the dialog, and return them (see :meth:`_dialog_dictionaries`).
+		"""
+		with self._dialog_lock:
+			result=self._dictionary, self._dictionaries
+			self._dictionary=None
+			self._dictionaries=[]
+		return result
+
+	def _source(self, source: Optional[str], dictionaries: Optional[Tuple[Optional[Dictionary], List[Dictionary]]]=None)->Dictionary:
+		"""
+		Return the dictionary that a search result comes from.
 
-		self._dictionary=None
+		``source`` is the path the result is tagged with, or None for the dictionary the dialog is opened from.
+
+		Parameters:
+			dictionaries: the result of :meth:`_dialog_dictionaries`, taken if it's not given.
+		"""
+		dictionary, searched=dictionaries or self._dialog_dictionaries()
+		if dictionary is None:
+			raise RuntimeError("The search dialog is closed")
+		if source is None:
+			return dictionary
+		for other in searched:
+			if other.path==source:
+				return other
+		raise RuntimeError(f"Dictionary is not being searched -- {source}")
+
+	def picked(self, entry: Optional[Entry], source: Optional[str]=None)->None:
+		"""
+		This function is called when the subprocess picks an entry.
+		"""
+		dictionaries=self._close_dictionaries()
+		if dictionaries[0] is None:
+			return  # already closed by close_dialog
+		dictionary=self._source(source, dictionaries)
 
 		if entry is None:
 			# Window closed (canceled)
 			return
 
 		assert entry.valid()
+		dictionary.record_pick(entry)
 		mapping=entry.translation
 
 		try:
@@ -124,27 +268,148 @@ class Manager:
 		inject_translation(self._engine, self.last_translation)
 
 	def add_translation(self, entry: Entry)->bool:
-		assert self._dictionary is not None
-		if not self._dictionary.add(entry):
+		dictionary=self._source(None)
+		if not dictionary.add(entry):
 			return False
-		self._dictionary.save()
+		dictionary.save()
+		self._modified(dictionary)
 		return True
 
-	def edit_translation(self, old: Entry, new: Entry)->bool:
-		assert self._dictionary is not None
-		if not self._dictionary.edit(old, new):
+	def edit_translation(self, old: Entry, new: Entry, source: Optional[str]=None)->bool:
+		dictionary=self._source(source)
+		if not dictionary.edit(old, new):
 			return False
-		self._dictionary.save()
+		dictionary.save()
+		self._modified(dictionary)
 		return True
 
-	def remove_translation(self, entry: Entry)->None:
-		assert self._dictionary is not None
-		self._dictionary.remove(entry)
-		self._dictionary.save()
+	def remove_translation(self, entry: Entry, source: Optional[str]=None)->None:
+		dictionary=self._source(source)
+		dictionary.remove(entry)
+		dictionary.save()
+		self._modified(dictionary)
 
-	def search(self, query: str)->List[Entry]:
-		assert self._dictionary is not None
-		return self._dictionary.search(query)
+	def apply_batch(self, operations: List[Operation], source: Optional[str]=None)->bool:
+		"""
+		Apply the operations to a searched dictionary (see :meth:`.dictionary.Dictionary.apply_batch`),
+		then save it once.
+
+		Return False if the dictionary is not modified because some operation would fail.
+		"""
+		dictionary=self._source(source)
+		if not dictionary.apply_batch(operations):
+			return False
+		dictionary.save()
+		self._modified(dictionary)
+		return True
+
+	def generation(self, source: Optional[str]=None)->int:
+		"""
+		Return the generation of a searched dictionary, see :attr:`.dictionary.Dictionary.generation`.
+		"""
+		return self._source(source).generation
+
+	def _modified(self, dictionary: Dictionary)->None:
+		"""
+		Called after the dialog modifies a dictionary.
+		"""
+		opened_from, _dictionaries=self._dialog_dictionaries()
+		if opened_from is not None and opened_from.snapshot_search:
+			assert self._executor is not None
+			self._executor.submit(self.publish_snapshot, dictionary)
+
+	@with_print_exception
+	def publish_snapshot(self, dictionary: Dictionary)->None:
+		"""
+		Write a snapshot of the dictionary (unless the latest one is up to date),
+		and tell the GUI process to search on it.
+		"""
+		from .snapshot import write_snapshot
+		data=dictionary.snapshot_data()
+		previous=self._snapshots.get(data.dictionary)
+		if previous is not None and previous[0]==data.generation:
+			return
+		snapshot_id=self._snapshot_ids.setdefault(data.dictionary, len(self._snapshot_ids))
+		assert self._snapshot_directory is not None
+		path=os.path.join(self._snapshot_directory, f"{snapshot_id}-{data.generation}.snapshot")
+		write_snapshot(path, data)
+		self._snapshots[data.dictionary]=(data.generation, path)
+		if previous is not None:
+			try:
+				os.remove(previous[1])
+			except OSError:
+				pass  # might still be mapped by the GUI process on Windows, removed in stop()
+		assert self._message is not None
+		self._message.call.snapshot_published(path)
+
+	def search(self, query: str)->List[Tuple[str, Entry]]:
+		"""
+		Search all the dictionaries the dialog is bound to.
+
+		Return the best matches, each tagged with the path of the dictionary it comes from.
+		"""
+		_dictionary, dictionaries=self._dialog_dictionaries()
+		if len(dictionaries)==1:
+			return [(dictionaries[0].path, entry) for entry in dictionaries[0].search(query)]
+		return self._merge_scored(dictionaries, lambda dictionary: dictionary.search_scored(query))
+
+	def search_diff(self, query: str, base: Optional[int])->Tuple[int, Optional[int], List[Union[int, Tuple[str, Entry]]]]:
+		"""
+		Like :meth:`search`, but return (an id of the result, ``base``, the result encoded relative to
+		the result with id ``base``, see :func:`.search.diff_results`).
+
+		If ``base`` is too old, it's replaced with None, and the result is encoded relative to an empty result.
+		"""
+		result=self.search(query)
+		with self._results_lock:
+			old=self._results.get(base) if base is not None else None
+			if old is None:
+				base=None
+			result_id=next(self._result_ids)
+			self._results[result_id]=result
+			while len(self._results)>RESULT_HISTORY:
+				del self._results[next(iter(self._results))]
+		return result_id, base, diff_results(old or [], result)
+
+	def search_hot(self, query: str)->List[Tuple[str, Entry]]:
+		"""
+		Like :meth:`search`, but only search the most frequently picked entries,
+		which is fast even for large dictionaries.
+
+		Return an empty list if the full search is fast enough.
+		"""
+		_dictionary, dictionaries=self._dialog_dictionaries()
+		return self._merge_scored(dictionaries, lambda dictionary: dictionary.search_hot_scored(query))
+
+	def search_page(self, query: str, offset: int, count: int=100)->Tuple[List[Tuple[str, Entry]], bool]:
+		"""
+		Return the matches at positions ``offset`` to ``offset+count`` of the result of :meth:`search`,
+		and whether there are more matches after them.
+
+		Each dictionary keeps the scored matches of the latest query,
+		so paging through the result doesn't score the entries again.
+		"""
+		_dictionary, dictionaries=self._dialog_dictionaries()
+		assert self._executor is not None
+		pages=self._executor.map(
+				lambda dictionary: dictionary.search_page_scored(query, 0, offset+count),
+				dictionaries)
+		return merge_pages(
+				((dictionary.path, page) for dictionary, page in zip(dictionaries, pages)),
+				offset, count)
+
+	def _merge_scored(self, dictionaries: List[Dictionary],
+			search: Callable[[Dictionary], List[Tuple[Any, Entry]]])->List[Tuple[str, Entry]]:
+		"""
+		Run ``search`` on the dictionaries concurrently,
+		and merge the results into the 100 best matches tagged with their source.
+		"""
+		assert self._executor is not None
+		results=self._executor.map(search, dictionaries)
+		return merge_scored(
+				(dictionary.path, result)
+				for dictionary, result in zip(dictionaries, results)
+				)
 
 	def lookup(self, outline: Outline)->Optional[str]:
 		assert outline
@@ -158,18 +423,36 @@ class Manager:
 	def close_dialog(self)->None:
 		assert self._message
 		assert self._dictionary is not None
-		self._message.func.close_dialog()
-		self._dictionary=None
+		with trace.span("close_dialog", "ipc"):
+			self._message.func.close_dialog()
+		self._close_dictionaries()
 
 	def open_dialog(self, dictionary: Union[str, Dictionary])->None:
 		if self._dictionary is not None:
 			raise RuntimeError(f"Another search dialog is visible -- {self._dictionary.path}")
-		self._dictionary=(
+		opened_from=(
 				self._engine.dictionaries[dictionary]
 				if isinstance(dictionary, str) else dictionary)
-		assert self._dictionary is not None
+		assert opened_from is not None
+		dictionaries=[opened_from]
+		if opened_from.federated_search:
+			from .dictionary import Dictionary
+			dictionaries+=[
+					other for other in self._engine.dictionaries.dicts
+					if isinstance(other, Dictionary) and other.enabled and other is not opened_from
+					]
+		with self._dialog_lock:
+			self._dictionary=opened_from
+			self._dictionaries=dictionaries
+		snapshot_generations: Optional[List[Tuple[str, int]]]=None
+		if opened_from.snapshot_search:
+			snapshot_generations=[(dictionary.path, dictionary.generation) for dictionary in dictionaries]
+			assert self._executor is not None
+			for dictionary in dictionaries:
+				self._executor.submit(self.publish_snapshot, dictionary)
 		assert self._message is not None
-		self._message.call.open_dialog()
+		with trace.span("send open_dialog", "ipc"):
+			self._message.call.open_dialog(snapshot_generations)
 
 	def is_showing(self, dictionary: Dictionary)->bool:
 		return self._dictionary is dictionary
@@ -7,22 +7,31 @@ This module should run the GUI subprocess.
 from dataclasses import dataclass
 
 import functools
-from typing import List, Callable, Optional, TypeVar
+import os
+import threading
+import traceback
+from typing import Dict, List, Callable, Optional, Sequence, Set, TypeVar, Tuple
 import typing
 import faulthandler
 faulthandler.enable()
 
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 
-from PySide6.QtCore import Qt  # type: ignore
+from PySide6.QtCore import Qt, QTimer  # type: ignore
 from PySide6.QtWidgets import QApplication  # type: ignore
 
 import html
 
 from subprocess_connection import Message
 
-from .lib import Entry, throttle
+from . import rpc, trace
+from .lib import Entry, Operation, throttle, HARNESS_ENVIRONMENT_VARIABLE
+from .manager import RESULT_HISTORY
 from .gui import SearchTranslationDialog
+from .scorer import OUTLINE_NEIGHBORS_RX
+from .search import merge_pages, merge_scored, apply_diff, diff_results, unmoved_positions
+from .snapshot import Snapshot
 
 from PySide6.QtCore import Signal, QObject
 class SignalObject(QObject):
@@ -39,7 +48,12 @@ F=TypeVar("F", bound=Callable)
 def execute_on_main_thread(f: F)->F:  # note: returns immediately, does not wait for the call to complete
 	@functools.wraps(f)
 	def result(*args, **kwargs):
-		signal_data.emit(functools.partial(f, *args, **kwargs))
+		if trace.tracer is None:
+			signal_data.emit(functools.partial(f, *args, **kwargs))
+			return
+		flow_id=trace.tracer.new_flow_id()
+		with trace.span(f"post {f.__name__}", "qt", flow=("s", flow_id)):
+			signal_data.emit(trace.traced(f.__name__, "qt", functools.partial(f, *args, **kwargs), flow=("f", flow_id)))
 	return typing.cast(F, result)
 
 app=QApplication([])
@@ -47,6 +61,20 @@ app.setQuitOnLastWindowClosed(False)
 dialog=SearchTranslationDialog()
 
 message=Message()
+rpc_client=rpc.Client(message)
+trace.start("dialog")
+
+def send_trace()->None:
+	"""
+	Send the trace events recorded so far to the Plover process, which writes the trace file (see :mod:`.trace`).
+	"""
+	assert trace.tracer is not None
+	offset=trace.clock_offset(message.func.trace_clock)
+	message.call.trace_events(trace.tracer.take_events(offset))
+
+def send_trace_in_background()->None:
+	if trace.tracer is not None:
+		threading.Thread(target=send_trace, daemon=True).start()
 
 
 @dataclass(frozen=True)
@@ -66,6 +94,17 @@ assert WINDOW_CLOSED is not WINDOW_OPEN  # (of course)
 class Editing(State):
 	entry: Entry
 	row: int
+	source: Optional[str]
+
+@dataclass(frozen=True)
+class BatchEditing(State):
+	"""
+	Editing the description of several entries at once.
+	"""
+	rows: Tuple[Tuple[int, Entry, Optional[str]], ...]
+	"""
+	(row, entry, source) of the edited entries, in increasing order of row.
+	"""
 
 
 state: State=WINDOW_CLOSED
@@ -80,6 +119,17 @@ def set_state(new_state: State)->None:
 def show_error(error: str)->None:
 	message.call.show_error(error)
 
+def request_in_background(name: str, *args)->None:
+	"""
+	Send a request to the Plover process without waiting for its result.
+	"""
+	rpc_client.request(name, *args).add_done_callback(report_error)
+
+def report_error(future: Future)->None:
+	exception=future.exception()
+	if exception is not None:
+		show_error(str(exception))
+
 def set_description_text(new_text: str)->None:
 	"""
 	Set the text of the description text field without triggering repopulate_matches.
@@ -98,7 +148,7 @@ import json
 column_width_save_path=Path("/tmp/Plover-search-translation-column-width-values.json")
 
 def saved_column_width_values()->Optional[List[int]]:
-	return message.func.get_column_width()
+	return rpc_client.call("get_column_width")
 
 def save_column_width()->None:
 	horizontal_header=dialog.matches.horizontalHeader()
@@ -118,12 +168,116 @@ def load_column_width()->None:
 				values[index]
 				)
 
+snapshots: Dict[str, Snapshot]={}
+"""
+Map from the path of a dictionary to the latest snapshot of it, see :mod:`.snapshot`.
+Only modified on the snapshot thread, see :data:`snapshot_executor`.
+"""
+
+snapshot_sources: List[str]=[]
+"""
+Paths of the dictionaries searched by the dialog, if they're searched on snapshots (the first one is the dictionary
+the dialog is opened from), otherwise empty.
+"""
+
+min_generations: Dict[str, int]={}
+"""
+Snapshots older than this don't contain some modification, they're not searched.
+"""
+
+snapshot_executor: ThreadPoolExecutor=ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot")
+"""
+The thread that loads and searches the snapshots, so that searching doesn't block the GUI.
+The snapshots are only used on this thread, so that a snapshot can take over the indexes of the previous one
+(see :meth:`.snapshot.Snapshot.load`) while no search runs on it.
+"""
+
+@message.register_call
+def snapshot_published(path: str)->None:
+	snapshot_executor.submit(load_snapshot, path)
+
+def load_snapshot(path: str)->None:
+	"""
+	Map and decode the snapshot on the snapshot thread, then start using it.
+	"""
+	try:
+		snapshot=Snapshot(path)
+		previous=snapshots.get(snapshot.dictionary)
+		if previous is not None and previous.generation>=snapshot.generation:
+			return
+		with trace.span("load snapshot", "snapshot"):
+			snapshot.load(previous)
+	except (OSError, ValueError):
+		show_error(traceback.format_exc())
+		return
+	snapshots[snapshot.dictionary]=snapshot
+
+def snapshot_modified(source: Optional[str])->None:
+	"""
+	Called after modifying a dictionary, so that the snapshots that don't contain the modification are not searched.
+	"""
+	if not snapshot_sources: return
+	min_generations[source or snapshot_sources[0]]=rpc_client.call("generation", source)
+
+def current_snapshots(query: str)->Optional[List[Snapshot]]:
+	"""
+	Return the snapshots to search for the query, or None if the search must be done in the Plover process.
+	"""
+	if not snapshot_sources or OUTLINE_NEIGHBORS_RX.fullmatch(query):
+		return None  # outline neighbors are searched with the BK-tree, which is not in the snapshot
+	result: List[Snapshot]=[]
+	for source in snapshot_sources:
+		snapshot=snapshots.get(source)
+		if snapshot is None or snapshot.generation<min_generations.get(source, 0):
+			return None
+		result.append(snapshot)
+	return result
+
+# the functions below run on the snapshot thread, and return None if the search must be done in the Plover process
+
+def search_snapshots(query: str)->Optional[List[Tuple[str, Entry]]]:
+	current=current_snapshots(query)
+	if current is None: return None
+	with trace.span("search snapshots", "snapshot"):
+		return merge_scored((snapshot.dictionary, snapshot.search_scored(query)) for snapshot in current)
+
+def search_snapshots_hot(query: str)->Optional[List[Tuple[str, Entry]]]:
+	current=current_snapshots(query)
+	if current is None: return None
+	with trace.span("search snapshots hot", "snapshot"):
+		return merge_scored((snapshot.dictionary, snapshot.search_hot_scored(query)) for snapshot in current)
+
+def search_snapshots_page(query: str, offset: int)->Optional[Tuple[List[Tuple[str, Entry]], bool]]:
+	current=current_snapshots(query)
+	if current is None: return None
+	return merge_pages(
+			((snapshot.dictionary, snapshot.search_page_scored(query, 0, offset+PAGE_SIZE)) for snapshot in current),
+			offset, PAGE_SIZE)
+
+def search_page(query: str, offset: int)->Tuple[List[Tuple[str, Entry]], bool]:
+	if current_snapshots(query) is not None:
+		page=snapshot_executor.submit(search_snapshots_page, query, offset).result()
+		if page is not None:
+			return page
+	return rpc_client.call("search_page", query, offset, PAGE_SIZE)
+
 @message.register_call
 @execute_on_main_thread
-def open_dialog()->None:
+def open_dialog(snapshot_generations: Optional[List[Tuple[str, int]]]=None)->None:
+	"""
+	Parameters:
+		snapshot_generations: (path, generation) of the dictionaries to search on snapshots,
+			see :meth:`.manager.Manager.publish_snapshot`. None to search in the Plover process.
+	"""
+	global snapshot_sources, shown_query, latest_result_id
 	assert not dialog.isVisible()
 	assert state is WINDOW_CLOSED, state
+	snapshot_sources=[source for source, _generation in snapshot_generations or []]
+	min_generations.clear()
+	min_generations.update(snapshot_generations or [])
 	set_state(WINDOW_OPEN)
+	dialog.output.setEnabled(True)
+	dialog.brief.setEnabled(True)
 	dialog.output.setText("")
 	dialog.description.setFocus()
 	set_description_text("")
@@ -131,6 +285,10 @@ def open_dialog()->None:
 	dialog.briefConflictLabel.setText("")
 	dialog.matches.setRowCount(0)
 	dialog.matches.scrollToTop()
+	table_matches.clear()
+	shown_query=None
+	known_results.clear()
+	latest_result_id=None
 	repopulate_matches("")
 	dialog.show()
 	load_column_width()
@@ -139,24 +297,30 @@ def open_dialog()->None:
 @execute_on_main_thread
 def close_dialog(callback, args, kwargs)->None:
 	dialog.hide()
-	assert state is WINDOW_OPEN or isinstance(state, Editing)
+	assert state is WINDOW_OPEN or isinstance(state, (Editing, BatchEditing))
 	save_column_width()
 	set_state(WINDOW_CLOSED)
 	callback(None)
+	send_trace_in_background()
 	time.sleep(0.05)  # some window manager might have problems without this
 
 def rejected()->None:
-	assert state is WINDOW_OPEN or isinstance(state, Editing)
+	assert state is WINDOW_OPEN or isinstance(state, (Editing, BatchEditing))
 	save_column_width()
 	set_state(WINDOW_CLOSED)
-	message.call.picked(None)
+	request_in_background("picked", None)
+	send_trace_in_background()
 
 dialog.rejected.connect(rejected)
 
 from .lib import text_to_outline
 
 def add_translation()->None:
-	assert state is WINDOW_OPEN or isinstance(state, Editing)
+	assert state is WINDOW_OPEN or isinstance(state, (Editing, BatchEditing))
+
+	if isinstance(state, BatchEditing):
+		finish_batch_edit()
+		return
 
 	if not dialog.output.text():
 		show_error("Output must be filled")
@@ -172,20 +336,24 @@ def add_translation()->None:
 		)
 
 	if state is WINDOW_OPEN:
-		if not message.func.add_translation(new_entry):
+		if not rpc_client.call("add_translation", new_entry):
 			show_error("Cannot add translation")
 			return
+		snapshot_modified(None)
 		dialog.matches.insertRow(0)
 		dialog.refresh_all_vertical_header()
 		dialog.set_row_data(0, new_entry)
+		table_matches.insert(0, (None, new_entry))
 	else:
 		assert isinstance(state, Editing), state
 		old_entry=state.entry
 		if old_entry!=new_entry:
-			if not message.func.edit_translation(old_entry, new_entry):
+			if not rpc_client.call("edit_translation", old_entry, new_entry, state.source):
 				show_error("Cannot edit translation")
 				return
-		dialog.set_row_data(state.row, new_entry)
+			snapshot_modified(state.source)
+		dialog.set_row_data(state.row, new_entry, state.source)
+		table_matches[state.row]=(state.source, new_entry)
 		set_state(WINDOW_OPEN)
 
 	dialog.output.setText("")
@@ -201,13 +369,39 @@ def get_row()->Optional[int]:
 		show_error("Empty table")
 		return None
 
+def get_rows()->Optional[List[int]]:
+	try:
+		return dialog.rows()
+	except RuntimeError:
+		show_error("Empty table")
+		return None
+
+def apply_batch(operations: List[Tuple[Optional[str], Operation]])->Set[Optional[str]]:
+	"""
+	Apply the (source, operation) pairs with one request per source dictionary,
+	see :meth:`.manager.Manager.apply_batch`.
+
+	Return the sources whose operations are not applied.
+	"""
+	by_source: Dict[Optional[str], List[Operation]]={}
+	for source, operation in operations:
+		by_source.setdefault(source, []).append(operation)
+	failed: Set[Optional[str]]=set()
+	for source, source_operations in by_source.items():
+		if rpc_client.call("apply_batch", source_operations, source):
+			snapshot_modified(source)
+		else:
+			failed.add(source)
+	return failed
+
 def pick()->None:
 	row=get_row()
 	if row is None: return
 
 	entry=dialog.get_row_data(row)
+	source=dialog.get_row_source(row)
 
-	if isinstance(state, Editing):
+	if isinstance(state, (Editing, BatchEditing)):
 		show_error("Pick while editing not supported")
 		return
 
@@ -216,7 +410,7 @@ def pick()->None:
 	set_state(WINDOW_CLOSED)
 
 	dialog.hide()
-	message.call.picked(entry)
+	request_in_background("picked", entry, source)
 
 dialog.pickButton.clicked.connect(pick)
 
@@ -227,55 +421,342 @@ editing_entry_placeholder=Entry(
 		)
 
 def edit_translation()->None:
-	if isinstance(state, Editing):
+	if isinstance(state, (Editing, BatchEditing)):
 		return # clicking [edit] twice is equivalent to once
 	assert state is WINDOW_OPEN, state
 
+	rows=get_rows()
+	if rows is None: return
+	if len(rows)>1:
+		edit_translations(rows)
+		return
+
 	row=get_row()
 	if row is None: return
 
 	entry=dialog.get_row_data(row)
-	dialog.set_row_data(row, editing_entry_placeholder)
+	source=dialog.get_row_source(row)
+	dialog.set_row_data(row, editing_entry_placeholder, source)
 
 	dialog.output.setText(entry.translation)
 	set_description_text(entry.description)
 	dialog.brief.setText("/".join(entry.brief))
 
-	set_state(Editing(entry, row))
+	set_state(Editing(entry, row, source))
+
+
+def edit_translations(rows: List[int])->None:
+	"""
+	Start editing the description of the entries in several rows at once.
+	The output and brief fields are disabled until the edit is finished.
+	"""
+	edited=tuple((row, dialog.get_row_data(row), dialog.get_row_source(row)) for row in rows)
+	for row, _entry, source in edited:
+		dialog.set_row_data(row, editing_entry_placeholder, source)
+
+	descriptions={entry.description for _row, entry, _source in edited}
+	dialog.output.setText("")
+	dialog.output.setEnabled(False)
+	set_description_text(descriptions.pop() if len(descriptions)==1 else "")
+	dialog.brief.setText("")
+	dialog.brief.setEnabled(False)
+
+	set_state(BatchEditing(edited))
+
+def finish_batch_edit()->None:
+	"""
+	Set the description of the entries being edited to the text of the description field.
+
+	If the entries of some dictionary cannot be edited, they stay in the edit.
+	"""
+	assert isinstance(state, BatchEditing), state
+	description=dialog.description.text()
+	if not description and not all(entry.brief for _row, entry, _source in state.rows):
+		show_error("Brief or description must be filled")
+		return
+
+	new_entries=[Entry(entry.translation, description, entry.brief) for _row, entry, _source in state.rows]
+	failed=apply_batch([
+		(source, ("edit", entry, new_entry))
+		for (_row, entry, source), new_entry in zip(state.rows, new_entries)
+		])
+	for (row, _entry, source), new_entry in zip(state.rows, new_entries):
+		if source not in failed:
+			dialog.set_row_data(row, new_entry, source)
+			table_matches[row]=(source, new_entry)
+	if failed:
+		show_error("Cannot edit translations")
+		set_state(BatchEditing(tuple(item for item in state.rows if item[2] in failed)))
+		return
+	finish_batch()
+	dialog.output.setText("")
+	dialog.description.setFocus()
+	dialog.brief.setText("")
 
+def finish_batch()->None:
+	dialog.output.setEnabled(True)
+	dialog.brief.setEnabled(True)
+	set_state(WINDOW_OPEN)
 
 dialog.editButton.clicked.connect(edit_translation)
 
+def delete_rows(rows: Sequence[Tuple[int, Entry, Optional[str]]])->None:
+	"""
+	Delete the entries of several (row, entry, source), in increasing order of row, at once.
+	"""
+	failed=apply_batch([(source, ("remove", entry)) for _row, entry, source in rows])
+	if failed:
+		show_error("Cannot delete translations")
+	for row, entry, source in reversed(rows):
+		if source in failed:
+			dialog.set_row_data(row, entry, source)
+		else:
+			dialog.matches.removeRow(row)
+			del table_matches[row]
+	dialog.refresh_all_vertical_header()
+
 def delete_translation()->None:
 	if isinstance(state, Editing):
-		message.call.remove_translation(state.entry)
+		request_in_background("remove_translation", state.entry, state.source)
+		snapshot_modified(state.source)
 		dialog.matches.removeRow(state.row)
+		del table_matches[state.row]
 		set_state(WINDOW_OPEN)
 		return
 
+	if isinstance(state, BatchEditing):
+		delete_rows(state.rows)
+		finish_batch()
+		return
+
 	assert state is WINDOW_OPEN, state
 
+	rows=get_rows()
+	if rows is None: return
+	if len(rows)>1:
+		delete_rows([(row, dialog.get_row_data(row), dialog.get_row_source(row)) for row in rows])
+		return
+
 	row=get_row()
 	if row is None: return
 
 	entry=dialog.get_row_data(row)
+	source=dialog.get_row_source(row)
 	dialog.matches.removeRow(row)
-	message.call.remove_translation(entry)
+	del table_matches[row]
+	request_in_background("remove_translation", entry, source)
+	snapshot_modified(source)
 
 dialog.deleteButton.clicked.connect(delete_translation)
 
+last_query: Optional[str]=None
+
+PAGE_SIZE: int=100
+
+loaded_matches: int=0
+"""
+Number of matches of ``last_query`` that are loaded into the table, if more matches can be loaded, otherwise 0.
+"""
+
+shown_query: Optional[str]=None
+"""
+The query whose full result is shown in the table.
+"""
+
+table_matches: List[Tuple[Optional[str], Entry]]=[]
+"""
+The (source, entry) of each row of the table, except that the row being edited still holds the old entry.
+"""
+
+def show_matches(result: List[Tuple[str, Entry]], complete: bool=True)->None:
+	"""
+	Parameters:
+		complete: whether ``result`` is the first page of the result of the full search,
+			in which case more matches are loaded when the table is scrolled to the bottom.
+
+	Only the rows that differ from the current content of the table are removed or inserted
+	(the rows common to both whose relative order is unchanged stay in place).
+	"""
+	global loaded_matches, shown_query
+	loaded_matches=len(result) if complete and len(result)>=PAGE_SIZE else 0
+	shown_query=last_query if complete else None
+
+	diff=diff_results(table_matches, result)
+	unmoved=unmoved_positions(diff)
+	unmoved_rows={diff[i] for i in unmoved}
+	first_changed_row=len(result)
+	for row in reversed(range(len(table_matches))):
+		if row not in unmoved_rows:
+			dialog.matches.removeRow(row)
+			first_changed_row=min(first_changed_row, row)
+	unmoved_set=set(unmoved)
+	for row, (source, entry) in enumerate(result):
+		if row in unmoved_set:
+			continue
+		dialog.matches.insertRow(row)
+		dialog.set_row_data(row, entry, source)
+		first_changed_row=min(first_changed_row, row)
+	for row in range(first_changed_row, len(result)):
+		dialog.refresh_vertical_header(row)
+	table_matches[:]=result
+
+def load_more_matches()->None:
+	"""
+	Append the next page of the result of ``last_query`` to the table.
+	"""
+	global loaded_matches
+	assert last_query is not None
+	page, has_more=search_page(last_query, loaded_matches)
+	first_row=dialog.matches.rowCount()
+	dialog.matches.setRowCount(first_row+len(page))
+	for row, (source, entry) in enumerate(page, start=first_row):
+		dialog.refresh_vertical_header(row)
+		dialog.set_row_data(row, entry, source)
+	table_matches.extend(page)
+	loaded_matches=loaded_matches+len(page) if has_more else 0
+
+def matches_scrolled(value: int)->None:
+	if state is not WINDOW_OPEN or not loaded_matches:
+		return
+	if value==dialog.matches.verticalScrollBar().maximum():
+		load_more_matches()
+
+dialog.matches.verticalScrollBar().valueChanged.connect(matches_scrolled)
+
+pending_searches: List[Future]=[]
+"""
+Requests sent by :func:`request_matches` whose result is not shown yet.
+"""
+
+known_results: Dict[int, List[Tuple[str, Entry]]]={}
+"""
+The latest results of :meth:`.manager.Manager.search_diff` received since the dialog is opened, by id.
+"""
+
+latest_result_id: Optional[int]=None
+"""
+The id of the latest result received, relative to which the next result is encoded.
+"""
+
+pending_snapshot_search: Optional[Future]=None
+"""
+The search submitted by :func:`search_in_background` whose result is not shown yet.
+"""
+
+def searching()->bool:
+	"""
+	Return whether a search has been started (in the Plover process or on the snapshots) whose result is not shown yet.
+	"""
+	return bool(pending_searches) or pending_snapshot_search is not None
+
 def repopulate_matches(query: str)->None:
 	"""
-	Fill the matches table with the matches from the dictionary.
+	Fill the matches table with the matches from the dictionary, without blocking the GUI.
 	Must be called from the main thread.
+
+	For large dictionaries, the matches among the most frequently picked entries
+	are shown first, and the table is filled with the full result when it's available.
 	"""
+	global last_query
 	if state is WINDOW_CLOSED:
 		return
-	result: List[Entry] = message.func.search(query)
-	dialog.matches.setRowCount(len(result))
-	dialog.refresh_all_vertical_header()
-	for row, entry in enumerate(result):
-		dialog.set_row_data(row, entry)
+	last_query=query
+	if current_snapshots(query) is None:
+		request_matches(query)
+	else:
+		search_in_background(query)
+
+def search_in_background(query: str)->None:
+	"""
+	Like :func:`request_matches`, but search the snapshots on the snapshot thread (see :data:`snapshot_executor`).
+
+	The previous search is cancelled if it hasn't started.
+	"""
+	global pending_snapshot_search
+	if pending_snapshot_search is not None:
+		pending_snapshot_search.cancel()
+	future=snapshot_executor.submit(search_snapshots_with_hot_first, query)
+	pending_snapshot_search=future
+	future.add_done_callback(lambda future: show_searched_matches(query, future))
+
+def search_snapshots_with_hot_first(query: str)->Optional[List[Tuple[str, Entry]]]:
+	"""
+	Runs on the snapshot thread. Show the matches among the hot entries (if any), then return the full result.
+	"""
+	hot_result=search_snapshots_hot(query)
+	if hot_result is None:
+		return None
+	if hot_result:
+		show_hot_matches(query, hot_result)
+	return search_snapshots(query)
+
+@execute_on_main_thread
+def show_hot_matches(query: str, result: List[Tuple[str, Entry]])->None:
+	# posted before the full result, which replaces it
+	if state is WINDOW_OPEN and query==last_query:
+		show_matches(result, complete=False)
+
+@execute_on_main_thread
+def show_searched_matches(query: str, future: Future)->None:
+	global pending_snapshot_search
+	if future is pending_snapshot_search:
+		pending_snapshot_search=None
+	if future.cancelled() or state is not WINDOW_OPEN or query!=last_query:
+		return
+	result=future.result()
+	if result is None:  # the snapshots became out of date in the meantime
+		request_matches(query)
+	else:
+		show_matches(result)
+
+def request_matches(query: str)->None:
+	"""
+	Like :func:`repopulate_matches`, but search in the Plover process without blocking the GUI:
+	the table is filled when the results arrive, unless the query has changed in the meantime.
+
+	The requests of the previous query that haven't started are cancelled.
+	"""
+	for future in pending_searches:
+		rpc_client.cancel(future)
+	full=rpc_client.request("search_diff", query, latest_result_id)
+	hot=rpc_client.request("search_hot", query)
+	pending_searches[:]=[hot, full]
+	hot.add_done_callback(lambda hot: show_requested_matches(query, hot, full))
+	full.add_done_callback(lambda full: show_requested_matches(query, full, None))
+
+@execute_on_main_thread
+def show_requested_matches(query: str, future: Future, full: Optional[Future])->None:
+	"""
+	Parameters:
+		full: the request of the full search if ``future`` is the request of the hot search
+			(whose result is not shown once the full result is available), otherwise None.
+	"""
+	global latest_result_id
+	if future in pending_searches:
+		pending_searches.remove(future)
+	try:
+		result=future.result()
+	except rpc.CancelledRequest:
+		return
+	except RuntimeError as e:
+		if state is WINDOW_OPEN and query==last_query:
+			show_error(str(e))
+		return
+	if full is None:
+		result_id, base, diff=result
+		if base is not None and base not in known_results:
+			return  # sent before the dialog is opened again, or very late
+		result=apply_diff(known_results[base] if base is not None else [], diff)
+		known_results[result_id]=result
+		for old_id in [old_id for old_id in known_results if old_id<=result_id-2*RESULT_HISTORY]:
+			del known_results[old_id]
+		latest_result_id=max(result_id, latest_result_id or 0)
+	if state is not WINDOW_OPEN or query!=last_query or (full is not None and full.done()):
+		return
+	if full is None:
+		show_matches(result)
+	elif result:
+		show_matches(result, complete=False)
 
 @throttle(0.05)
 @execute_on_main_thread
@@ -283,12 +764,14 @@ def repopulate_matches_delayed(query: str)->None:
 	repopulate_matches(query)
 
 def description_search_changed(text: str)->None:
-	if state is PROGRAMMATICALLY_EDITING_DESCRIPTION or isinstance(state, Editing):
+	if state is PROGRAMMATICALLY_EDITING_DESCRIPTION or isinstance(state, (Editing, BatchEditing)):
 		return
 	if state is WINDOW_CLOSED:
 		# this might happen if the description text is modified right before the dialog is closed
 		return
 	assert state is WINDOW_OPEN, state
+	if trace.tracer is not None:
+		trace.tracer.instant("type", "input", {"text": text})
 	repopulate_matches_delayed(text)
 
 def brief_changed(text: str)->None:
@@ -297,7 +780,7 @@ def brief_changed(text: str)->None:
 		text=""
 	else:
 		outline_str=html.escape("/".join(outline))
-		result=message.func.lookup(outline)
+		result=rpc_client.call("lookup", outline)
 		if result is None:
 			text=f'<b><code>{outline_str}</code></b> is not mapped in any dictionary'
 		else:
@@ -308,6 +791,48 @@ def brief_changed(text: str)->None:
 dialog.description.textChanged.connect(description_search_changed)
 dialog.brief.textChanged.connect(brief_changed)
 
+def call_when(condition: Callable[[], bool], function: Callable[[], None])->None:
+	"""
+	Call ``function`` on the main thread as soon as ``condition`` holds, checking it every millisecond.
+	"""
+	if condition():
+		function()
+	else:
+		QTimer.singleShot(1, lambda: call_when(condition, function))
+
+if os.environ.get(HARNESS_ENVIRONMENT_VARIABLE):
+	@message.register_func_with_callback
+	@execute_on_main_thread
+	def harness_type(callback, args, kwargs)->None:
+		"""
+		Set the search text, as if the user has typed it;
+		return (the number of rows) once the full result is shown.
+		"""
+		text,=args
+		dialog.description.setText(text)
+		call_when(lambda: shown_query==text and not searching(), lambda: callback(dialog.matches.rowCount()))
+
+	@message.register_func_with_callback
+	@execute_on_main_thread
+	def harness_wait_shown(callback, args, kwargs)->None:
+		"""
+		Return once the dialog is visible and the full result of the current search text is shown.
+		"""
+		call_when(
+				lambda: dialog.isVisible() and shown_query==dialog.description.text() and not searching(),
+				lambda: callback(None))
+
+	@message.register_func_with_callback
+	@execute_on_main_thread
+	def harness_pick(callback, args, kwargs)->None:
+		"""
+		Select a row and press [Pick].
+		"""
+		row,=args
+		dialog.matches.setCurrentCell(row, 0)
+		pick()
+		callback(None)
+
 message.start(on_stop=lambda: app.exit(0))
 
 returncode=app.exec()
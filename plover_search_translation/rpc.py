@@ -0,0 +1,206 @@
+"""
+Multiplexed requests from the GUI process to the Plover process,
+layered over the calls of a ``subprocess_connection.Message``.
+
+Unlike ``Message.func``, whose handlers run one after another on the thread that reads the pipe,
+requests are tagged with an id and dispatched to worker threads, so several requests can be in flight
+and a slow search doesn't delay a brief lookup. Each request belongs to a lane:
+
+* :data:`LANE_ORDERED` -- modifications, picks and other calls whose order matters,
+  run one at a time in the order they're sent;
+* :data:`LANE_INTERACTIVE` -- quick calls such as lookups, run by the worker pool before any search;
+* :data:`LANE_SEARCH` -- searches, run by the worker pool.
+
+This module must not depend on Plover or Qt.
+"""
+
+import itertools
+import queue
+import threading
+import traceback
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from subprocess_connection import Message
+
+from . import trace
+
+
+LANE_ORDERED: int=0
+LANE_INTERACTIVE: int=1
+LANE_SEARCH: int=2
+
+WORKER_COUNT: int=3
+"""
+Number of threads of the worker pool (which runs the requests that are not in :data:`LANE_ORDERED`).
+"""
+
+
+@dataclass(frozen=True)
+class RemoteError:
+	"""
+	Sent instead of the result when the handler raises an exception.
+	"""
+	traceback: str
+
+
+class CancelledRequest(Exception):
+	"""
+	Raised by the future of a request that has been cancelled before it started.
+	"""
+
+
+class Server:
+	"""
+	Run the handlers of the requests sent by a :class:`Client` on the other end of ``message``.
+	"""
+	def __init__(self, message: Message)->None:
+		self._message: Message=message
+		self._handlers: Dict[str, Tuple[Callable, int]]={}
+		self._ordered_queue: "queue.Queue[Optional[Tuple[int, str, tuple, dict]]]"=queue.Queue()
+		self._pool_queue: "queue.PriorityQueue[Tuple[int, int, Optional[Tuple[int, str, tuple, dict]]]]"=queue.PriorityQueue()
+		self._sequence=itertools.count()
+		self._queued: Set[int]=set()
+		"""
+		Ids of the requests that have not been dispatched yet.
+		"""
+		self._cancelled: Set[int]=set()
+		"""
+		Ids of the requests in ``_queued`` that have been cancelled.
+		"""
+		self._cancelled_lock: threading.Lock=threading.Lock()
+		self._threads: list=[]
+		message.register_call(self.rpc_request)
+		message.register_call(self.rpc_cancel)
+
+	def register(self, function: Callable, lane: int)->None:
+		"""
+		Register ``function`` under its name. Must be called before :meth:`start`.
+		"""
+		assert lane in (LANE_ORDERED, LANE_INTERACTIVE, LANE_SEARCH)
+		self._handlers[function.__name__]=(function, lane)
+
+	def start(self)->None:
+		self._threads=[threading.Thread(target=self._run, args=(self._ordered_queue.get,),
+			name="plover_search_translation rpc ordered", daemon=True)]
+		self._threads+=[
+				threading.Thread(target=self._run, args=(lambda: self._pool_queue.get()[2],),
+					name=f"plover_search_translation rpc worker {i}", daemon=True)
+				for i in range(WORKER_COUNT)]
+		for thread in self._threads: thread.start()
+
+	def stop(self)->None:
+		"""
+		Stop the worker threads once they finish the current request. The pending requests are dropped.
+		"""
+		self._ordered_queue.put(None)
+		for _ in range(WORKER_COUNT):
+			self._pool_queue.put((-1, next(self._sequence), None))
+
+	def rpc_request(self, request_id: int, name: str, args: tuple, kwargs: dict)->None:
+		"""
+		Called (on the thread that reads the pipe) when the client sends a request.
+		"""
+		with trace.span(f"receive {name}", "rpc", flow=("t", trace.flow_id(request_id))):
+			_function, lane=self._handlers[name]
+			with self._cancelled_lock:
+				self._queued.add(request_id)
+			if lane==LANE_ORDERED:
+				self._ordered_queue.put((request_id, name, args, kwargs))
+			else:
+				self._pool_queue.put((lane, next(self._sequence), (request_id, name, args, kwargs)))
+
+	def rpc_cancel(self, request_id: int)->None:
+		"""
+		Called when the client doesn't need the result of a request anymore.
+		If the request hasn't started, it's dropped.
+		"""
+		with self._cancelled_lock:
+			if request_id in self._queued:
+				self._cancelled.add(request_id)
+
+	def _run(self, get: Callable[[], Optional[Tuple[int, str, tuple, dict]]])->None:
+		while True:
+			request=get()
+			if request is None:
+				return
+			request_id, name, args, kwargs=request
+			with self._cancelled_lock:
+				self._queued.discard(request_id)
+				cancelled=request_id in self._cancelled
+				self._cancelled.discard(request_id)
+			if cancelled:
+				with trace.span(f"reply {name} (cancelled)", "rpc", flow=("t", trace.flow_id(request_id))):
+					self._message.call.rpc_response(request_id, None, True)
+				continue
+			function, lane=self._handlers[name]
+			with trace.span(name, "handler", {"id": request_id, "lane": lane, "args": repr(args)[:100]},
+					flow=("t", trace.flow_id(request_id))):
+				try:
+					result=function(*args, **kwargs)
+				except Exception:
+					result=RemoteError(traceback.format_exc())
+			with trace.span(f"reply {name}", "rpc", payload=result, flow=("t", trace.flow_id(request_id))):
+				self._message.call.rpc_response(request_id, result, False)
+
+
+class Client:
+	"""
+	Send requests to the :class:`Server` on the other end of ``message``.
+
+	All methods are thread-safe.
+	"""
+	def __init__(self, message: Message)->None:
+		self._message: Message=message
+		self._pending: Dict[int, Future]={}
+		self._pending_lock: threading.Lock=threading.Lock()
+		self._request_ids=itertools.count()
+		message.register_call(self.rpc_response)
+
+	def request(self, name: str, *args: Any, **kwargs: Any)->Future:
+		"""
+		Send a request, and return a future of its result.
+
+		The future raises RuntimeError if the handler raises an exception,
+		and is cancelled if the request is cancelled (see :meth:`cancel`) before it starts.
+		Its callbacks run on the thread that reads the pipe.
+		"""
+		future: Future=Future()
+		future.set_running_or_notify_cancel()
+		with self._pending_lock:
+			request_id=next(self._request_ids)
+			self._pending[request_id]=future
+		future.request_id=request_id  # type: ignore
+		future.request_name=name  # type: ignore
+		with trace.span(f"send {name}", "rpc", {"id": request_id}, payload=(request_id, name, args, kwargs),
+				flow=("s", trace.flow_id(request_id))):
+			self._message.call.rpc_request(request_id, name, args, kwargs)
+		return future
+
+	def call(self, name: str, *args: Any, **kwargs: Any)->Any:
+		"""
+		Send a request and wait for its result.
+		"""
+		return self.request(name, *args, **kwargs).result()
+
+	def cancel(self, future: Future)->None:
+		"""
+		Tell the server that the result of the request is not needed.
+
+		The future is still resolved when the server replies (possibly with the result, if the request has started).
+		"""
+		if not future.done():
+			self._message.call.rpc_cancel(future.request_id)  # type: ignore
+
+	def rpc_response(self, request_id: int, result: Any, cancelled: bool)->None:
+		with self._pending_lock:
+			future=self._pending.pop(request_id)
+		with trace.span(f"receive reply {future.request_name}", "rpc", flow=("f", trace.flow_id(request_id))):  # type: ignore
+			if cancelled:
+				future.set_exception(CancelledRequest(request_id))
+			elif isinstance(result, RemoteError):
+				future.set_exception(RuntimeError(
+					f"Error while running remote request {request_id}. Remote traceback:\n\n{result.traceback}\n(end remote traceback)"))
+			else:
+				future.set_result(result)
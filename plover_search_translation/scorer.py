@@ -0,0 +1,264 @@
+"""
+Scorers compute the match scores of dictionary entries for a search query.
+
+A dictionary selects its scorer by name with the ``scorer`` field of the JST header.
+"""
+
+import math
+import functools
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Type
+
+from fuzzywuzzy import fuzz  # type: ignore
+
+from . import lib
+from .lib import Entry, Outline
+
+
+@dataclass(frozen=True)
+class Query:
+	"""
+	A search query, preprocessed once per search.
+	"""
+	text: str
+	outline: Outline
+	"""
+	The query interpreted as an outline.
+	"""
+	words: Tuple[str, ...]
+	"""
+	The words of the query, with a trailing ``e``/``i``/``y`` removed,
+	each of which should be contained in a good match.
+	"""
+	ratio: Callable[[str], int]=field(compare=False)
+	"""
+	Equivalent to ``fuzz.ratio`` with the query as the first argument, see :func:`make_ratio`.
+	"""
+	outline_prefix: Optional[str]=None
+	"""
+	The query, if it looks like a (partial) outline such as ``KWR-`` or ``STPH/``.
+	"""
+	outline_neighbors: Optional[Tuple[Outline, int]]=None
+	"""
+	(outline, maximum distance) if the query is of the form ``~KWR/TKPWOEU`` or ``~1 KWR/TKPWOEU``:
+	search the entries whose brief is close to the outline, see :func:`.index.outline_distance`.
+	"""
+	approximate_matches: Mapping[Entry, None]=field(default_factory=dict, compare=False)
+	"""
+	The entries that don't contain all the words, but contain each of them or a word within a few typos of it
+	(see :class:`.index.WordIndex`), as an ordered set. Set by the searcher, see :meth:`.search.Searcher._compile`.
+	"""
+
+	@staticmethod
+	def compile(text: str)->"Query":
+		words=text.split()
+		for i, word in enumerate(words):
+			if word[-1:].lower() in ("e", "i", "y"):
+				words[i]=word[:-1]
+		neighbors_match=OUTLINE_NEIGHBORS_RX.fullmatch(text)
+		return Query(
+				text=text,
+				outline=lib.text_to_outline(text),
+				words=tuple(words),
+				ratio=make_ratio(text),
+				outline_prefix=text if OUTLINE_PREFIX_RX.fullmatch(text) else None,
+				outline_neighbors=(
+					(lib.text_to_outline(neighbors_match[2]),
+						int(neighbors_match[1] or DEFAULT_OUTLINE_DISTANCE))
+					if neighbors_match else None),
+				)
+
+
+OUTLINE_PREFIX_RX=re.compile(r"[#STKPWHRAO*EUFBLGDZ0-9^+-]+(?:/[#STKPWHRAO*EUFBLGDZ0-9^+-]*)*")
+"""
+Queries that match this regular expression are also searched as partial outlines.
+(lowercase text never matches it)
+"""
+
+OUTLINE_NEIGHBORS_RX=re.compile(r"~\s*(\d+)?\s*([#STKPWHRAO*EUFBLGDZ0-9^+-]+(?:/[#STKPWHRAO*EUFBLGDZ0-9^+-]+)*)")
+
+DEFAULT_OUTLINE_DISTANCE: int=2
+"""
+Maximum outline distance for ``~OUTLINE`` queries: two keys wrong (pressed or missing).
+"""
+
+
+_similarity: Callable[[str, str], float]
+if fuzz.SequenceMatcher.__module__=="fuzzywuzzy.StringMatcher":
+	from Levenshtein import ratio as _levenshtein_ratio  # type: ignore
+	_similarity=_levenshtein_ratio  # (what fuzzywuzzy uses in this case)
+else:
+	def _similarity(a: str, b: str)->float:
+		return fuzz.SequenceMatcher(None, a, b).ratio()
+
+
+def make_ratio(text: str)->Callable[[str], int]:
+	"""
+	Return a function equivalent to ``functools.partial(fuzz.ratio, text)`` for string arguments,
+	without the overhead of the argument checks of ``fuzz.ratio`` on each call.
+	"""
+	if not text:
+		return functools.partial(fuzz.ratio, text)
+	def ratio(x: str)->int:
+		if x==text: return 100
+		if not x: return 0
+		return int(round(100*_similarity(text, x)))
+	return ratio
+
+
+def outline_prefix_score(entry: Entry)->Any:
+	"""
+	Return the match score of an entry whose brief starts with the query (as a partial outline).
+
+	It's lower than the score of exact matches (see :func:`match_score`), but higher than any other score.
+	Shorter briefs are better.
+	"""
+	return (math.inf, -len(entry.brief))
+
+
+def outline_distance_score(distance: int)->Any:
+	"""
+	Return the match score of an entry whose brief is at the given distance from the queried outline,
+	for ``~OUTLINE`` queries.
+	"""
+	return (math.inf, -distance)
+
+
+def is_exact_match(query: Query, entry: Entry)->bool:
+	return query.text==entry.translation or query.text==entry.description or query.outline==entry.brief
+
+
+APPROXIMATE_MATCH: float=0.5
+"""
+The words component of the score of the entries in :attr:`Query.approximate_matches`:
+between the entries that contain all the query words (True) and the other ones (False).
+"""
+
+
+def contains_all_words(query: Query, entry: Entry)->bool:
+	haystack=entry.search_fields.haystack
+	return all(word in haystack for word in query.words)
+
+
+def words_match(query: Query, entry: Entry)->Any:
+	"""
+	Return the words component of the match score, see :data:`APPROXIMATE_MATCH`.
+	"""
+	if contains_all_words(query, entry):
+		return True
+	return APPROXIMATE_MATCH if entry in query.approximate_matches else False
+
+
+def match_score(query: Query, entry: Entry, boost: float=0)->Any: # comparable (for the same value of query), larger is better
+	"""
+	Return the match score for searching.
+
+	Parameters:
+		boost: value to add to the similarity component, see :meth:`.usage.UsageStats.boosts`.
+	"""
+	# quickly filter out unlikely entries first for performance
+	# (is_exact_match and contains_all_words are inlined)
+	if query.text==entry.translation or query.text==entry.description or query.outline==entry.brief:
+		return (math.inf, boost)
+
+	fields=entry.search_fields
+	haystack=fields.haystack
+	matched: Any=all(word in haystack for word in query.words)
+	if not matched and entry in query.approximate_matches:
+		matched=APPROXIMATE_MATCH
+	return (
+			matched,
+			max(map(query.ratio, fields.alternatives))+boost
+			)
+
+
+class Scorer:
+	"""
+	Base class of the scorers.
+	"""
+	name: str=""
+
+	def score_batch(self, query: Query, entries: Sequence[Entry], boosts: Mapping[Entry, float])->List[Any]:
+		"""
+		Return the match scores of the entries, in the same order.
+
+		Scores are comparable for the same query, larger is better.
+
+		Parameters:
+			boosts: value to add to the similarity component of the score of some entries.
+		"""
+		raise NotImplementedError
+
+
+class FuzzywuzzyScorer(Scorer):
+	"""
+	The default scorer, which computes :func:`match_score` for each entry.
+	"""
+	name="fuzzywuzzy"
+
+	def score_batch(self, query: Query, entries: Sequence[Entry], boosts: Mapping[Entry, float])->List[Any]:
+		if boosts:
+			return [match_score(query, entry, boosts.get(entry, 0)) for entry in entries]
+		return [match_score(query, entry) for entry in entries]
+
+
+class RapidfuzzScorer(Scorer):
+	"""
+	Same scoring rule as :class:`FuzzywuzzyScorer`, but the similarity of the whole batch is computed
+	with a single call to ``rapidfuzz.process.cdist``.
+
+	The similarity values are not rounded to integers,
+	so the order of the entries might differ slightly from the default scorer.
+	"""
+	name="rapidfuzz"
+
+	def __init__(self)->None:
+		try:
+			import numpy  # type: ignore
+			from rapidfuzz import fuzz, process  # type: ignore
+		except ImportError:
+			raise RuntimeError("The rapidfuzz scorer requires the rapidfuzz package (with numpy) to be installed")
+		self._numpy=numpy
+		self._fuzz=fuzz
+		self._process=process
+
+	def score_batch(self, query: Query, entries: Sequence[Entry], boosts: Mapping[Entry, float])->List[Any]:
+		if not entries: return []
+		choices: List[str]=[]
+		starts: List[int]=[]
+		for entry in entries:
+			starts.append(len(choices))
+			choices.extend(entry.search_fields.alternatives)
+		ratios=self._process.cdist([query.text], choices, scorer=self._fuzz.ratio)[0]
+		similarities=self._numpy.maximum.reduceat(ratios, starts).tolist()
+
+		result: List[Any]=[]
+		for entry, similarity in zip(entries, similarities):
+			boost=boosts.get(entry, 0) if boosts else 0
+			if is_exact_match(query, entry):
+				result.append((math.inf, boost))
+			else:
+				result.append((words_match(query, entry), similarity+boost))
+		return result
+
+
+SCORERS: Dict[str, Type[Scorer]]={
+		scorer.name: scorer for scorer in (FuzzywuzzyScorer, RapidfuzzScorer)
+		}
+
+DEFAULT_SCORER: str=FuzzywuzzyScorer.name
+
+_instances: Dict[str, Scorer]={}
+
+def get_scorer(name: str)->Scorer:
+	"""
+	Return the (shared) scorer with the given name.
+
+	Raise RuntimeError if there's no such scorer, or if it cannot be used.
+	"""
+	if name not in _instances:
+		if name not in SCORERS:
+			raise RuntimeError(f"Unknown scorer: {name}")
+		_instances[name]=SCORERS[name]()
+	return _instances[name]
@@ -5,7 +5,9 @@ def main()->None:
 
 	parser=argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 	parser.add_argument("target_dictionary", type=Path, help="Path to target (JST) dictionary to add to.")
-	parser.add_argument("source_json_dictionary", type=Path, help="Path to source (JSON) dictionary.")
+	parser.add_argument("source_json_dictionary", type=Path, nargs="*",
+			help="Path to source (JSON) dictionaries. "
+			"All of them are imported in one run, and the target dictionary is saved once at the end.")
 	parser.add_argument("-d", "--description", type=str, default="Imported from {source_stem}",
 			help="What to fill in the description field. "
 			"Interpreted as a Python f-string with "
@@ -16,61 +18,131 @@ def main()->None:
 	parser.add_argument("--restore-from-backup-file", action="store_true")
 	parser.add_argument("--force", help="Add entries even if there are invalid (conflicting) entries. "
 			"Entries in the original JST dictionary are prioritized.", action="store_true")
+	parser.add_argument("--progress-interval", type=int, default=100000,
+			help="Report the progress every this many source entries. 0 to disable.")
 	args=parser.parse_args()
 
-	import json
-	from ..dictionary import Dictionary
+	import os
+	import string
+	import shutil
+	import time
 	from ..lib import Entry
-	from typing import Dict
-	import typing
+	from ..jsonstream import iter_object_items
+	from ..jst import JstReader, write_jst
+	from .jst_tool import EntryChecker
+	from typing import Iterator, List
 	import tempfile
 	import sys
 
 	backup_path= Path(tempfile.gettempdir()) / (args.target_dictionary.stem + "__backup")
 	if args.restore_from_backup_file:
 		try:
-			content: str=backup_path.read_text()
-		except:
+			shutil.copyfile(backup_path, args.target_dictionary)
+		except OSError:
 			raise RuntimeError(f"Cannot read from backup file at {backup_path}")
-		args.target_dictionary.write_text(content)
 		return
 
-	if args.create_backup_file:
-		backup_path.write_text(args.target_dictionary.read_text())
+	if not args.source_json_dictionary:
+		parser.error("at least one source_json_dictionary is required")
 
-	source_data: Dict[str, str]=json.loads(args.source_json_dictionary.read_text())
-	for translation in source_data.values():
-		if not isinstance(translation, str):
-			raise RuntimeError(f"Invalid source_json_dictionary {args.source_json_dictionary}")
+	if args.create_backup_file:
+		shutil.copyfile(args.target_dictionary, backup_path)
 
-	dictionary=Dictionary.load(str(args.target_dictionary))
-	fixed_parameters=dict(
-			source_stem=args.source_json_dictionary.stem,
-			source_absolute=args.source_json_dictionary.absolute(),
+	per_entry_fields={"outline", "translation", "output"}
+	description_is_constant=not any(
+			field_name in per_entry_fields
+			for _literal, field_name, _format_spec, _conversion in string.Formatter().parse(args.description)
 			)
 
-	invalid_entries=dictionary._add_multiple(
-			Entry(
-				translation=translation,
-				description=args.description.format(
-					outline=outline,
-					translation=translation, output=translation,
-					**fixed_parameters
-					),
-				brief=tuple(outline.split("/"))
+	start_time=time.perf_counter()
+	total_count=0
+
+	def report(source: Path, count: int, done: bool)->None:
+		elapsed=time.perf_counter()-start_time
+		print(f"{source.name}: {count} entries{' (done)' if done else ''}, "
+				f"{total_count} in total, {total_count/max(elapsed, 1e-9):.0f} entries/s",
+				file=sys.stderr)
+
+	def source_entries(source: Path)->Iterator[Entry]:
+		nonlocal total_count
+		fixed_parameters=dict(
+				source_stem=source.stem,
+				source_absolute=source.absolute(),
 				)
-			for outline, translation in source_data.items())
-	if invalid_entries:
-		print("Found some invalid entries.", file=sys.stderr)
-		if args.force:
-			print("All valid entries will be added to the dictionary.", file=sys.stderr)
-		else:
-			print("Run with --force to force add.", file=sys.stderr)
-			print("Invalid entries:", file=sys.stderr)
-			for entry in invalid_entries:
-				print(entry, file=sys.stderr)
-			return
-	dictionary.save()
+		constant_description=args.description.format(**fixed_parameters) if description_is_constant else None
+		count=0
+		with source.open("r", encoding="u8") as f:
+			for outline, translation in iter_object_items(f):
+				if not isinstance(translation, str):
+					raise RuntimeError(f"Invalid source_json_dictionary {source}")
+				yield Entry(
+						translation=translation,
+						description=(
+							constant_description if constant_description is not None else
+							args.description.format(
+								outline=outline,
+								translation=translation, output=translation,
+								**fixed_parameters
+								)
+							),
+						brief=tuple(outline.split("/"))
+						)
+				count+=1
+				total_count+=1
+				if args.progress_interval and count%args.progress_interval==0:
+					report(source, count, done=False)
+		if args.progress_interval:
+			report(source, count, done=True)
+
+	# the target is streamed through instead of loaded as a Dictionary,
+	# which would also build the search indexes and load the usage statistics
+	checker=EntryChecker()
+	invalid_entries: List[Entry]=[]
+	target_invalid_entries: List[Entry]=[]
+	written_count=0
+
+	def valid_entries(entries: Iterator[Entry], invalid: List[Entry])->Iterator[Entry]:
+		nonlocal written_count
+		for entry in entries:
+			if checker.check(entry) is None:
+				written_count+=1
+				yield entry
+			else:
+				invalid.append(entry)
+
+	temporary_path=args.target_dictionary.with_name(args.target_dictionary.name+".tmp")
+	try:
+		with args.target_dictionary.open("r", encoding="u8") as f, temporary_path.open("w", encoding="u8") as f_out:
+			reader=JstReader(f)
+			header=reader.read_header()
+			if header.get("version", 1)!=1:
+				raise RuntimeError(f"Unsupported dictionary version: {header['version']}")
+
+			def entries()->Iterator[Entry]:
+				yield from valid_entries(iter(reader), target_invalid_entries)
+				for source in args.source_json_dictionary:
+					yield from valid_entries(source_entries(source), invalid_entries)
+
+			write_jst(f_out, header, entries())
+
+		if target_invalid_entries:
+			print(f"Dropped {len(target_invalid_entries)} invalid entries of the target dictionary.", file=sys.stderr)
+		if invalid_entries:
+			print("Found some invalid entries.", file=sys.stderr)
+			if args.force:
+				print("All valid entries will be added to the dictionary.", file=sys.stderr)
+			else:
+				print("Run with --force to force add.", file=sys.stderr)
+				print("Invalid entries:", file=sys.stderr)
+				for entry in invalid_entries:
+					print(entry, file=sys.stderr)
+				return
+		os.replace(temporary_path, args.target_dictionary)
+	finally:
+		temporary_path.unlink(missing_ok=True)  # unless it has replaced the target
+	if args.progress_interval:
+		print(f"Saved {written_count} entries to {args.target_dictionary} "
+				f"in {time.perf_counter()-start_time:.1f}s", file=sys.stderr)
 
 
 if __name__=="__main__":
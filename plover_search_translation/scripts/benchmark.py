@@ -0,0 +1,609 @@
+#!/bin/python
+"""
+Benchmarks of the search implementation on synthetic dictionaries.
+
+Run with ``python -m plover_search_translation.scripts.benchmark <benchmark> [options]``.
+"""
+
+import math
+import random
+import statistics
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from ..lib import Entry, text_to_outline
+
+
+LETTERS="abcdefghijklmnoprstuvwy"
+
+
+def random_words(rng: random.Random, count: int)->List[str]:
+	return ["".join(rng.choice(LETTERS) for _ in range(rng.randint(2, 9))) for _ in range(count)]
+
+
+def random_stroke(rng: random.Random)->str:
+	left="".join(key for key in "STKPWHR" if rng.random()<0.2)
+	vowels="".join(key for key in "AOEU" if rng.random()<0.3) or "-"
+	right="".join(key for key in "FRPBLGTSDZ" if rng.random()<0.15)
+	return left+vowels+right
+
+
+def random_entries(size: int, seed: int=0)->List[Entry]:
+	"""
+	Return ``size`` distinct random entries, 80% of which have a brief.
+	"""
+	rng=random.Random(seed)
+	words=random_words(rng, 5000)
+	briefs=set()
+	result: List[Entry]=[]
+	while len(result)<size:
+		brief: tuple=()
+		if rng.random()<0.8:
+			brief=tuple(random_stroke(rng) for _ in range(rng.randint(1, 3)))
+			if brief in briefs: continue
+			briefs.add(brief)
+		result.append(Entry(
+			translation=" ".join(rng.choices(words, k=rng.randint(1, 3))),
+			description="|".join(
+				" ".join(rng.choices(words, k=rng.randint(1, 4)))
+				for _ in range(rng.randint(1, 2))),
+			brief=brief,
+			))
+	return result
+
+
+def random_queries(entries: Sequence[Entry], count: int, seed: int=1)->List[str]:
+	"""
+	Return queries that look like what an user would type: prefixes of translations/descriptions, with some typos.
+	"""
+	rng=random.Random(seed)
+	result: List[str]=[]
+	for _ in range(count):
+		entry=rng.choice(entries)
+		text=rng.choice((entry.translation, entry.description))
+		query=text[:rng.randint(2, max(2, len(text)))]
+		if len(query)>3 and rng.random()<0.3:
+			i=rng.randrange(len(query))
+			query=query[:i]+rng.choice(LETTERS)+query[i+1:]
+		result.append(query)
+	return result
+
+
+def make_dictionary(entries: Sequence[Entry])->Any:
+	from ..dictionary import Dictionary
+	dictionary=Dictionary()
+	invalid_entries=dictionary._add_multiple(entries)
+	assert not invalid_entries
+	return dictionary
+
+
+def timed(function: Callable[[], Any])->float:
+	start_time=time.perf_counter()
+	function()
+	return time.perf_counter()-start_time
+
+
+def reference_match_score(query: str, entry: Entry)->Any:
+	"""
+	The match score computation before the normalized search fields and compiled queries were introduced.
+	"""
+	from fuzzywuzzy import fuzz  # type: ignore
+	if query==entry.translation or query==entry.description or text_to_outline(query)==entry.brief:
+		return (math.inf, 0)
+
+	words=query.split()
+	for i, word in enumerate(words):
+		if word[-1:].lower() in ("e", "i", "y"):
+			words[i]=word[:-1]
+
+	return (
+			all(word in entry.description or word in entry.translation for word in words),
+			max(
+			fuzz.ratio(query, x)
+			for x in [entry.translation] + entry.description.split("|")
+			)
+			)
+
+
+def benchmark_search(args: Any)->None:
+	entries=random_entries(args.entries)
+	queries=random_queries(entries, args.queries)
+
+	load_time=timed(lambda: make_dictionary(entries))
+	dictionary=make_dictionary(entries)
+	print(f"{args.entries} entries, {args.queries} queries, loading takes {load_time:.3f}s")
+
+	reference_results: List[List[Entry]]=[]
+	reference_time=timed(lambda: reference_results.extend(
+		sorted(entries, key=lambda entry: reference_match_score(query, entry), reverse=True)[:100]
+		for query in queries))
+	results: List[List[Entry]]=[]
+	search_time=timed(lambda: results.extend(dictionary.search(query) for query in queries))
+
+	print(f"reference: {reference_time/args.queries*1000:.1f}ms per query")
+	print(f"current:   {search_time/args.queries*1000:.1f}ms per query ({reference_time/search_time:.2f}x)")
+	mismatches=sum(a!=b for a, b in zip(reference_results, results))
+	print(f"queries with a different result: {mismatches}")
+
+
+def benchmark_outline_neighbors(args: Any)->None:
+	from ..index import BKTree, outline_distance, outline_key_bits
+	rng=random.Random(2)
+	for size in args.entries:
+		entries=[entry for entry in random_entries(size) if entry.brief]
+		tree=BKTree()
+		build_time=timed(tree.start_build(entries))
+		queries=[rng.choice(entries).brief for _ in range(args.queries)]
+
+		results: List[Any]=[]
+		search_time=timed(lambda: results.extend(tree.within(query, args.distance) for query in queries))
+
+		def linear_scan(query: Sequence[str])->List[Any]:
+			strokes=outline_key_bits(query)
+			result=[(outline_distance(strokes, outline_key_bits(entry.brief)), entry) for entry in entries]
+			return sorted((item for item in result if item[0]<=args.distance), key=lambda item: (item[0], item[1].brief))
+		reference_results: List[Any]=[]
+		scan_time=timed(lambda: reference_results.extend(linear_scan(query) for query in queries))
+
+		print(f"{size} entries: build {build_time:.2f}s, "
+				f"BK-tree {search_time/args.queries*1000:.1f}ms per query, "
+				f"linear scan {scan_time/args.queries*1000:.1f}ms per query, "
+				f"{sum(map(len, results))/args.queries:.1f} results per query, "
+				f"{'same' if results==reference_results else 'DIFFERENT'} results")
+
+
+def benchmark_snapshot(args: Any)->None:
+	import os
+	import tempfile
+	from ..snapshot import Snapshot, write_snapshot
+	entries=random_entries(args.entries)
+	queries=random_queries(entries, args.queries)
+	dictionary=make_dictionary(entries)
+	dictionary.path="benchmark.jst"
+	timed(dictionary._substring_index.start_build(dictionary.entries))
+	timed(dictionary._word_index.start_build(dictionary.entries))
+
+	with tempfile.TemporaryDirectory() as directory:
+		path=os.path.join(directory, "benchmark.snapshot")
+		write_time=timed(lambda: write_snapshot(path, dictionary.snapshot_data()))
+		snapshots: List[Any]=[]
+		open_time=timed(lambda: snapshots.append(Snapshot(path)))
+		snapshot=snapshots[0]
+		decode_time=timed(snapshot.load)
+		print(f"{args.entries} entries: snapshot of {os.path.getsize(path)/1e6:.1f}MB written in {write_time:.3f}s, "
+				f"mapped in {open_time*1000:.2f}ms, entries decoded in {decode_time:.3f}s")
+
+		results: List[Any]=[]
+		search_time=timed(lambda: results.extend(snapshot._search(query) for query in queries))
+		reference_results: List[Any]=[]
+		reference_time=timed(lambda: reference_results.extend(dictionary.search(query) for query in queries))
+		print(f"snapshot:   {search_time/args.queries*1000:.1f}ms per query")
+		print(f"dictionary: {reference_time/args.queries*1000:.1f}ms per query")
+		print(f"queries with a different result: {sum(a!=b for a, b in zip(reference_results, results))}")
+
+		# the next generation, with 1% of the entries edited
+		rng=random.Random(5)
+		for i in rng.sample(range(len(entries)), len(entries)//100):
+			old=dictionary.entries[i]
+			assert dictionary._edit(old, Entry(old.translation, old.description+" edited", old.brief))
+		next_path=os.path.join(directory, "benchmark.next.snapshot")
+		write_snapshot(next_path, dictionary.snapshot_data())
+		next_snapshot=Snapshot(next_path)
+		next_decode_time=timed(lambda: next_snapshot.load(snapshot))
+		results=[next_snapshot._search(query) for query in queries]
+		reference_results=[dictionary.search(query) for query in queries]
+		print(f"next generation ({len(entries)//100} entries edited): decoded in {next_decode_time:.3f}s "
+				f"from the previous snapshot, {sum(a!=b for a, b in zip(reference_results, results))} queries with a different result")
+		del snapshot, snapshots, next_snapshot  # release the mappings before the directory is removed
+
+
+def benchmark_typos(args: Any)->None:
+	from ..index import max_typos, typo_distance
+	rng=random.Random(4)
+	entries=random_entries(args.entries)
+	queries: List[Any]=[]
+	while len(queries)<args.queries:
+		entry=rng.choice(entries)
+		words=entry.description.replace("|", " ").split()
+		i=rng.randrange(len(words))
+		if len(words[i])<5: continue
+		j=rng.randrange(1, len(words[i]))
+		words[i]=words[i][:j]+rng.choice(LETTERS)+words[i][j+1:]
+		queries.append((" ".join(words[:i+1]), entry))
+
+	dictionary=make_dictionary(entries)
+	timed(dictionary._substring_index.start_build(dictionary.entries))
+	plain_results: List[Any]=[]
+	plain_time=timed(lambda: plain_results.extend(dictionary.search(query) for query, _entry in queries))
+	build_time=timed(dictionary._word_index.start_build(dictionary.entries))
+	results: List[Any]=[]
+	search_time=timed(lambda: results.extend(dictionary.search(query) for query, _entry in queries))
+
+	word_index=dictionary._word_index
+	vocabulary=list(word_index._postings)
+	def linear_scan(word: str)->List[Any]:
+		word=word.casefold()
+		limit=max_typos(word)
+		if not limit: return []
+		return sorted(item for item in ((typo_distance(word, other, limit), other) for other in vocabulary) if item[0]<=limit)
+	words=[word for query, _entry in queries for word in query.split()]
+	close_words_time=timed(lambda: [word_index.close_words(word) for word in words])
+	mismatches=sum(word_index.close_words(word)!=linear_scan(word) for word in words)
+
+	print(f"{args.entries} entries, {len(vocabulary)} distinct words: word index built in {build_time:.2f}s, "
+			f"{close_words_time/len(words)*1e6:.0f}us per word lookup, {mismatches} lookups different from a linear scan")
+	for name, search_time, result in (("without word index", plain_time, plain_results), ("with word index", search_time, results)):
+		found=sum(entry in matches for (_query, entry), matches in zip(queries, result))
+		print(f"{name}: {search_time/args.queries*1000:.1f}ms per query, "
+				f"intended entry in the result of {found}/{args.queries} misspelled queries")
+
+
+def benchmark_edit_distance(args: Any)->None:
+	from ..dictionary import edit_distance_mod, edit_distance_mod_packed
+	rng=random.Random(3)
+	words=random_words(rng, 1000)
+	for length in args.lengths:
+		descriptions=[" ".join(rng.choices(words, k=length))[:length] for _ in range(args.queries)]
+		queries=[description[:rng.randint(3, 12)] for description in descriptions]
+		rng.shuffle(queries)
+		pairs=list(zip(queries, descriptions))
+		reference_time=timed(lambda: [edit_distance_mod(query, description) for query, description in pairs])
+		packed_time=timed(lambda: [edit_distance_mod_packed(query, description) for query, description in pairs])
+		print(f"description length {length}: "
+				f"reference {reference_time/len(pairs)*1e6:.0f}us, "
+				f"packed {packed_time/len(pairs)*1e6:.0f}us per pair ({reference_time/packed_time:.2f}x)")
+
+
+def benchmark_anytime(args: Any)->None:
+	entries=random_entries(args.entries)
+	queries=random_queries(entries, args.queries)
+	dictionary=make_dictionary(entries)
+	timed(dictionary._substring_index.start_build(dictionary.entries))
+	timed(dictionary._word_index.start_build(dictionary.entries))
+
+	full_times: List[float]=[]
+	full_results: List[List[Entry]]=[]
+	for query in queries:
+		full_times.append(timed(lambda: full_results.append(dictionary.search(query))))
+	print(f"{args.entries} entries, {args.queries} queries: search {percentiles(full_times)}")
+
+	for budget in args.budgets:
+		times: List[float]=[]
+		complete_count=different=0
+		found=expected=0
+		for query, full_result in zip(queries, full_results):
+			results: List[Any]=[]
+			times.append(timed(lambda: results.append(dictionary.search_until(query, time.monotonic()+budget/1000))))
+			result, complete=results[0]
+			if complete:
+				complete_count+=1
+				different+=result!=full_result
+			else:
+				found+=len({*result[:10]}&{*full_result[:10]})
+				expected+=len(full_result[:10])
+		print(f"budget {budget}ms: {percentiles(times)}, {complete_count}/{args.queries} complete "
+				f"({different} different from search)"
+				+ (f", incomplete results contain {found}/{expected} of the 10 best matches" if expected else ""))
+
+
+def resident_memory()->str:
+	"""
+	Return the resident set size of this process, split into anonymous and file-backed memory on Linux
+	(the mapped descriptions of the low-memory mode are file-backed, so the system can reclaim them).
+	"""
+	try:
+		with open("/proc/self/status") as f:
+			fields=dict(line.split(":", 1) for line in f)
+		fields={name: value.split()[0] for name, value in fields.items() if name in ("VmRSS", "RssAnon", "RssFile")}
+		return (f"RSS {int(fields['VmRSS'])/1024:.0f}MB "
+				f"(anonymous {int(fields['RssAnon'])/1024:.0f}MB, file-backed {int(fields['RssFile'])/1024:.0f}MB)")
+	except OSError:
+		import resource
+		return f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024:.0f}MB"  # kilobytes on Linux
+
+
+def _measure_memory(path: str, queries: Sequence[str])->str:
+	"""
+	Load the dictionary at ``path`` and search the queries, in a fresh process (see :func:`benchmark_memory`).
+	"""
+	import gc
+	from ..dictionary import Dictionary
+	before=resident_memory()
+	start_time=time.perf_counter()
+	dictionary=Dictionary.load(path)
+	dictionary.wait_for_indexes()
+	load_time=time.perf_counter()-start_time
+	gc.collect()
+	loaded=resident_memory()
+	search_time=timed(lambda: [dictionary.search(query) for query in queries])
+	return (f"before loading: {before}; loaded in {load_time:.2f}s: {loaded}; "
+			f"after searching ({search_time/len(queries)*1000:.0f}ms per query): {resident_memory()}")
+
+
+def benchmark_memory(args: Any)->None:
+	import multiprocessing
+	import os
+	import tempfile
+	from ..jst import write_jst
+	context=multiprocessing.get_context("spawn")
+	for size in args.entries:
+		entries=random_entries(size)
+		queries=random_queries(entries, args.queries)
+		with tempfile.TemporaryDirectory() as directory:
+			for low_memory in (False, True):
+				path=os.path.join(directory, f"benchmark-{low_memory}.jst")
+				with open(path, "w", encoding="u8") as f:
+					write_jst(f, {"search_stroke": "TPH-D", "accept_stroke": "", "low_memory": low_memory}, entries)
+				with context.Pool(1) as pool:
+					result=pool.apply(_measure_memory, (path, queries))
+				print(f"{size} entries, {'low-memory mode' if low_memory else 'default'}: {result}")
+
+
+def _measure_backend(path: str, queries: Sequence[str], entries: Sequence[Entry])->Tuple[str, List[List[Entry]]]:
+	"""
+	Load the dictionary at ``path`` (a SQLite database if it ends with ``.jstdb``) in a fresh process,
+	and measure the lookups, reverse lookups, searches and saved modifications (see :func:`benchmark_sqlite`).
+	Also return the search results.
+	"""
+	import gc
+	from ..dictionary import Dictionary, SqliteDictionary
+	dictionary_class=SqliteDictionary if path.endswith(".jstdb") else Dictionary
+	start_time=time.perf_counter()
+	dictionary=dictionary_class.load(path)
+	dictionary.wait_for_indexes()
+	load_time=time.perf_counter()-start_time
+	gc.collect()
+	loaded=resident_memory()
+
+	lookup_time=timed(lambda: [dictionary.get(entry.brief) for entry in entries if entry.brief])
+	reverse_lookup_time=timed(lambda: [dictionary.reverse_lookup(entry.translation) for entry in entries])
+	results: List[List[Entry]]=[]
+	search_times=[timed(lambda: results.append(dictionary.search(query))) for query in queries]
+	searched=resident_memory()
+
+	modification_times: List[float]=[]
+	for i, entry in enumerate(entries[:20]):
+		new_entry=Entry(translation=entry.translation+" (new)", description=entry.description, brief=(f"TEFT{i}",))
+		edited_entry=Entry(translation=new_entry.translation, description="edited", brief=new_entry.brief)
+		for modify in (
+				lambda: dictionary.add(new_entry),
+				lambda: dictionary.edit(new_entry, edited_entry),
+				lambda: dictionary.remove(edited_entry)):
+			modification_times.append(timed(lambda: (modify(), dictionary.save())))
+	return (f"loaded in {load_time:.2f}s ({loaded}); "
+			f"lookup {lookup_time/len(entries)*1e6:.0f}us, reverse lookup {reverse_lookup_time/len(entries)*1e6:.0f}us; "
+			f"search {percentiles(search_times)} ({searched}); "
+			f"modification and save {percentiles(modification_times)}"), results
+
+
+def benchmark_sqlite(args: Any)->None:
+	import multiprocessing
+	import os
+	import tempfile
+	from pathlib import Path
+	from ..jst import write_jst
+	from ..sqlite_store import import_jst
+	context=multiprocessing.get_context("spawn")
+	for size in args.entries:
+		entries=random_entries(size)
+		queries=random_queries(entries, args.queries)
+		sample=random.Random(2).sample(entries, min(args.lookups, size))
+		with tempfile.TemporaryDirectory() as directory:
+			path=os.path.join(directory, "benchmark.jst")
+			with open(path, "w", encoding="u8") as f:
+				write_jst(f, {"search_stroke": "TPH-D", "accept_stroke": ""}, entries)
+			database_path=os.path.join(directory, "benchmark.jstdb")
+			import_time=timed(lambda: import_jst(Path(path), Path(database_path)))
+			print(f"{size} entries: JST file {os.path.getsize(path)/1e6:.1f}MB, "
+					f"imported in {import_time:.2f}s to a {os.path.getsize(database_path)/1e6:.1f}MB database")
+			all_results: List[List[List[Entry]]]=[]
+			for name, backend_path in (("in memory", path), ("SQLite", database_path)):
+				with context.Pool(1) as pool:
+					summary, results=pool.apply(_measure_backend, (backend_path, queries, sample))
+				all_results.append(results)
+				print(f"  {name}: {summary}")
+			same_matches=sum({*a}=={*b} for a, b in zip(*all_results))
+			same_order=sum(a==b for a, b in zip(*all_results))
+			print(f"  {same_matches}/{len(queries)} queries with the same matches, {same_order} in the same order "
+					"(the in-memory dictionary also matches words with typos)")
+
+
+class StubTranslator:
+	"""
+	Records the time at which each translation is injected, see :func:`.lib.inject_translation`.
+	"""
+	def __init__(self)->None:
+		self.translated: threading.Event=threading.Event()
+
+	def translate_translation(self, translation: Any)->None:
+		self.translated.set()
+
+	def translate_macro(self, macro: Any)->None:
+		self.translated.set()
+
+	def flush(self)->None:
+		pass
+
+
+class StubDictionaries:
+	def __init__(self, dictionaries: Sequence[Any])->None:
+		self.dicts=list(dictionaries)
+
+	def __getitem__(self, path: str)->Any:
+		for dictionary in self.dicts:
+			if dictionary.path==path:
+				return dictionary
+		raise KeyError(path)
+
+	def raw_lookup(self, outline: Sequence[str])->Optional[str]:
+		for dictionary in self.dicts:
+			if dictionary.enabled:
+				result=dictionary.get(tuple(outline))
+				if result is not None:
+					return result
+		return None
+
+
+class StubEngine:
+	"""
+	The part of Plover's ``StenoEngine`` used by :class:`.manager.Manager`.
+	"""
+	def __init__(self, dictionaries: Sequence[Any])->None:
+		self.dictionaries=StubDictionaries(dictionaries)
+		self._translator=StubTranslator()
+		self._config: Dict[str, Any]={}
+
+	def __enter__(self)->"StubEngine":
+		return self
+
+	def __exit__(self, *args: Any)->None:
+		pass
+
+	def __getitem__(self, key: str)->Any:
+		return self._config.get(key)
+
+	def __setitem__(self, key: str, value: Any)->None:
+		self._config[key]=value
+
+
+def percentiles(values: Sequence[float])->str:
+	if len(values)<2:
+		return f"p50 {values[0]*1000:.1f}ms" if values else "no sample"
+	p99=statistics.quantiles(values, n=100, method="inclusive")[98]
+	return f"p50 {statistics.median(values)*1000:.1f}ms, p99 {p99*1000:.1f}ms"
+
+
+def benchmark_latency(args: Any)->None:
+	"""
+	Drive the real dialog (in the GUI process, with Qt's offscreen platform) from a :class:`.manager.Manager`
+	running against a stub engine, and measure the latencies seen by the user.
+	"""
+	import os
+	from plover import system  # type: ignore
+	from plover.config import DEFAULT_SYSTEM_NAME  # type: ignore
+	from plover.registry import registry  # type: ignore
+	from .. import commands
+	from ..lib import HARNESS_ENVIRONMENT_VARIABLE
+	from ..manager import Manager
+	registry.update()
+	system.setup(DEFAULT_SYSTEM_NAME)
+	os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+	os.environ[HARNESS_ENVIRONMENT_VARIABLE]="1"
+
+	for size in args.entries:
+		entries=random_entries(size)
+		queries=random_queries(entries, args.trials)
+		dictionary=make_dictionary(entries)
+		dictionary.path="benchmark.jst"
+		dictionary.search_stroke="TPH-D"
+		dictionary.snapshot_search=args.snapshot
+		engine=StubEngine([dictionary])
+		manager=Manager(engine)
+		manager.start()
+		message=manager._message
+		assert message is not None
+		try:
+			open_times: List[float]=[]
+			type_times: List[float]=[]
+			pick_times: List[float]=[]
+			for query in queries:
+				start_time=time.perf_counter()
+				command=dictionary[(dictionary.search_stroke,)]
+				assert command.startswith("{:command:plover_search_translation_open_dialog:")
+				commands.open_dialog(engine, dictionary.path)
+				message.func.harness_wait_shown()
+				open_times.append(time.perf_counter()-start_time)
+
+				for length in range(1, len(query)+1):
+					type_times.append(timed(lambda: message.func.harness_type(query[:length])))
+
+				engine._translator.translated.clear()
+				start_time=time.perf_counter()
+				message.func.harness_pick(0)
+				engine._translator.translated.wait()
+				pick_times.append(time.perf_counter()-start_time)
+		finally:
+			manager.stop()
+		print(f"{size} entries ({len(type_times)} keystrokes): "
+				f"open {percentiles(open_times)}; "
+				f"search as you type {percentiles(type_times)}; "
+				f"pick {percentiles(pick_times)}")
+
+
+def main()->None:
+	import argparse
+
+	parser=argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+			description=__doc__)
+	subparsers=parser.add_subparsers(dest="benchmark", required=True)
+
+	search_parser=subparsers.add_parser("search",
+			help="Compare Dictionary.search against the reference (unoptimized) implementation.")
+	search_parser.add_argument("--entries", type=int, default=100000)
+	search_parser.add_argument("--queries", type=int, default=10)
+	search_parser.set_defaults(function=benchmark_search)
+
+	neighbors_parser=subparsers.add_parser("outline-neighbors",
+			help="Compare the BK-tree search of close outlines against a linear scan, for several dictionary sizes.")
+	neighbors_parser.add_argument("--entries", type=int, nargs="+", default=[10000, 30000, 100000])
+	neighbors_parser.add_argument("--queries", type=int, default=50)
+	neighbors_parser.add_argument("--distance", type=int, default=2)
+	neighbors_parser.set_defaults(function=benchmark_outline_neighbors)
+
+	snapshot_parser=subparsers.add_parser("snapshot",
+			help="Measure writing and mapping a snapshot, and searching on it.")
+	snapshot_parser.add_argument("--entries", type=int, default=100000)
+	snapshot_parser.add_argument("--queries", type=int, default=10)
+	snapshot_parser.set_defaults(function=benchmark_snapshot)
+
+	typos_parser=subparsers.add_parser("typos",
+			help="Search queries with a misspelled word, with and without the word index.")
+	typos_parser.add_argument("--entries", type=int, default=100000)
+	typos_parser.add_argument("--queries", type=int, default=50)
+	typos_parser.set_defaults(function=benchmark_typos)
+
+	anytime_parser=subparsers.add_parser("anytime",
+			help="Compare Dictionary.search_until with several time budgets against Dictionary.search.")
+	anytime_parser.add_argument("--entries", type=int, default=100000)
+	anytime_parser.add_argument("--queries", type=int, default=50)
+	anytime_parser.add_argument("--budgets", type=float, nargs="+", default=[10, 30, 100, 1e6],
+			help="Time budgets in milliseconds.")
+	anytime_parser.set_defaults(function=benchmark_anytime)
+
+	memory_parser=subparsers.add_parser("memory",
+			help="Measure the resident set size after loading a dictionary and searching, with and without the low-memory mode.")
+	memory_parser.add_argument("--entries", type=int, nargs="+", default=[100000])
+	memory_parser.add_argument("--queries", type=int, default=10)
+	memory_parser.set_defaults(function=benchmark_memory)
+
+	sqlite_parser=subparsers.add_parser("sqlite",
+			help="Compare the SQLite dictionary (.jstdb) against the in-memory one: "
+			"import, loading, memory, lookups, searches and saved modifications.")
+	sqlite_parser.add_argument("--entries", type=int, nargs="+", default=[10000, 100000])
+	sqlite_parser.add_argument("--queries", type=int, default=50)
+	sqlite_parser.add_argument("--lookups", type=int, default=1000, help="Number of entries looked up and reverse looked up.")
+	sqlite_parser.set_defaults(function=benchmark_sqlite)
+
+	edit_distance_parser=subparsers.add_parser("edit-distance",
+			help="Compare the speed of edit_distance_mod_packed and edit_distance_mod (their results are checked by the tests).")
+	edit_distance_parser.add_argument("--lengths", type=int, nargs="+", default=[20, 100, 400, 1600])
+	edit_distance_parser.add_argument("--queries", type=int, default=100)
+	edit_distance_parser.set_defaults(function=benchmark_edit_distance)
+
+	latency_parser=subparsers.add_parser("latency",
+			help="Measure the latencies of opening the dialog, searching as you type and picking, end to end "
+			"(requires Plover and PySide6; the dialog is shown with Qt's offscreen platform).")
+	latency_parser.add_argument("--entries", type=int, nargs="+", default=[1000, 10000, 100000])
+	latency_parser.add_argument("--trials", type=int, default=20,
+			help="Number of times the dialog is opened, a query is typed and an entry is picked.")
+	latency_parser.add_argument("--snapshot", action="store_true",
+			help="Search on snapshots in the GUI process (see the snapshot_search header field).")
+	latency_parser.set_defaults(function=benchmark_latency)
+
+	args=parser.parse_args()
+	args.function(args)
+
+
+if __name__=="__main__":
+	main()
@@ -0,0 +1,142 @@
+#!/bin/python
+"""
+Report the briefs of the JST dictionaries of a Plover dictionary stack that are also defined by other dictionaries.
+
+The dictionaries (JSON and JST) are given in the order of Plover's dictionary list: the first one has the highest priority.
+The outlines of all of them are indexed with one pass over each file,
+then each JST entry whose brief is defined by another dictionary is written as one JSON object per line:
+the dictionary, brief, translation and description of the entry, the other definitions
+(``[dictionary, translation]``, highest priority first, the translation is null for the search stroke of a JST dictionary)
+and a ``status``:
+
+* ``shadowed`` -- a dictionary with a higher priority defines the outline differently,
+  so Plover never writes the entry (it can still be picked from the dialog);
+* ``conflicting`` -- only dictionaries with a lower priority define the outline differently;
+* ``duplicate`` -- all the other definitions have the same translation.
+"""
+
+import collections
+import json
+import sys
+from pathlib import Path
+from typing import Counter, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from ..lib import Outline
+from ..jst import JstReader
+from ..jsonstream import iter_object_items
+
+
+Definition=Tuple[int, Optional[str]]
+"""
+The position of the dictionary in the stack, and the translation (None for the search stroke of a JST dictionary).
+"""
+
+STATUSES: Tuple[str, ...]=("shadowed", "conflicting", "duplicate")
+
+
+def read_definitions(path: Path)->Iterator[Tuple[Outline, Optional[str]]]:
+	"""
+	Yield the (outline, translation) pairs defined by a dictionary file, see :data:`Definition`.
+	"""
+	if path.suffix==".jst":
+		with path.open("r", encoding="u8") as f:
+			reader=JstReader(f)
+			for entry in reader:
+				if entry.brief:
+					yield entry.brief, entry.translation
+			search_stroke=reader.header.get("search_stroke")
+			if search_stroke:
+				yield (search_stroke,), None
+	elif path.suffix==".json":
+		with path.open("r", encoding="u8") as f:
+			for outline, translation in iter_object_items(f):
+				if not isinstance(translation, str):
+					raise RuntimeError(f"Invalid JSON dictionary {path}")
+				yield tuple(outline.split("/")), translation
+	else:
+		raise RuntimeError(f"Unsupported dictionary format (only JSON and JST are supported): {path}")
+
+
+def build_index(dictionaries: List[Path])->Dict[Outline, List[Definition]]:
+	"""
+	Return the definitions of each outline, highest priority first.
+	"""
+	index: Dict[Outline, List[Definition]]={}
+	for position, path in enumerate(dictionaries):
+		for outline, translation in read_definitions(path):
+			index.setdefault(outline, []).append((position, translation))
+	return index
+
+
+def classify(position: int, translation: str, definitions: List[Definition])->Optional[str]:
+	"""
+	Return the status of the entry of the dictionary at ``position`` (see the module documentation),
+	or None if no other dictionary defines its brief.
+	"""
+	others=[(other_position, other_translation) for other_position, other_translation in definitions
+			if other_position!=position]
+	if not others:
+		return None
+	if any(other_position<position and other_translation!=translation for other_position, other_translation in others):
+		return "shadowed"
+	if any(other_translation!=translation for _other_position, other_translation in others):
+		return "conflicting"
+	return "duplicate"
+
+
+def run(dictionaries: List[Path], output: TextIO)->Counter[str]:
+	"""
+	Write the report, return the number of reported entries of each status.
+	"""
+	index=build_index(dictionaries)
+	counts: Counter[str]=collections.Counter()
+	for position, path in enumerate(dictionaries):
+		if path.suffix!=".jst": continue
+		with path.open("r", encoding="u8") as f:
+			for entry in JstReader(f):
+				if not entry.brief: continue
+				definitions=index[entry.brief]
+				status=classify(position, entry.translation, definitions)
+				if status is None: continue
+				counts[status]+=1
+				output.write(json.dumps({
+					"dictionary": str(path),
+					"brief": list(entry.brief),
+					"translation": entry.translation,
+					"description": entry.description,
+					"status": status,
+					"definitions": [
+						[str(dictionaries[other_position]), other_translation]
+						for other_position, other_translation in definitions
+						if other_position!=position],
+					}, ensure_ascii=False)+"\n")
+	return counts
+
+
+def main()->None:
+	import argparse
+	import time
+
+	parser=argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+			description=__doc__)
+	parser.add_argument("dictionary", type=Path, nargs="+",
+			help="Paths to the JSON and JST dictionaries, highest priority first.")
+	parser.add_argument("-o", "--output", type=Path, help="Path to the output file. Standard output if omitted.")
+	parser.add_argument("--quiet", action="store_true", help="Don't print the statistics to the standard error.")
+	args=parser.parse_args()
+	if not any(path.suffix==".jst" for path in args.dictionary):
+		parser.error("at least one JST dictionary is required")
+
+	start_time=time.perf_counter()
+	if args.output is None:
+		counts=run(args.dictionary, sys.stdout)
+	else:
+		with args.output.open("w", encoding="u8") as f:
+			counts=run(args.dictionary, f)
+	if not args.quiet:
+		print(", ".join(f"{counts[status]} {status}" for status in STATUSES)
+				+ f" entries in {time.perf_counter()-start_time:.2f}s", file=sys.stderr)
+
+
+if __name__=="__main__":
+	main()
@@ -0,0 +1,262 @@
+#!/bin/python
+"""
+Export, diff and merge JST dictionaries, and convert them to and from SQLite databases.
+
+All the operations stream through the input files and use hash indexes,
+so they run in linear time, and at most one of the inputs is indexed in memory.
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from ..lib import Entry, Outline
+from ..jst import JstReader, write_jst
+from .. import sqlite_store
+
+
+TextKey=Tuple[str, str]
+
+
+def text_key(entry: Entry)->TextKey:
+	return (entry.translation, entry.description)
+
+
+def entry_to_json(entry: Entry)->list:
+	return [entry.translation, entry.description, list(entry.brief)]
+
+
+class EntryChecker:
+	"""
+	Detect invalid entries the same way as ``Dictionary._add_multiple``:
+	an entry is invalid if it's equal to an earlier entry, or if its brief is already used.
+
+	Only the translation and description of the entries are stored, not the entries themselves.
+	"""
+	def __init__(self)->None:
+		self.brief_texts: Dict[Outline, TextKey]={}
+		self.brief_less: Set[TextKey]=set()
+
+	def check(self, entry: Entry)->Optional[str]:
+		"""
+		Record the entry. Return None if it's valid,
+		otherwise ``"duplicate"`` or ``"conflict"`` (the brief is used by a different entry).
+		"""
+		key=text_key(entry)
+		if entry.brief:
+			old_key=self.brief_texts.get(entry.brief)
+			if old_key is None:
+				self.brief_texts[entry.brief]=key
+				return None
+			return "duplicate" if old_key==key else "conflict"
+		if key in self.brief_less:
+			return "duplicate"
+		self.brief_less.add(key)
+		return None
+
+
+def export(dictionary: Path, output: Path)->int:
+	"""
+	Write the entries with a brief to a Plover JSON dictionary.
+	"""
+	skipped: int=0
+	temporary_output=output.with_name(output.name+".tmp")
+	with dictionary.open("r", encoding="u8") as f, temporary_output.open("w", encoding="u8") as f_out:
+		seen: Set[Outline]=set()
+		separator="{\n"
+		for entry in JstReader(f):
+			if not entry.brief: continue
+			if entry.brief in seen:
+				print(f"Skipped entry with duplicate brief: {entry}", file=sys.stderr)
+				skipped+=1
+				continue
+			seen.add(entry.brief)
+			f_out.write(separator +
+					json.dumps("/".join(entry.brief), ensure_ascii=False) + ": " +
+					json.dumps(entry.translation, ensure_ascii=False))
+			separator=",\n"
+		f_out.write("{\n}\n" if separator=="{\n" else "\n}\n")
+	os.replace(temporary_output, output)
+	return 1 if skipped else 0
+
+
+def diff(old: Path, new: Path)->Iterator[Tuple[str, Optional[Entry], Optional[Entry]]]:
+	"""
+	Yield the differences between two JST dictionaries as (kind, old entry, new entry) tuples.
+
+	``kind`` is one of:
+
+	* ``"removed"``, ``"added"``;
+	* ``"changed"`` -- the entries share the brief, or the translation and description;
+	* ``"invalid"`` -- the entry is invalid within its own file (see :class:`EntryChecker`).
+
+	Each old entry is paired with at most one new entry, an equal one if there's any.
+
+	The old dictionary is indexed in memory, the new one is streamed (twice).
+	"""
+	by_brief: Dict[Outline, Entry]={}
+	by_text: Dict[TextKey, List[Entry]]={}
+	checker=EntryChecker()
+	with old.open("r", encoding="u8") as f:
+		for entry in JstReader(f):
+			if checker.check(entry) is not None:
+				yield ("invalid", entry, None)
+				continue
+			if entry.brief:
+				by_brief[entry.brief]=entry
+			by_text.setdefault(text_key(entry), []).append(entry)
+
+	def valid_new_entries()->Iterator[Entry]:
+		checker=EntryChecker()
+		with new.open("r", encoding="u8") as f:
+			for entry in JstReader(f):
+				if checker.check(entry) is None:
+					yield entry
+
+	# first pair the unchanged entries, so that they're not reported as changed to another entry
+	unchanged: Set[Entry]={
+			entry for entry in valid_new_entries()
+			if entry in by_text.get(text_key(entry), ())
+			}
+	matched: Set[Entry]={*unchanged}
+	checker=EntryChecker()
+	with new.open("r", encoding="u8") as f:
+		for entry in JstReader(f):
+			if checker.check(entry) is not None:
+				yield ("invalid", None, entry)
+				continue
+			if entry in unchanged:
+				continue
+			old_entry=by_brief.get(entry.brief) if entry.brief else None
+			if old_entry is None or old_entry in matched:
+				old_entry=next((x for x in by_text.get(text_key(entry), ()) if x not in matched), None)
+			if old_entry is None:
+				yield ("added", None, entry)
+				continue
+			yield ("changed", old_entry, entry)
+			matched.add(old_entry)
+
+	for entries in by_text.values():
+		for entry in entries:
+			if entry not in matched:
+				yield ("removed", entry, None)
+
+
+def merge(base: Path, other: Path, output: Path, force: bool)->int:
+	"""
+	Write the entries of ``base``, followed by the valid entries of ``other``, to ``output``.
+
+	Both inputs are streamed, only the indexes of :class:`EntryChecker` are kept in memory.
+	Duplicate entries are dropped. If there's any conflicting entry, ``output`` is only written if ``force`` is set.
+	"""
+	checker=EntryChecker()
+	conflicts: List[Entry]=[]
+	duplicate_count: int=0
+
+	def valid_entries(reader: JstReader)->Iterator[Entry]:
+		nonlocal duplicate_count
+		for entry in reader:
+			status=checker.check(entry)
+			if status is None:
+				yield entry
+			elif status=="duplicate":
+				duplicate_count+=1
+			else:
+				conflicts.append(entry)
+
+	temporary_output=output.with_name(output.name+".tmp")
+	with base.open("r", encoding="u8") as f_base, temporary_output.open("w", encoding="u8") as f_out:
+		base_reader=JstReader(f_base)
+		header=base_reader.read_header()
+
+		def entries()->Iterator[Entry]:
+			yield from valid_entries(base_reader)
+			with other.open("r", encoding="u8") as f_other:
+				yield from valid_entries(JstReader(f_other))
+
+		write_jst(f_out, header, entries())
+
+	if duplicate_count:
+		print(f"Dropped {duplicate_count} duplicate entries.", file=sys.stderr)
+	if conflicts:
+		print("Found some invalid (conflicting) entries.", file=sys.stderr)
+		for entry in conflicts:
+			print(entry, file=sys.stderr)
+		if not force:
+			print("Run with --force to write the merged dictionary without them.", file=sys.stderr)
+			temporary_output.unlink()
+			return 1
+	os.replace(temporary_output, output)
+	return 0
+
+
+def main()->None:
+	import argparse
+
+	parser=argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+			description=__doc__)
+	subparsers=parser.add_subparsers(dest="command", required=True)
+
+	export_parser=subparsers.add_parser("export",
+			help="Export the entries that have a brief to a Plover JSON dictionary.")
+	export_parser.add_argument("dictionary", type=Path, help="Path to the JST dictionary.")
+	export_parser.add_argument("output", type=Path, help="Path to the output JSON dictionary.")
+
+	diff_parser=subparsers.add_parser("diff", help="Show the differences between two JST dictionaries. "
+			"Exit status is 1 if there's any difference.")
+	diff_parser.add_argument("old", type=Path, help="Path to the old JST dictionary.")
+	diff_parser.add_argument("new", type=Path, help="Path to the new JST dictionary.")
+	diff_parser.add_argument("--json", action="store_true", help="Output one JSON object per line.")
+
+	merge_parser=subparsers.add_parser("merge", help="Merge two JST dictionaries. "
+			"Header fields are taken from the base dictionary.")
+	merge_parser.add_argument("base", type=Path, help="Path to the base JST dictionary. Its entries are prioritized.")
+	merge_parser.add_argument("other", type=Path, help="Path to the JST dictionary to merge into the base one.")
+	merge_parser.add_argument("-o", "--output", type=Path, required=True,
+			help="Path to the output JST dictionary. Can be the same as the base dictionary.")
+	merge_parser.add_argument("--force", action="store_true",
+			help="Write the output even if there are invalid (conflicting) entries.")
+
+	to_sqlite_parser=subparsers.add_parser("to-sqlite",
+			help="Convert a JST dictionary to an SQLite database (.jstdb), see the SqliteDictionary class.")
+	to_sqlite_parser.add_argument("dictionary", type=Path, help="Path to the JST dictionary.")
+	to_sqlite_parser.add_argument("output", type=Path, help="Path to the output database. Replaced if it exists.")
+
+	from_sqlite_parser=subparsers.add_parser("from-sqlite",
+			help="Convert an SQLite database (.jstdb) to a JST dictionary.")
+	from_sqlite_parser.add_argument("dictionary", type=Path, help="Path to the database.")
+	from_sqlite_parser.add_argument("output", type=Path, help="Path to the output JST dictionary.")
+
+	args=parser.parse_args()
+
+	if args.command=="export":
+		sys.exit(export(args.dictionary, args.output))
+	elif args.command=="diff":
+		prefixes={"removed": "- ", "added": "+ ", "changed": "~ ", "invalid": "! "}
+		found=False
+		for kind, old_entry, new_entry in diff(args.old, args.new):
+			found=True
+			if args.json:
+				print(json.dumps({
+					"kind": kind,
+					"old": old_entry and entry_to_json(old_entry),
+					"new": new_entry and entry_to_json(new_entry),
+					}, ensure_ascii=False))
+			else:
+				print(prefixes[kind] + " -> ".join(str(x) for x in (old_entry, new_entry) if x is not None))
+		sys.exit(1 if found else 0)
+	elif args.command=="merge":
+		sys.exit(merge(args.base, args.other, args.output, args.force))
+	elif args.command=="to-sqlite":
+		invalid_count=sqlite_store.import_jst(args.dictionary, args.output)
+		if invalid_count:
+			print(f"Dropped {invalid_count} invalid (duplicate or conflicting) entries.", file=sys.stderr)
+	else:
+		assert args.command=="from-sqlite"
+		sqlite_store.export_jst(args.dictionary, args.output)
+
+
+if __name__=="__main__":
+	main()
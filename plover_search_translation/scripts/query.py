@@ -0,0 +1,142 @@
+#!/bin/python
+"""
+Search a JST dictionary without Plover, for scripted searches and offline evaluation of the ranking.
+
+Each input line is a JSON string (the query) or a JSON object with a ``query`` field.
+Each output line is the input object (a string is turned into ``{"query": ...}``) with a ``results`` field added:
+the matches in the order shown by the dialog, each as ``[translation, description, brief]``.
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Iterator, List, Optional, TextIO, Tuple
+
+from ..lib import Entry
+
+
+PAGE_SIZE: int=100
+"""
+Number of matches of the first search of the dialog, see :meth:`.dictionary.Dictionary.search`.
+"""
+
+
+_dictionary: Any=None
+"""
+The dictionary searched by this (worker) process.
+"""
+
+
+def load_dictionary(path: str)->None:
+	"""
+	Load the dictionary, without writing its index cache next to it (it's still used if it's up to date).
+	"""
+	global _dictionary
+	from ..dictionary import Dictionary
+	class ReadOnlyDictionary(Dictionary):
+		write_index_cache=False
+	_dictionary=ReadOnlyDictionary.load(path)
+	_dictionary.wait_for_indexes()
+
+
+def search(query: str, limit: int)->List[Entry]:
+	"""
+	Return the first ``limit`` matches, as the dialog shows them:
+	the result of the first search, then the following pages.
+	"""
+	result=_dictionary.search(query)[:limit]
+	if limit>PAGE_SIZE and len(result)==PAGE_SIZE:
+		page, _has_more=_dictionary.search_page_scored(query, PAGE_SIZE, limit-PAGE_SIZE)
+		result+=[entry for _score, entry in page]
+	return result
+
+
+def process_line(line: str, limit: int)->Optional[str]:
+	"""
+	Return the output line for an input line, or None if the line is blank.
+	"""
+	if not line.strip():
+		return None
+	item=json.loads(line)
+	if isinstance(item, str):
+		item={"query": item}
+	item["results"]=[
+			[entry.translation, entry.description, list(entry.brief)]
+			for entry in search(item["query"], limit)]
+	return json.dumps(item, ensure_ascii=False)
+
+
+def _process_line(arguments: Any)->Optional[str]:
+	return process_line(*arguments)
+
+
+def input_lines(paths: List[Path])->Iterator[str]:
+	if not paths:
+		yield from sys.stdin
+		return
+	for path in paths:
+		with path.open("r", encoding="u8") as f:
+			yield from f
+
+
+def run(dictionary: Path, inputs: List[Path], output: TextIO, jobs: int, limit: int)->Tuple[int, Optional[float]]:
+	"""
+	Write the output line of each input line, in order.
+
+	Return the number of queries, and the time taken to load the dictionary
+	(None with several jobs, where the workers load it concurrently with the searches).
+	"""
+	lines=input_lines(inputs)
+	if jobs==1:
+		start_time=time.perf_counter()
+		load_dictionary(str(dictionary))
+		load_time=time.perf_counter()-start_time
+		return _write((process_line(line, limit) for line in lines), output), load_time
+	import multiprocessing
+	with multiprocessing.Pool(jobs, initializer=load_dictionary, initargs=(str(dictionary),)) as pool:
+		return _write(pool.imap(_process_line, ((line, limit) for line in lines), chunksize=16), output), None
+
+
+def _write(results: Iterator[Optional[str]], output: TextIO)->int:
+	count=0
+	for result in results:
+		if result is None: continue
+		output.write(result+"\n")
+		count+=1
+	return count
+
+
+def main()->None:
+	import argparse
+
+	parser=argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+			description=__doc__)
+	parser.add_argument("dictionary", type=Path, help="Path to the JST dictionary.")
+	parser.add_argument("input", type=Path, nargs="*",
+			help="Paths to the JSON lines files of queries. Read from the standard input if there's none.")
+	parser.add_argument("-o", "--output", type=Path, help="Path to the output file. Standard output if omitted.")
+	parser.add_argument("-j", "--jobs", type=int, default=1,
+			help="Number of processes to search in. Each of them loads the dictionary.")
+	parser.add_argument("-n", "--limit", type=int, default=PAGE_SIZE, help="Number of matches per query.")
+	parser.add_argument("--quiet", action="store_true", help="Don't print the statistics to the standard error.")
+	args=parser.parse_args()
+	if args.jobs<1:
+		parser.error("--jobs must be positive")
+
+	start_time=time.perf_counter()
+	if args.output is None:
+		count, load_time=run(args.dictionary, args.input, sys.stdout, args.jobs, args.limit)
+	else:
+		with args.output.open("w", encoding="u8") as f:
+			count, load_time=run(args.dictionary, args.input, f, args.jobs, args.limit)
+	total_time=time.perf_counter()-start_time
+	if not args.quiet:
+		search_time=total_time-(load_time or 0)
+		print(f"{count} queries in {total_time:.2f}s"
+				+ (f" (dictionary loaded in {load_time:.2f}s)" if load_time is not None else "")
+				+ f", {count/max(search_time, 1e-9):.1f} queries/s", file=sys.stderr)
+
+
+if __name__=="__main__":
+	main()
@@ -0,0 +1,479 @@
+"""
+The search algorithm, shared by the dictionary (in the Plover process)
+and the index snapshots (in the GUI process, see :mod:`.snapshot`).
+
+This module must not depend on Plover.
+"""
+
+import bisect
+import dataclasses
+import heapq
+import itertools
+import operator
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple, TypeVar, Union
+
+from . import scorer, index
+from .lib import Entry, Outline
+from .scorer import Query
+
+
+SCORE_BATCH_SIZE: int=4096
+"""
+Number of entries passed to the scorer at a time.
+"""
+
+DEADLINE_BATCH_SIZE: int=1024
+"""
+Number of entries passed to the scorer at a time when there's a deadline, which is checked after each batch.
+"""
+
+HOT_SEARCH_MIN_ENTRIES: int=20000
+"""
+Dictionaries with at least this many entries show the matches in the hot set
+before the result of the full search is available.
+"""
+
+
+CURSOR_MAX_RESULTS: int=10000
+"""
+Maximum number of matches that can be paged through, see `Searcher._search_page`.
+"""
+
+
+@dataclass
+class _Cursor:
+	"""
+	The state of the paged search of a query.
+	"""
+	query: str
+	generation: int
+	"""
+	The generation of the dictionary when the state is computed. It's invalid once the dictionary is modified.
+	"""
+	compiled_query: Optional[Query]
+	results: List[Tuple[Any, Entry]]
+	"""
+	The scored matches, best match first.
+	"""
+	scored: Optional[Set[Entry]]
+	"""
+	The entries that have been scored, if it's not all of them.
+	The other entries are worse than all of them.
+	"""
+
+
+class Searcher:
+	"""
+	Base class that implements the search on top of a few attributes and hooks.
+
+	Subclasses must provide:
+
+	* ``entries``, a sequence of all the entries;
+	* ``dict``, a mapping from the brief to the entry;
+	* ``scorer``, a :class:`.scorer.Scorer`;
+	* ``usage``, which provides ``hot()`` and ``boosts()`` like :class:`.usage.UsageStats`;
+	* ``generation``, which changes whenever the entries or the usage statistics change.
+
+	None of the methods lock, subclasses are responsible for that.
+	"""
+	entries: Sequence[Entry]
+	dict: Mapping[Outline, Entry]
+	scorer: scorer.Scorer
+	usage: Any
+	generation: int
+	_cursor: Optional[_Cursor]=None
+
+	def _candidates(self, words: Sequence[str], deadline: Optional[float]=None)->Optional[List[Entry]]:
+		"""
+		Return the entries that contain all the ``words`` (see :meth:`.index.SubstringIndex.candidates`),
+		or None if it's not known.
+		"""
+		return None
+
+	def _with_outline_prefix(self, prefix: str, limit: int)->List[Entry]:
+		"""
+		See :meth:`.index.OutlineTrie.with_prefix`.
+		"""
+		raise NotImplementedError
+
+	def _entries_with_close_word(self, word: str)->Mapping[Entry, None]:
+		"""
+		See :meth:`.index.WordIndex.entries_with_close_word`.
+
+		The default implementation returns no entry, so typos are not tolerated.
+		"""
+		return {}
+
+	def _outlines_within(self, outline: Outline, max_distance: int)->List[Tuple[int, Entry]]:
+		"""
+		Return the (distance, entry) pairs of the entries whose brief is within ``max_distance`` of ``outline``
+		(see :func:`.index.outline_distance`), closest first.
+
+		The default implementation compares all the briefs.
+		"""
+		strokes=index.outline_key_bits(outline)
+		result: List[Tuple[int, Entry]]=[]
+		for entry in self.dict.values():
+			distance=index.outline_distance(strokes, index.outline_key_bits(entry.brief))
+			if distance<=max_distance:
+				result.append((distance, entry))
+		result.sort(key=lambda item: (item[0], item[1].brief))
+		return result
+
+	def _hot_first(self, entries: Iterable[Entry])->Iterable[Entry]:
+		"""
+		Reorder ``entries`` such that the entries in the hot set come first.
+		"""
+		hot=self.usage.hot()
+		if not hot:
+			return entries
+		hot_set={*hot}
+		if entries is not self.entries:  # (``self.entries`` is not copied, it might be read from a database)
+			if not isinstance(entries, list):
+				entries=list(entries)
+			if len(entries)<len(self.entries):
+				entry_set={*entries}
+				hot=[entry for entry in hot if entry in entry_set]
+		return itertools.chain(hot, (entry for entry in entries if entry not in hot_set))
+
+	def _compile(self, query: str)->Query:
+		"""
+		Compile the query, with the entries that match its words up to typos (see :attr:`.scorer.Query.approximate_matches`).
+
+		Internal method, does not lock.
+		"""
+		compiled_query=Query.compile(query)
+		if compiled_query.outline_neighbors is not None:
+			return compiled_query
+		close_entries=[self._entries_with_close_word(word) for word in query.split()]  # same order as compiled_query.words
+		if not any(close_entries):
+			return compiled_query
+		approximate_matches: Dict[Entry, None]={}
+		for entries in close_entries:
+			for entry in entries:
+				if entry in approximate_matches: continue
+				haystack=entry.search_fields.haystack
+				if all(word in haystack or entry in word_entries
+						for word, word_entries in zip(compiled_query.words, close_entries)):
+					approximate_matches[entry]=None
+		return dataclasses.replace(compiled_query, approximate_matches=approximate_matches)
+
+	def _search_scored(self, query: str)->List[Tuple[Any, Entry]]:
+		"""
+		Return the entries that match the query, best match first, together with their scores.
+		See `_search_scored_until`.
+
+		Internal method, does not lock.
+		"""
+		return self._search_scored_until(query, None)[0]
+
+	def _search_scored_until(self, query: str, deadline: Optional[float])->Tuple[List[Tuple[Any, Entry]], bool]:
+		"""
+		Return the entries that match the query, best match first, together with their scores,
+		and whether the result is complete.
+
+		The score of an entry only depends on the query and the entry,
+		so results from different dictionaries can be merged by score.
+
+		If at least 100 entries contain all the query words (according to the substring index)
+		or match them up to typos (according to the word index),
+		the other entries cannot be in the result, except the one whose brief is the query, so they're not scored.
+
+		If the query looks like a partial outline, the entries whose brief starts with it
+		are ranked right after the exact matches. If there are at least 100 such entries and entries that contain
+		all the query words, the other entries are not scored either, so that the result is instant even on large
+		dictionaries; otherwise the remaining places are filled from the other entries as usual.
+
+		If ``deadline`` (a :func:`time.monotonic` value) is not None, the scoring stops once it passes,
+		and the best matches among the entries scored so far are returned as an incomplete result.
+		When all the entries need to be scored, the likely matches (the outline prefix matches, the entry whose brief
+		is the query, and the entries that contain the query words or match them up to typos) are scored first.
+		A complete result is the same as without a deadline.
+
+		Internal method, does not lock.
+		"""
+		if query=="":
+			return [((), entry) for entry in itertools.islice(self._hot_first(self.entries), 100)], True
+
+		compiled_query=self._compile(query)
+		if compiled_query.outline_neighbors is not None:
+			return [
+					(scorer.outline_distance_score(distance), entry)
+					for distance, entry in self._outlines_within(*compiled_query.outline_neighbors)[:100]
+					], True
+
+		likely, outline_matches, candidate_count=self._likely_matches(compiled_query, 100, deadline)
+		if candidate_count is not None and len(likely)>=100:
+			return self._score_until(compiled_query, self._hot_first(likely), outline_matches, 100, deadline)
+		if deadline is None:
+			return self._score_until(compiled_query, self._hot_first(self.entries), outline_matches, 100, None)
+
+		likely_results, complete=self._score_until(compiled_query, likely, outline_matches, None, deadline)
+		if not complete:
+			return likely_results[:100], False
+		scores={entry: score for score, entry in likely_results}
+		other_results, complete=self._score_until(
+				compiled_query,
+				(entry for entry in self._hot_first(self.entries) if entry not in scores),
+				outline_matches, 100, deadline)
+		if not complete:
+			return heapq.nlargest(100, likely_results+other_results, key=operator.itemgetter(0)), False
+		# reorder the ties in the same way as without a deadline
+		scores.update((entry, score) for score, entry in other_results)
+		return heapq.nlargest(100,
+				((scores[entry], entry) for entry in self._hot_first(self.entries) if entry in scores),
+				key=operator.itemgetter(0)), True
+
+	def _plan(self, compiled_query: Query, limit: int, min_candidates: int)->Tuple[
+			Sequence[Entry], Dict[Entry, Any], Optional[Set[Entry]]]:
+		"""
+		Decide which entries need to be scored to find the ``limit`` best matches, see `_search_scored`.
+
+		Only the likely matches (see `_likely_matches`) are scored if there are at least ``min_candidates`` of them,
+		as all the other entries are worse.
+
+		Return (the entries to score, the minimum scores of the outline prefix matches,
+		the set of the entries to score if it doesn't contain all the entries otherwise None).
+		The entries that are not scored are all worse than the ones that are.
+
+		Internal method, does not lock.
+		"""
+		likely, outline_matches, candidate_count=self._likely_matches(compiled_query, limit)
+		if candidate_count is not None and len(likely)>=min_candidates:
+			return likely, outline_matches, {*likely}
+		return self.entries, outline_matches, None
+
+	def _likely_matches(self, compiled_query: Query, limit: int,
+			deadline: Optional[float]=None)->Tuple[List[Entry], Dict[Entry, Any], Optional[int]]:
+		"""
+		Return (the ``limit`` first outline prefix matches, the entry whose brief is the query,
+		then the entries that contain all the query words or match them up to typos;
+		the minimum scores of the outline prefix matches;
+		the number of entries that contain all the query words or match them up to typos,
+		None if it's not known because the substring index is not built or ``deadline`` has passed).
+
+		Internal method, does not lock.
+		"""
+		outline_matches: Dict[Entry, Any]={}
+		if compiled_query.outline_prefix is not None:
+			outline_matches={
+					entry: scorer.outline_prefix_score(entry)
+					for entry in self._with_outline_prefix(compiled_query.outline_prefix, limit)
+					}
+
+		candidates=self._candidates(compiled_query.words, deadline)
+		if candidates is not None and compiled_query.approximate_matches:
+			# they're ranked right after the entries that contain all the words
+			contained={*candidates}
+			candidates=candidates+[entry for entry in compiled_query.approximate_matches if entry not in contained]
+		# the outline prefix matches come first, so that the ties between them are broken in the same way
+		# whatever the limit is
+		brief_match=self.dict.get(compiled_query.outline)
+		entries=[*outline_matches, *([brief_match] if brief_match and brief_match not in outline_matches else [])]
+		if candidates is None:
+			return entries, outline_matches, None
+		seen={*entries}
+		entries+=(entry for entry in candidates if entry not in seen)
+		return entries, outline_matches, len(candidates)
+
+	def _score(self, compiled_query: Query, entries: Iterable[Entry],
+			minimum_scores: Mapping[Entry, Any]={}, limit: Optional[int]=100)->List[Tuple[Any, Entry]]:
+		"""
+		Return the ``limit`` best matches among ``entries`` together with their scores, best match first.
+
+		Parameters:
+			minimum_scores: the score of the entries in it is at least the corresponding value.
+			limit: None to return all the entries.
+
+		Internal method, does not lock.
+		"""
+		return self._score_until(compiled_query, entries, minimum_scores, limit, None)[0]
+
+	def _score_until(self, compiled_query: Query, entries: Iterable[Entry],
+			minimum_scores: Mapping[Entry, Any], limit: Optional[int],
+			deadline: Optional[float])->Tuple[List[Tuple[Any, Entry]], bool]:
+		"""
+		Like `_score`, but stop once ``deadline`` (a :func:`time.monotonic` value) passes,
+		and also return whether all the entries are scored.
+
+		Internal method, does not lock.
+		"""
+		boosts=self.usage.boosts()
+		batch_size=SCORE_BATCH_SIZE if deadline is None else DEADLINE_BATCH_SIZE
+		complete=True
+
+		def scored_entries()->Iterable[Tuple[Any, Entry]]:
+			nonlocal complete
+			iterator=iter(entries)
+			while True:
+				batch=list(itertools.islice(iterator, batch_size))
+				if not batch: return
+				scores=self.scorer.score_batch(compiled_query, batch, boosts)
+				if minimum_scores:
+					scores=[
+							max(score, minimum_scores[entry]) if entry in minimum_scores else score
+							for score, entry in zip(scores, batch)
+							]
+				yield from zip(scores, batch)
+				if deadline is not None and time.monotonic()>=deadline:
+					complete=next(iterator, None) is None
+					return
+
+		if limit is None:
+			result=sorted(scored_entries(), key=operator.itemgetter(0), reverse=True)
+		else:
+			result=heapq.nlargest(limit, scored_entries(), key=operator.itemgetter(0))
+		return result, complete
+
+	def _search_hot_scored(self, query: str)->List[Tuple[Any, Entry]]:
+		"""
+		Like `_search_scored`, but only search the hot set (the most frequently picked entries).
+
+		Return an empty list if the dictionary is small enough for the full search to be fast.
+
+		Internal method, does not lock.
+		"""
+		if len(self.entries)<HOT_SEARCH_MIN_ENTRIES or query=="":
+			return []
+		compiled_query=self._compile(query)
+		if compiled_query.outline_neighbors is not None:
+			return []
+		return self._score(compiled_query, self.usage.hot())
+
+	def _search_page(self, query: str, offset: int, count: int=100)->Tuple[List[Tuple[Any, Entry]], bool]:
+		"""
+		Return the matches at positions ``offset`` to ``offset+count`` (exclusive) of the result of the query,
+		together with their scores, and whether there are more matches after them.
+
+		The result starts with the result of `_search_scored`. The scored matches of the latest query are kept
+		(until the dictionary is modified), so that the following pages don't need to score the entries again.
+		At most :data:`CURSOR_MAX_RESULTS` matches can be paged through.
+
+		Internal method, does not lock.
+		"""
+		state=self._cursor
+		if state is None or state.query!=query or state.generation!=self.generation:
+			state=self._cursor=self._start_cursor(query)
+		end=min(offset+count, CURSOR_MAX_RESULTS)
+		if end>len(state.results) and state.scored is not None:
+			# the matches that contain all the query words are exhausted, score the other entries
+			assert state.compiled_query is not None
+			scored=state.scored
+			state.results.extend(self._score(
+					state.compiled_query,
+					self._hot_first(entry for entry in self.entries if entry not in scored),
+					limit=CURSOR_MAX_RESULTS-len(state.results)))
+			state.scored=None
+		return state.results[offset:end], end<len(state.results) or state.scored is not None
+
+	def _start_cursor(self, query: str)->_Cursor:
+		if query=="":
+			return _Cursor(query, self.generation, None,
+					[((), entry) for entry in itertools.islice(self._hot_first(self.entries), CURSOR_MAX_RESULTS)], None)
+
+		compiled_query=self._compile(query)
+		if compiled_query.outline_neighbors is not None:
+			return _Cursor(query, self.generation, None, [
+					(scorer.outline_distance_score(distance), entry)
+					for distance, entry in self._outlines_within(*compiled_query.outline_neighbors)[:CURSOR_MAX_RESULTS]
+					], None)
+
+		entries, outline_matches, candidate_set=self._plan(compiled_query, CURSOR_MAX_RESULTS, 0)
+		return _Cursor(query, self.generation, compiled_query,
+				self._score(compiled_query, self._hot_first(entries), outline_matches, limit=CURSOR_MAX_RESULTS),
+				candidate_set)
+
+	def _search(self, query: str)->List[Entry]:
+		"""
+		Return the entries that match the query.
+
+		Internal method, does not lock.
+		"""
+		return [entry for _score, entry in self._search_scored(query)]
+
+
+def merge_scored(results: Iterable[Tuple[str, List[Tuple[Any, Entry]]]], limit: int=100)->List[Tuple[str, Entry]]:
+	"""
+	Merge the (source, scored result) pairs of several dictionaries
+	into the ``limit`` best matches tagged with their source.
+	"""
+	return [
+			(source, entry)
+			for source, score, entry in heapq.nlargest(
+				limit,
+				itertools.chain.from_iterable(
+					((source, score, entry) for score, entry in result)
+					for source, result in results
+					),
+				key=operator.itemgetter(1))
+			]
+
+
+def merge_pages(pages: Iterable[Tuple[str, Tuple[List[Tuple[Any, Entry]], bool]]],
+		offset: int, count: int)->Tuple[List[Tuple[str, Entry]], bool]:
+	"""
+	Merge the (source, result of ``_search_page(query, 0, offset+count)``) pairs of several dictionaries
+	into the page of the merged result at positions ``offset`` to ``offset+count``,
+	and whether there are more matches after it.
+	"""
+	pages=list(pages)
+	merged=merge_scored(
+			((source, result) for source, (result, _has_more) in pages),
+			limit=offset+count+1)
+	has_more=len(merged)>offset+count or any(has_more for _source, (_result, has_more) in pages)
+	return merged[offset:offset+count], has_more
+
+
+T=TypeVar("T")
+
+
+def diff_results(old: Sequence[T], new: Sequence[T])->List[Union[int, T]]:
+	"""
+	Encode ``new`` relative to ``old``: each item of ``new`` that is also in ``old``
+	is replaced by its position in ``old``. (the items must not be integers)
+
+	The result is usually much smaller to send than ``new``, because successive queries
+	usually share most of their best matches. See :func:`apply_diff` and :func:`unmoved_positions`.
+	"""
+	positions: Dict[T, int]={}
+	for i, item in enumerate(old):
+		positions.setdefault(item, i)
+	return [positions.get(item, item) for item in new]  # type: ignore
+
+
+def apply_diff(old: Sequence[T], diff: Sequence[Union[int, T]])->List[T]:
+	"""
+	Inverse of :func:`diff_results`.
+	"""
+	return [old[item] if isinstance(item, int) else item for item in diff]
+
+
+def unmoved_positions(diff: Sequence[Union[int, Any]])->List[int]:
+	"""
+	Return the positions in ``diff`` of a largest set of items taken from ``old`` whose relative order is unchanged,
+	that is, the items that can stay in place when the other items are removed and inserted
+	(a longest increasing subsequence of the positions in ``old``).
+	"""
+	tails: List[int]=[]  # tails[k]: the smallest old position that ends an increasing subsequence of length k+1
+	tail_positions: List[int]=[]
+	previous: List[int]=[-1]*len(diff)
+	for i, item in enumerate(diff):
+		if not isinstance(item, int):
+			continue
+		k=bisect.bisect_left(tails, item)
+		if k==len(tails):
+			tails.append(item)
+			tail_positions.append(i)
+		else:
+			tails[k]=item
+			tail_positions[k]=i
+		previous[i]=tail_positions[k-1] if k else -1
+	result: List[int]=[]
+	i=tail_positions[-1] if tail_positions else -1
+	while i>=0:
+		result.append(i)
+		i=previous[i]
+	result.reverse()
+	return result
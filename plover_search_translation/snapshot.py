@@ -0,0 +1,493 @@
+"""
+Read-only snapshots of a dictionary and its substring index, written to a file by the Plover process
+and memory-mapped by the GUI process, so that the GUI process can search without any IPC round trip
+and without taking the dictionary lock.
+
+A snapshot file is never modified once written. Each generation of a dictionary is written to a new file,
+and the GUI process is told to switch to it (see :meth:`.manager.Manager.publish_snapshot`).
+
+The same format is used for the index cache, a sidecar file of the JST file (see :func:`cache_path`)
+from which the dictionary loads its indexes instead of building them, if the JST file is unchanged.
+
+File layout (all integers little-endian):
+
+* :data:`MAGIC`;
+* the length of the metadata, as a 4-byte unsigned integer;
+* the metadata, a UTF-8 JSON object (see :func:`write_snapshot`);
+* the sections, each aligned to 8 bytes. The metadata records the offset, length and
+  ``array`` type code of each section.
+
+This module must not depend on Plover.
+"""
+
+import array
+import json
+import mmap
+import os
+import struct
+import sys
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Dict, List, Optional, Sequence, Set, Tuple
+
+from . import scorer, index, search
+from .lib import Entry, Outline
+
+
+MAGIC: bytes=b"PSTSNAP\n"
+
+FORMAT_VERSION: int=2
+
+
+@dataclass(frozen=True)
+class SnapshotData:
+	"""
+	Everything that's written to a snapshot, taken from a dictionary with its lock held.
+	"""
+	dictionary: str
+	"""
+	Path of the dictionary.
+	"""
+	generation: int
+	"""
+	See :attr:`.dictionary.Dictionary.generation`.
+	"""
+	scorer: str
+	entries: List[Entry]
+	boosts: Dict[Entry, float]
+	hot: List[Entry]
+	suffix_array: Optional[index._SuffixArray]
+	"""
+	The suffix array of the substring index, if it's built.
+	"""
+	added: List[Entry]
+	"""
+	Entries that are not in the suffix array.
+	"""
+	removed: Set[Entry]
+	"""
+	Entries of the suffix array that are not in the dictionary anymore.
+	"""
+	content_hash: str=""
+	"""
+	For index caches, the SHA-256 (hexadecimal) of the JST file that the entries are loaded from.
+	"""
+	outline_tree: Optional[Tuple[List[Entry], List[int], List[int]]]=None
+	"""
+	The BK-tree of the briefs, see :meth:`.index.BKTree.export`.
+	"""
+
+
+def cache_path(dictionary_path: str)->str:
+	"""
+	Return the path of the index cache of a dictionary.
+	"""
+	return dictionary_path+".index"
+
+
+def write_snapshot(path: str, data: SnapshotData)->None:
+	"""
+	Write the snapshot file atomically.
+	"""
+	entry_indices: Dict[Entry, int]={entry: i for i, entry in enumerate(data.entries)}
+	boosts={entry: boost for entry, boost in data.boosts.items() if entry in entry_indices}
+
+	entry_offsets=array.array("q", [0])
+	encoded_entries: List[bytes]=[]
+	offset=0
+	for entry in data.entries:
+		encoded=json.dumps(entry.tuple(), ensure_ascii=False).encode("u8")
+		encoded_entries.append(encoded)
+		offset+=len(encoded)
+		entry_offsets.append(offset)
+
+	sections: Dict[str, Any]={
+			"entries": b"".join(encoded_entries),
+			"entry_offsets": entry_offsets,
+			"boosted": array.array("i", (entry_indices[entry] for entry in boosts)),
+			"boost_values": array.array("d", boosts.values()),
+			"hot": array.array("i", (entry_indices[entry] for entry in data.hot if entry in entry_indices)),
+			}
+
+	suffix_array=data.suffix_array
+	if suffix_array is not None:
+		posting_offsets=array.array("q", [0])
+		postings=array.array("i")
+		for posting in suffix_array.postings:
+			postings.extend(posting)
+			posting_offsets.append(len(postings))
+		sections.update({
+				"sa_text": bytes(suffix_array.text[:]),
+				"sa_token_starts": _as_array("i", suffix_array.token_starts),
+				"sa_suffixes": _as_array("i", suffix_array.suffixes),
+				"sa_posting_offsets": posting_offsets,
+				"sa_postings": postings,
+				"sa_entries": array.array("i", (
+					-1 if entry in data.removed else entry_indices[entry]
+					for entry in suffix_array.entries)),
+				"added": array.array("i", (entry_indices[entry] for entry in data.added)),
+				})
+
+	if data.outline_tree is not None:
+		tree_entries, parents, distances=data.outline_tree
+		sections.update({
+				"bk_entries": array.array("i", (entry_indices[entry] for entry in tree_entries)),
+				"bk_parents": array.array("i", parents),
+				"bk_distances": array.array("i", distances),
+				})
+
+	section_bytes: Dict[str, Tuple[bytes, str]]={
+			name: (value, "B") if isinstance(value, bytes) else (_little_endian(value), value.typecode)
+			for name, value in sections.items()
+			}
+
+	def metadata_bytes(layout: Dict[str, List[Any]])->bytes:
+		return json.dumps({
+			"version": FORMAT_VERSION,
+			"dictionary": data.dictionary,
+			"generation": data.generation,
+			"scorer": data.scorer,
+			"content_hash": data.content_hash,
+			"sections": layout,
+			}, ensure_ascii=False).encode("u8")
+
+	# the offsets are written in the metadata, whose length depends on them;
+	# reserve enough digits by computing the layout with an upper bound of the header length first
+	header_length=_align(len(MAGIC)+4+len(metadata_bytes(
+		{name: [sys.maxsize, sys.maxsize, typecode] for name, (_value, typecode) in section_bytes.items()})))
+	layout: Dict[str, List[Any]]={}
+	offset=header_length
+	for name, (value, typecode) in section_bytes.items():
+		layout[name]=[offset, len(value), typecode]
+		offset=_align(offset+len(value))
+	metadata=metadata_bytes(layout)
+
+	temporary_path=f"{path}.{os.getpid()}.tmp"  # several processes may write the same index cache
+	with open(temporary_path, "wb") as f:
+		f.write(MAGIC+struct.pack("<I", len(metadata))+metadata)
+		for name, (value, _typecode) in section_bytes.items():
+			_pad_to(f, layout[name][0])
+			f.write(value)
+	os.replace(temporary_path, path)
+
+
+def _as_array(typecode: str, values: Sequence[int])->"array.array[int]":
+	"""
+	Return the values (an array, or a memoryview of a mapped snapshot) as an array.
+	"""
+	if isinstance(values, array.array):
+		return values
+	result=array.array(typecode)
+	result.frombytes(memoryview(values).tobytes())  # type: ignore
+	return result
+
+
+def _align(offset: int)->int:
+	return (offset+7)//8*8
+
+
+def _pad_to(f: BinaryIO, offset: int)->None:
+	f.write(b"\0"*(offset-f.tell()))
+
+
+def _little_endian(values: "array.array[Any]")->bytes:
+	if sys.byteorder=="little":
+		return values.tobytes()
+	values=array.array(values.typecode, values)
+	values.byteswap()
+	return values.tobytes()
+
+
+class _MappedBytes:
+	"""
+	A read-only view of a part of the mapped file, whose slices are ``bytes``
+	(unlike the slices of a ``memoryview``, which don't compare with ``bytes``).
+	"""
+	def __init__(self, mapped: mmap.mmap, offset: int, length: int)->None:
+		self._mapped=mapped
+		self._offset=offset
+		self._length=length
+
+	def __len__(self)->int:
+		return self._length
+
+	def __getitem__(self, key: slice)->bytes:
+		start, stop, _step=key.indices(self._length)
+		return self._mapped[self._offset+start:self._offset+stop]
+
+
+class _Postings:
+	"""
+	The posting lists of the suffix array, as slices of a single mapped array.
+	"""
+	def __init__(self, offsets: Sequence[int], postings: memoryview)->None:
+		self._offsets=offsets
+		self._postings=postings
+
+	def __len__(self)->int:
+		return len(self._offsets)-1
+
+	def __getitem__(self, token_id: int)->memoryview:
+		if not 0<=token_id<len(self):
+			raise IndexError(token_id)
+		return self._postings[self._offsets[token_id]:self._offsets[token_id+1]]
+
+
+class _Usage:
+	"""
+	The part of :class:`.usage.UsageStats` used for searching, frozen at the time of the snapshot.
+	"""
+	def __init__(self, boosts: Dict[Entry, float], hot: List[Entry])->None:
+		self._boosts=boosts
+		self._hot=hot
+
+	def boosts(self)->Dict[Entry, float]:
+		return self._boosts
+
+	def hot(self)->List[Entry]:
+		return self._hot
+
+
+class Snapshot(search.Searcher):
+	"""
+	A memory-mapped snapshot file.
+
+	The entries are decoded on first use; the substring index is used directly from the mapped file.
+	The search methods of :class:`.search.Searcher` return the same results as the dictionary
+	(at the time of the snapshot) would.
+	"""
+	def __init__(self, path: str)->None:
+		"""
+		Map the snapshot file at ``path``.
+
+		Raise ValueError if it's not a valid snapshot, or if it's written by an incompatible version.
+		"""
+		with open(path, "rb") as f:
+			self._mapped: mmap.mmap=mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		if self._mapped[:len(MAGIC)]!=MAGIC:
+			raise ValueError(f"Not a snapshot file: {path}")
+		metadata_length,=struct.unpack_from("<I", self._mapped, len(MAGIC))
+		start=len(MAGIC)+4
+		metadata=json.loads(self._mapped[start:start+metadata_length].decode("u8"))
+		if metadata["version"]!=FORMAT_VERSION:
+			raise ValueError(f"Unsupported snapshot version: {metadata['version']}")
+
+		self.path: str=path
+		self.dictionary: str=metadata["dictionary"]
+		self.generation: int=metadata["generation"]
+		self.content_hash: str=metadata["content_hash"]
+		try:
+			self.scorer=scorer.get_scorer(metadata["scorer"])
+		except RuntimeError:
+			self.scorer=scorer.get_scorer(scorer.DEFAULT_SCORER)
+		self._layout: Dict[str, List[Any]]=metadata["sections"]
+		self._entries: Optional[List[Entry]]=None
+		self._dict: Optional[Dict[Outline, Entry]]=None
+		self._usage: Optional[_Usage]=None
+		self._outline_trie: Optional[index.OutlineTrie]=None
+		self._word_index: Optional[index.WordIndex]=None
+		self._suffix_array: Optional[index._SuffixArray]=None
+		if "sa_text" in self._layout:
+			offset, length, _typecode=self._layout["sa_text"]
+			self._suffix_array=index._SuffixArray(
+					entries=[],  # accessed through the sa_entries section instead
+					text=_MappedBytes(self._mapped, offset, length),  # type: ignore
+					token_starts=self._section("sa_token_starts"),  # type: ignore
+					suffixes=self._section("sa_suffixes"),  # type: ignore
+					postings=_Postings(self._section("sa_posting_offsets"), self._section("sa_postings")),  # type: ignore
+					)
+
+	def _section(self, name: str)->memoryview:
+		offset, length, typecode=self._layout[name]
+		view=memoryview(self._mapped)[offset:offset+length]
+		if typecode=="B":
+			return view
+		if sys.byteorder!="little":
+			values=array.array(typecode, view)
+			values.byteswap()
+			return memoryview(values)
+		return view.cast(typecode)
+
+	def entry_count(self)->int:
+		return len(self._section("entry_offsets"))-1
+
+	def suffix_array(self, entries: Sequence[Entry])->Optional[index._SuffixArray]:
+		"""
+		Return the mapped suffix array, whose entries are taken from ``entries`` instead of decoded,
+		for an index cache (see :meth:`.index.SubstringIndex.install`).
+
+		``entries`` must be equal to the entries of the snapshot.
+		Return None if there's no suffix array, or if it's not up to date with the entries.
+		"""
+		if self._suffix_array is None or len(self._section("added")):
+			return None
+		sa_entries=self._section("sa_entries")
+		if any(i<0 for i in sa_entries):
+			return None
+		return index._SuffixArray(
+				entries=[entries[i] for i in sa_entries],
+				text=self._suffix_array.text,
+				token_starts=self._suffix_array.token_starts,
+				suffixes=self._suffix_array.suffixes,
+				postings=self._suffix_array.postings,
+				)
+
+	def outline_tree(self, entries: Sequence[Entry])->Optional[Tuple[List[Entry], Sequence[int], Sequence[int]]]:
+		"""
+		Return the BK-tree of the briefs (see :meth:`.index.BKTree.install`), with the entries taken from ``entries``
+		like :meth:`suffix_array`, or None if there's none.
+		"""
+		if "bk_entries" not in self._layout:
+			return None
+		return (
+				[entries[i] for i in self._section("bk_entries")],
+				self._section("bk_parents"),
+				self._section("bk_distances"),
+				)
+
+	def load(self, previous: Optional["Snapshot"]=None)->None:
+		"""
+		Decode the entries, precompute their search fields and build the word index,
+		which would otherwise be done on first search.
+
+		Parameters:
+			previous: an older snapshot of the same dictionary, which is not searched anymore.
+				The entries that are unchanged since it are reused instead of decoded, and its word index and
+				outline trie are updated with the changes and moved to this snapshot, instead of built again.
+		"""
+		if previous is None or previous._entries is None:
+			self.entries
+		else:
+			self._entries, removed, added=self._decode_entries(previous)
+			if len(removed)+len(added)<len(self._entries):  # otherwise building the indexes again is faster
+				self._take_indexes(previous, removed, added)
+		self.dict
+		self.usage
+		self._get_word_index()
+
+	def _encoded_entries(self)->List[bytes]:
+		data=self._section("entries").tobytes()
+		offsets=self._section("entry_offsets").tolist()
+		return [data[start:end] for start, end in zip(offsets, offsets[1:])]
+
+	def _decode_entries(self, previous: Optional["Snapshot"]=None)->Tuple[List[Entry], List[Entry], List[Entry]]:
+		"""
+		Return the entries, reusing the entries of ``previous`` that are unchanged,
+		followed by the entries of ``previous`` that are not reused and the entries that are decoded.
+		"""
+		reusable: Dict[bytes, Entry]={}
+		if previous is not None and previous._entries is not None:
+			reusable=dict(zip(previous._encoded_entries(), previous._entries))
+		entries: List[Entry]=[]
+		decoded: List[Entry]=[]
+		for data in self._encoded_entries():
+			entry=reusable.pop(data, None)
+			if entry is None:
+				entry=Entry.from_tuple(json.loads(data.decode("u8")))
+				entry.search_fields  # precompute
+				decoded.append(entry)
+			entries.append(entry)
+		return entries, list(reusable.values()), decoded
+
+	def _take_indexes(self, previous: "Snapshot", removed: List[Entry], added: List[Entry])->None:
+		"""
+		Move the indexes of ``previous`` to this snapshot and update them, see :meth:`load`.
+
+		An entry replaced by one with the same brief is updated in place (see :meth:`.index.Index.replace`),
+		like when it's edited in the dictionary, so that the order of the briefs in the outline trie stays the same.
+		"""
+		removed_by_brief: Dict[Outline, Entry]={entry.brief: entry for entry in removed if entry.brief}
+		replaced: List[Tuple[Entry, Entry]]=[]
+		for entry in added:
+			old=removed_by_brief.pop(entry.brief, None) if entry.brief else None
+			if old is not None:
+				replaced.append((old, entry))
+		replaced_entries={entry for pair in replaced for entry in pair}
+		removed=[entry for entry in removed if entry not in replaced_entries]
+		added=[entry for entry in added if entry not in replaced_entries]
+
+		for name in ("_word_index", "_outline_trie"):
+			search_index: Optional[index.Index]=getattr(previous, name)
+			if search_index is None: continue
+			setattr(previous, name, None)
+			for entry in removed:
+				search_index.remove(entry)
+			for old, new in replaced:
+				search_index.replace(old, new)
+			for entry in added:
+				search_index.add(entry)
+			setattr(self, name, search_index)
+
+	@property
+	def entries(self)->List[Entry]:  # type: ignore
+		if self._entries is None:
+			self._entries, _removed, _added=self._decode_entries()
+		return self._entries
+
+	@property
+	def dict(self)->Dict[Outline, Entry]:  # type: ignore
+		if self._dict is None:
+			self._dict={entry.brief: entry for entry in self.entries if entry.brief}
+		return self._dict
+
+	@property
+	def usage(self)->_Usage:  # type: ignore
+		if self._usage is None:
+			entries=self.entries
+			self._usage=_Usage(
+					{entries[i]: boost for i, boost in zip(self._section("boosted"), self._section("boost_values"))},
+					[entries[i] for i in self._section("hot")],
+					)
+		return self._usage
+
+	def _candidates(self, words: Sequence[str], deadline: Optional[float]=None)->Optional[List[Entry]]:
+		if self._suffix_array is None:
+			return None
+		entries=self.entries
+		sa_entries=self._section("sa_entries")
+		return index.find_candidates(
+				self._suffix_array,
+				words,
+				lambda i: None if sa_entries[i]<0 else entries[sa_entries[i]],
+				[entries[i] for i in self._section("added")],
+				deadline)
+
+	def _with_outline_prefix(self, prefix: str, limit: int)->List[Entry]:
+		if self._outline_trie is None:
+			self._outline_trie=index.OutlineTrie()
+			for entry in self.dict.values():
+				self._outline_trie.add(entry)
+		return self._outline_trie.with_prefix(prefix, limit)
+
+	def _get_word_index(self)->index.WordIndex:
+		if self._word_index is None:
+			word_index=index.WordIndex()
+			word_index.start_build(self.entries)()
+			self._word_index=word_index
+		return self._word_index
+
+	def _entries_with_close_word(self, word: str)->Dict[Entry, None]:
+		return self._get_word_index().entries_with_close_word(word)
+
+	def search_scored(self, query: str)->List[Tuple[Any, Entry]]:
+		"""
+		See :meth:`.search.Searcher._search_scored`.
+		"""
+		return self._search_scored(query)
+
+	def search_scored_until(self, query: str, deadline: float)->Tuple[List[Tuple[Any, Entry]], bool]:
+		"""
+		See :meth:`.search.Searcher._search_scored_until`.
+		"""
+		return self._search_scored_until(query, deadline)
+
+	def search_hot_scored(self, query: str)->List[Tuple[Any, Entry]]:
+		"""
+		See :meth:`.search.Searcher._search_hot_scored`.
+		"""
+		return self._search_hot_scored(query)
+
+	def search_page_scored(self, query: str, offset: int, count: int=100)->Tuple[List[Tuple[Any, Entry]], bool]:
+		"""
+		See :meth:`.search.Searcher._search_page`.
+		"""
+		return self._search_page(query, offset, count)
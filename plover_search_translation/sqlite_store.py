@@ -0,0 +1,512 @@
+"""
+Storage of JST dictionaries in SQLite databases (``.jstdb`` files), see :class:`.dictionary.SqliteDictionary`.
+
+The entries stay in the database instead of being loaded into Python objects:
+the briefs are indexed for lookups, the translations for reverse lookups,
+and an FTS5 table with the trigram tokenizer indexes the descriptions and translations
+to find the entries that contain the query words (see :meth:`Store.containing`).
+The FTS5 table is kept up to date by triggers.
+
+Requires the FTS5 extension and its trigram tokenizer (SQLite 3.34 or later),
+which the ``sqlite3`` module of most Python builds has.
+
+This module must not depend on Plover.
+"""
+
+import collections.abc
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .lib import Entry, Outline
+from .jst import JstReader, write_jst
+
+
+SCHEMA_VERSION: int=1
+"""
+Version of the database layout, stored in ``PRAGMA user_version``.
+"""
+
+FETCH_SIZE: int=1024
+"""
+Number of rows fetched at a time when the entries are streamed.
+"""
+
+MIN_FTS_WORD_LENGTH: int=3
+"""
+The trigram tokenizer can't look up shorter words.
+"""
+
+_INSERT_TRIGGER: str="""
+CREATE TRIGGER entries_insert AFTER INSERT ON entries BEGIN
+	INSERT INTO entries_fts(rowid, description, translation) VALUES (new.id, new.description, new.translation);
+END;
+"""
+
+_SCHEMA: str=f"""
+BEGIN;
+CREATE TABLE header(
+	key TEXT PRIMARY KEY,
+	value TEXT NOT NULL
+);
+CREATE TABLE entries(
+	id INTEGER PRIMARY KEY,
+	translation TEXT NOT NULL,
+	description TEXT NOT NULL,
+	brief TEXT UNIQUE,
+	translation_casefolded TEXT NOT NULL
+);
+CREATE UNIQUE INDEX entries_without_brief ON entries(translation, description) WHERE brief IS NULL;
+CREATE INDEX entries_translation ON entries(translation);
+CREATE INDEX entries_translation_casefolded ON entries(translation_casefolded);
+CREATE VIRTUAL TABLE entries_fts USING fts5(
+	description, translation, content='entries', content_rowid='id', tokenize='trigram');
+{_INSERT_TRIGGER.strip()}
+CREATE TRIGGER entries_delete AFTER DELETE ON entries BEGIN
+	INSERT INTO entries_fts(entries_fts, rowid, description, translation)
+		VALUES ('delete', old.id, old.description, old.translation);
+END;
+CREATE TRIGGER entries_update AFTER UPDATE ON entries BEGIN
+	INSERT INTO entries_fts(entries_fts, rowid, description, translation)
+		VALUES ('delete', old.id, old.description, old.translation);
+	INSERT INTO entries_fts(rowid, description, translation) VALUES (new.id, new.description, new.translation);
+END;
+PRAGMA user_version={SCHEMA_VERSION};
+COMMIT;
+"""
+"""
+The brief is stored with the strokes separated by ``/``, NULL if the entry has no brief.
+The rows are in the order of the entries (an edited entry keeps its row).
+"""
+
+_COLUMNS: str="translation, description, brief"
+
+
+def _brief(outline: Outline)->Optional[str]:
+	return "/".join(outline) if outline else None
+
+
+def _outline(brief: Optional[str])->Outline:
+	return tuple(brief.split("/")) if brief is not None else ()
+
+
+def _entry(row: Tuple[str, str, Optional[str]])->Entry:
+	translation, description, brief=row
+	return Entry(translation=translation, description=description, brief=_outline(brief))
+
+
+def _row(entry: Entry)->Tuple[str, str, Optional[str], str]:
+	return (entry.translation, entry.description, _brief(entry.brief), entry.translation.casefold())
+
+
+def _fetch_all(cursor: sqlite3.Cursor)->Iterator[Entry]:
+	while True:
+		rows=cursor.fetchmany(FETCH_SIZE)
+		if not rows: return
+		for row in rows:
+			yield _entry(row)
+
+
+def connect(path: str)->sqlite3.Connection:
+	"""
+	Open the database at ``path`` (``:memory:`` for a temporary one), creating the tables if it's empty.
+
+	Raise RuntimeError if the FTS5 trigram tokenizer is not available,
+	or if the file is not a dictionary database of a supported version.
+	"""
+	connection=sqlite3.connect(path, check_same_thread=False)
+	try:
+		try:
+			connection.execute("CREATE VIRTUAL TABLE temp.fts_check USING fts5(text, tokenize='trigram')")
+			connection.execute("DROP TABLE temp.fts_check")
+		except sqlite3.OperationalError as e:
+			raise RuntimeError(f"SQLite {sqlite3.sqlite_version} doesn't support FTS5 with the trigram tokenizer "
+					f"(SQLite 3.34 or later is required): {e}") from None
+		(version,)=connection.execute("PRAGMA user_version").fetchone()
+		if version==0:
+			if connection.execute("SELECT count(*) FROM sqlite_master").fetchone()[0]:
+				raise RuntimeError(f"Not a dictionary database: {path}")
+			try:
+				connection.executescript(_SCHEMA)
+			except BaseException:
+				connection.rollback()
+				raise
+		elif version!=SCHEMA_VERSION:
+			raise RuntimeError(f"Unsupported dictionary database version: {version} -- {path}")
+		try:
+			connection.execute("PRAGMA journal_mode=WAL")  # readers in other processes don't block the writes
+			connection.execute("PRAGMA synchronous=NORMAL")
+		except sqlite3.OperationalError:
+			pass  # read-only file
+	except BaseException:
+		connection.close()
+		raise
+	return connection
+
+
+class Store:
+	"""
+	The header fields and the entries of a JST dictionary, in an SQLite database.
+
+	Modifications are made in a transaction, which is committed by :meth:`save`.
+	Not thread-safe: :class:`.dictionary.SqliteDictionary` calls it with its lock held.
+	"""
+	def __init__(self)->None:
+		self.path: Optional[str]=None
+		"""
+		Path to the database, None for a new dictionary, which is kept in memory until it's saved.
+		"""
+		self.connection: sqlite3.Connection=connect(":memory:")
+		self._count: Optional[int]=None
+		"""
+		Cached number of entries.
+		"""
+		self._data_version: int=0
+
+	def open(self, path: str)->None:
+		"""
+		Switch to the database at ``path``. The modifications that are not saved are dropped.
+		"""
+		connection=connect(path)
+		self.connection.close()
+		self.connection=connection
+		self.path=path
+		self._count=None
+		self._data_version=self._get_data_version()
+
+	def save(self, path: str)->None:
+		"""
+		Commit the modifications. If ``path`` is not the path of the database, copy the database there,
+		and if the dictionary is new, switch to the copy.
+		"""
+		self.connection.commit()
+		if self.path is not None and os.path.abspath(path)==os.path.abspath(self.path):
+			return
+		target=sqlite3.connect(path)
+		try:
+			self.connection.backup(target)
+		finally:
+			target.close()
+		if self.path is None:
+			self.open(path)
+
+	def _get_data_version(self)->int:
+		return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+	def changed_externally(self)->bool:
+		"""
+		Return whether another connection has committed modifications since the last call.
+		"""
+		data_version=self._get_data_version()
+		if data_version==self._data_version:
+			return False
+		self._data_version=data_version
+		self._count=None
+		return True
+
+	def header(self)->Dict[str, Any]:
+		return {key: json.loads(value) for key, value in self.connection.execute("SELECT key, value FROM header")}
+
+	def set_header(self, header: Dict[str, Any])->None:
+		"""
+		Replace the header fields. ``version`` and ``entries`` are not stored.
+		"""
+		self.connection.execute("DELETE FROM header")
+		self.connection.executemany("INSERT INTO header(key, value) VALUES (?, ?)", (
+			(key, json.dumps(value)) for key, value in header.items() if key not in ("version", "entries")))
+
+	def count(self)->int:
+		if self._count is None:
+			self._count=self.connection.execute("SELECT count(*) FROM entries").fetchone()[0]
+		return self._count
+
+	def iter_entries(self)->Iterator[Entry]:
+		"""
+		Stream all the entries, in order.
+		"""
+		return _fetch_all(self.connection.execute(f"SELECT {_COLUMNS} FROM entries ORDER BY id"))
+
+	def entry_at(self, i: int)->Entry:
+		"""
+		Return the ``i``-th entry. Slow, all the entries before it are skipped.
+		"""
+		row=self.connection.execute(f"SELECT {_COLUMNS} FROM entries ORDER BY id LIMIT 1 OFFSET ?", (i,)).fetchone()
+		if row is None:
+			raise IndexError(i)
+		return _entry(row)
+
+	def get(self, outline: Outline)->Optional[Entry]:
+		"""
+		Return the entry whose brief is ``outline``.
+		"""
+		if not outline: return None
+		row=self.connection.execute(f"SELECT {_COLUMNS} FROM entries WHERE brief=?", (_brief(outline),)).fetchone()
+		return None if row is None else _entry(row)
+
+	def brief_count(self)->int:
+		return self.connection.execute("SELECT count(brief) FROM entries").fetchone()[0]
+
+	def iter_briefs(self)->Iterator[Entry]:
+		"""
+		Stream the entries that have a brief, in order.
+		"""
+		return _fetch_all(self.connection.execute(f"SELECT {_COLUMNS} FROM entries WHERE brief IS NOT NULL ORDER BY id"))
+
+	def _row_id(self, entry: Entry)->Optional[int]:
+		if entry.brief:
+			row=self.connection.execute(
+					"SELECT id FROM entries WHERE brief=? AND translation=? AND description=?",
+					(_brief(entry.brief), entry.translation, entry.description)).fetchone()
+		else:
+			row=self.connection.execute(
+					"SELECT id FROM entries WHERE brief IS NULL AND translation=? AND description=?",
+					(entry.translation, entry.description)).fetchone()
+		return None if row is None else row[0]
+
+	def contains(self, entry: Entry)->bool:
+		return self._row_id(entry) is not None
+
+	def add(self, entry: Entry)->bool:
+		"""
+		Append the entry. Return False (and don't add it) if its brief is used,
+		or if it has no brief and is equal to an existing entry.
+		"""
+		cursor=self.connection.execute(
+				"INSERT OR IGNORE INTO entries(translation, description, brief, translation_casefolded) VALUES (?, ?, ?, ?)",
+				_row(entry))
+		if cursor.rowcount!=1:
+			return False
+		if self._count is not None: self._count+=1
+		return True
+
+	def update(self, old: Entry, new: Entry)->None:
+		"""
+		Replace ``old`` by ``new`` in place. Raise ValueError if ``old`` is not in the dictionary.
+
+		The caller must check that ``new`` is not in the dictionary and that its brief is not used.
+		"""
+		row_id=self._row_id(old)
+		if row_id is None:
+			raise ValueError(f"{old} is not in the dictionary")
+		self.connection.execute(
+				"UPDATE entries SET translation=?, description=?, brief=?, translation_casefolded=? WHERE id=?",
+				(*_row(new), row_id))
+
+	def remove(self, entries: Iterable[Entry])->int:
+		"""
+		Remove the entries, return the number of them that were in the dictionary.
+		"""
+		removed=0
+		for entry in entries:
+			row_id=self._row_id(entry)
+			if row_id is None: continue
+			self.connection.execute("DELETE FROM entries WHERE id=?", (row_id,))
+			removed+=1
+		if self._count is not None: self._count-=removed
+		return removed
+
+	def clear(self)->None:
+		self.connection.execute("DELETE FROM entries")
+		self._count=0
+
+	def longest_key(self)->int:
+		"""
+		Return the number of strokes of the longest brief, 1 if there's none.
+		"""
+		(length,)=self.connection.execute(
+				"SELECT max(length(brief)-length(replace(brief, '/', ''))) FROM entries").fetchone()
+		return 1 if length is None else length+1
+
+	def with_brief_prefix(self, prefix: str, limit: int)->List[Entry]:
+		"""
+		Same as :meth:`.index.OutlineTrie.with_prefix`: the entries whose brief (as a string) starts with ``prefix``,
+		found with a range scan of the index of the briefs. The briefs with the same number of strokes are in order.
+		"""
+		condition="brief>=?"
+		parameters: List[Any]=[prefix]
+		if prefix:
+			condition+=" AND brief<?"
+			parameters.append(prefix[:-1]+chr(ord(prefix[-1])+1))
+		return [_entry(row) for row in self.connection.execute(
+			f"SELECT {_COLUMNS} FROM entries WHERE {condition} "
+			"ORDER BY length(brief)-length(replace(brief, '/', '')), id LIMIT ?",
+			(*parameters, limit))]
+
+	def containing(self, words: Sequence[str], deadline: Optional[float]=None)->Optional[List[Entry]]:
+		"""
+		Same as :meth:`.index.SubstringIndex.candidates`: return the entries whose description or translation
+		contains all the ``words``, in order.
+
+		The FTS5 table finds the entries that contain the words of at least :data:`MIN_FTS_WORD_LENGTH` characters
+		ignoring the case, then SQLite checks that they contain all the words.
+		If all the words are shorter, all the entries are checked.
+		Return None if the words don't restrict the result, or if ``deadline`` (a :func:`time.monotonic` value) passes.
+		"""
+		words=[word for word in words if word]
+		if not words:
+			return None
+		condition=" AND ".join(["(instr(entries.description, ?) OR instr(entries.translation, ?))"]*len(words))
+		parameters: List[str]=[part for word in words for part in (word, word)]
+		fts_query=" AND ".join('"'+word.replace('"', '""')+'"' for word in words if len(word)>=MIN_FTS_WORD_LENGTH)
+		if fts_query:
+			cursor=self.connection.execute(
+					"SELECT entries.translation, entries.description, entries.brief "
+					"FROM entries_fts JOIN entries ON entries.id=entries_fts.rowid "
+					f"WHERE entries_fts MATCH ? AND {condition} ORDER BY entries_fts.rowid",
+					(fts_query, *parameters))
+		else:
+			cursor=self.connection.execute(f"SELECT {_COLUMNS} FROM entries WHERE {condition} ORDER BY id", parameters)
+		result: List[Entry]=[]
+		while True:
+			rows=cursor.fetchmany(FETCH_SIZE)
+			if not rows: return result
+			result.extend(map(_entry, rows))
+			if deadline is not None and time.monotonic()>=deadline: return None
+
+	def with_translation(self, translation: str, case_sensitive: bool)->List[Outline]:
+		"""
+		Return the briefs of the entries with the translation (``()`` for the entries without a brief), in order.
+		"""
+		if case_sensitive:
+			cursor=self.connection.execute("SELECT brief FROM entries WHERE translation=? ORDER BY id", (translation,))
+		else:
+			cursor=self.connection.execute("SELECT brief FROM entries WHERE translation_casefolded=? ORDER BY id",
+					(translation.casefold(),))
+		return [_outline(brief) for (brief,) in cursor]
+
+
+class EntrySequence(collections.abc.Sequence):
+	"""
+	The entries of a :class:`Store`, in order, read from the database whenever they're iterated over.
+	Used as the ``entries`` of :class:`.search.Searcher`.
+	"""
+	def __init__(self, store: Store)->None:
+		self._store: Store=store
+
+	def __len__(self)->int:
+		return self._store.count()
+
+	def __iter__(self)->Iterator[Entry]:
+		return self._store.iter_entries()
+
+	def __contains__(self, entry: object)->bool:
+		return isinstance(entry, Entry) and self._store.contains(entry)
+
+	def __getitem__(self, i: Any)->Any:
+		if isinstance(i, slice):
+			return list(self)[i]
+		if i<0: i+=len(self)
+		if i<0: raise IndexError(i)
+		return self._store.entry_at(i)
+
+
+class EntrySet(collections.abc.Set):
+	"""
+	The entries of a :class:`Store`, for membership tests without loading them (see :meth:`.usage.UsageStats.load`).
+	"""
+	def __init__(self, store: Store)->None:
+		self._store: Store=store
+
+	def __len__(self)->int:
+		return self._store.count()
+
+	def __iter__(self)->Iterator[Entry]:
+		return self._store.iter_entries()
+
+	def __contains__(self, entry: object)->bool:
+		return isinstance(entry, Entry) and self._store.contains(entry)
+
+
+class BriefMapping(collections.abc.Mapping):
+	"""
+	Mapping from the brief to the entry of a :class:`Store`. Used as the ``dict`` of :class:`.search.Searcher`.
+	"""
+	def __init__(self, store: Store)->None:
+		self._store: Store=store
+
+	def __getitem__(self, outline: Outline)->Entry:
+		entry=self._store.get(outline)
+		if entry is None:
+			raise KeyError(outline)
+		return entry
+
+	def get(self, outline: Outline, default: Any=None)->Any:
+		entry=self._store.get(outline)
+		return default if entry is None else entry
+
+	def __contains__(self, outline: object)->bool:
+		return isinstance(outline, tuple) and self._store.get(outline) is not None
+
+	def __len__(self)->int:
+		return self._store.brief_count()
+
+	def __iter__(self)->Iterator[Outline]:
+		return (entry.brief for entry in self._store.iter_briefs())
+
+	def items(self)->Iterator[Tuple[Outline, Entry]]:  # type: ignore
+		return ((entry.brief, entry) for entry in self._store.iter_briefs())
+
+	def values(self)->Iterator[Entry]:  # type: ignore
+		return self._store.iter_briefs()
+
+
+def import_jst(source: Path, destination: Path)->int:
+	"""
+	Write the version 1 JST dictionary ``source`` to a new database ``destination``, streaming the entries.
+
+	Invalid entries are dropped in the same way as ``Dictionary._add_multiple`` does, return their number.
+	"""
+	temporary_destination=destination.with_name(destination.name+".tmp")
+	if temporary_destination.exists():
+		temporary_destination.unlink()
+	connection=connect(str(temporary_destination))
+	try:
+		with source.open("r", encoding="u8") as f:
+			reader=JstReader(f)
+			version=reader.read_header().get("version", 1)
+			if version!=1:
+				raise RuntimeError(f"Unsupported dictionary version: {version} -- {source}")
+			search_brief=_brief((reader.header.get("search_stroke", ""),))
+			read=0
+			def rows()->Iterator[Tuple[str, str, Optional[str], str]]:
+				nonlocal read
+				for entry in reader:
+					read+=1
+					row=_row(entry)
+					if row[2]!=search_brief:
+						yield row
+			# indexing the rows one by one is several times slower than rebuilding the FTS5 table at the end
+			connection.execute("DROP TRIGGER entries_insert")
+			imported=connection.executemany(
+					"INSERT OR IGNORE INTO entries(translation, description, brief, translation_casefolded) VALUES (?, ?, ?, ?)",
+					rows()).rowcount
+			connection.execute("INSERT INTO entries_fts(entries_fts) VALUES ('rebuild')")
+			connection.execute(_INSERT_TRIGGER)
+			connection.executemany("INSERT INTO header(key, value) VALUES (?, ?)", (
+				(key, json.dumps(value)) for key, value in reader.header.items() if key not in ("version", "entries")))
+		connection.commit()
+	except BaseException:
+		connection.close()
+		temporary_destination.unlink()
+		raise
+	connection.close()
+	os.replace(temporary_destination, destination)
+	return read-imported
+
+
+def export_jst(source: Path, destination: Path)->None:
+	"""
+	Write the database ``source`` to a version 1 JST dictionary ``destination``.
+	"""
+	store=Store()
+	store.open(str(source))
+	temporary_destination=destination.with_name(destination.name+".tmp")
+	try:
+		with temporary_destination.open("w", encoding="u8") as f:
+			write_jst(f, store.header(), store.iter_entries())
+	finally:
+		store.connection.close()
+	os.replace(temporary_destination, destination)
@@ -0,0 +1,228 @@
+"""
+Opt-in tracing of the interprocess calls between the Plover process and the GUI process,
+to find where the latency of the dialog comes from.
+
+Enabled by setting the environment variable :data:`TRACE_ENVIRONMENT_VARIABLE` to the path of the trace file
+before starting Plover. Each process records slices (see :func:`span`):
+
+* on the sending thread, the sending of a request or a reply (pickling and writing to the pipe), with the size of
+  the pickled message and the time to pickle it (measured by pickling it once more);
+* on the thread that reads the pipe, its reception (the gap after the sending slice is the transfer and unpickling);
+* on the worker thread, the handler (the gap after the reception is the time spent in the queue of the lane);
+* on the main thread of the GUI process, the functions posted with ``execute_on_main_thread``
+  (the gap after the posting slice is the Qt event loop hop).
+
+The slices of a request are linked by flow events. When the dialog is closed, the GUI process estimates
+the offset between the clocks of the processes (see :func:`clock_offset`) and sends its events to the Plover process,
+which writes all of them to the trace file, in the Chrome trace JSON format
+(viewable in ``chrome://tracing`` or https://ui.perfetto.dev).
+
+This module must not depend on Plover or Qt.
+"""
+
+import contextlib
+import json
+import os
+import pickle
+import threading
+import time
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Set, Tuple
+
+
+TRACE_ENVIRONMENT_VARIABLE: str="PLOVER_SEARCH_TRANSLATION_TRACE"
+
+CLOCK_SAMPLES: int=5
+"""
+Number of round trips made by :func:`clock_offset`.
+"""
+
+Flow=Tuple[str, int]
+"""
+(phase, id) of a flow event: ``"s"`` (start), ``"t"`` (step) or ``"f"`` (finish),
+bound to the slice that encloses it.
+"""
+
+
+def now()->float:
+	"""
+	Return the current time of the trace clock, in microseconds.
+	"""
+	return time.perf_counter()*1e6
+
+
+class Tracer:
+	"""
+	The trace events recorded by a process. All methods are thread-safe.
+	"""
+	def __init__(self, process_name: str)->None:
+		self._pid: int=os.getpid()
+		self._events: List[Dict[str, Any]]=[]
+		self._lock: threading.Lock=threading.Lock()
+		self._threads: Set[int]=set()
+		self._flow_ids: Iterator[int]=iter(range(1, 1<<62, 2))  # odd, the request ids are even (see flow_id)
+		self._add({"ph": "M", "name": "process_name", "pid": self._pid, "tid": 0, "args": {"name": process_name}})
+
+	def _add(self, event: Dict[str, Any])->None:
+		with self._lock:
+			self._events.append(event)
+
+	def _thread_id(self)->int:
+		"""
+		Return the id of the current thread, and name its track the first time.
+		"""
+		tid=threading.get_ident()
+		if tid not in self._threads:
+			with self._lock:
+				self._threads.add(tid)
+				self._events.append({"ph": "M", "name": "thread_name", "pid": self._pid, "tid": tid,
+					"args": {"name": threading.current_thread().name}})
+		return tid
+
+	def new_flow_id(self)->int:
+		with self._lock:
+			return next(self._flow_ids)
+
+	def complete(self, name: str, category: str, start: float, end: float,
+			args: Optional[Dict[str, Any]]=None, flow: Optional[Flow]=None)->None:
+		"""
+		Record a slice of the current thread from ``start`` to ``end`` (see :func:`now`).
+		"""
+		tid=self._thread_id()
+		event: Dict[str, Any]={"ph": "X", "name": name, "cat": category, "ts": start, "dur": end-start,
+				"pid": self._pid, "tid": tid}
+		if args: event["args"]=args
+		self._add(event)
+		if flow is not None:
+			phase, flow_id=flow
+			self._add({"ph": phase, "name": "call", "cat": "flow", "id": flow_id, "ts": start,
+				"pid": self._pid, "tid": tid, **({"bp": "e"} if phase!="s" else {})})
+
+	def instant(self, name: str, category: str, args: Optional[Dict[str, Any]]=None)->None:
+		event: Dict[str, Any]={"ph": "i", "s": "t", "name": name, "cat": category, "ts": now(),
+				"pid": self._pid, "tid": self._thread_id()}
+		if args: event["args"]=args
+		self._add(event)
+
+	def take_events(self, offset: float=0)->List[Dict[str, Any]]:
+		"""
+		Remove and return the recorded events, with ``offset`` (in microseconds) added to their timestamps.
+		"""
+		with self._lock:
+			events=self._events
+			self._events=[]
+		return [{**event, "ts": event["ts"]+offset} if "ts" in event else event for event in events]
+
+	def add_events(self, events: List[Dict[str, Any]])->None:
+		"""
+		Add the events recorded by another process (with the timestamps already converted to the clock of this one).
+		"""
+		with self._lock:
+			self._events.extend(events)
+
+
+tracer: Optional[Tracer]=None
+"""
+The tracer of this process, None if tracing is not enabled.
+"""
+
+_written_events: List[Dict[str, Any]]=[]
+"""
+The events written to the trace file so far, by :func:`write`.
+"""
+
+_write_lock: threading.Lock=threading.Lock()
+"""
+Serializes :func:`write`, which is called from several threads.
+"""
+
+
+def start(process_name: str)->None:
+	"""
+	Start tracing if it's enabled (see :data:`TRACE_ENVIRONMENT_VARIABLE`).
+	"""
+	global tracer
+	if os.environ.get(TRACE_ENVIRONMENT_VARIABLE) and tracer is None:
+		tracer=Tracer(process_name)
+
+
+def flow_id(request_id: int)->int:
+	"""
+	Return the id of the flow of the request with the id ``request_id`` (see :class:`.rpc.Client`).
+	"""
+	return request_id*2
+
+
+def _payload(value: Any)->Dict[str, Any]:
+	start_time=time.perf_counter()
+	size=len(pickle.dumps(value))
+	return {"bytes": size, "pickle_ms": round((time.perf_counter()-start_time)*1000, 3)}
+
+
+@contextlib.contextmanager
+def _span(tracer: Tracer, name: str, category: str, args: Optional[Dict[str, Any]], payload: Any,
+		flow: Optional[Flow])->Iterator[None]:
+	if payload is not None:
+		args={**(args or {}), **_payload(payload)}
+	start_time=now()
+	try:
+		yield
+	finally:
+		tracer.complete(name, category, start_time, now(), args, flow)
+
+
+def span(name: str, category: str, args: Optional[Dict[str, Any]]=None, payload: Any=None,
+		flow: Optional[Flow]=None)->ContextManager[None]:
+	"""
+	Return a context manager that records a slice of the current thread, if tracing is enabled.
+
+	Parameters:
+		payload: the message that is sent in the slice, whose pickled size and pickling time are recorded.
+		flow: the flow event of the slice, see :data:`Flow`.
+	"""
+	if tracer is None:
+		return contextlib.nullcontext()
+	return _span(tracer, name, category, args, payload, flow)
+
+
+def traced(name: str, category: str, function: Callable[[], None], flow: Optional[Flow]=None)->Callable[[], None]:
+	"""
+	Return a function that calls ``function`` inside a slice, see :func:`span`.
+	"""
+	def result()->None:
+		with span(name, category, flow=flow):
+			function()
+	return result
+
+
+def clock_offset(remote_clock: Callable[[], float])->float:
+	"""
+	Return the offset (in microseconds) to add to the times of this process (see :func:`now`)
+	to convert them to the clock of the other process, given a function that returns the current time
+	of the other process.
+
+	The offset is computed from the round trip with the least latency,
+	assuming that the other process reads its clock halfway through.
+	"""
+	best: Optional[Tuple[float, float]]=None
+	for _ in range(CLOCK_SAMPLES):
+		start_time=now()
+		remote_time=remote_clock()
+		end_time=now()
+		if best is None or end_time-start_time<best[0]:
+			best=(end_time-start_time, remote_time-(start_time+end_time)/2)
+	assert best is not None
+	return best[1]
+
+
+def write()->None:
+	"""
+	Take the events of :data:`tracer` and write all the events so far to the trace file.
+	"""
+	if tracer is None: return
+	path=os.environ[TRACE_ENVIRONMENT_VARIABLE]
+	with _write_lock:
+		_written_events.extend(tracer.take_events())
+		temporary_path=path+".tmp"
+		with open(temporary_path, "w", encoding="u8") as f:
+			json.dump({"traceEvents": _written_events, "displayTimeUnit": "ms"}, f)
+		os.replace(temporary_path, path)
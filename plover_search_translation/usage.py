@@ -0,0 +1,175 @@
+"""
+Per-entry pick statistics, used to rank the frequently picked entries higher.
+
+The statistics are stored in a sidecar file next to the JST dictionary,
+and saved in batches (some time after the first unsaved pick).
+"""
+
+import collections.abc
+import json
+import math
+import os
+import threading
+import time
+from typing import AbstractSet, Dict, Iterable, List, Optional, Union
+
+from .lib import Entry
+
+
+HALF_LIFE: float=30*24*60*60
+"""
+Time (in seconds) for the weight of a pick to decay by half.
+"""
+
+MAX_BOOST: float=15
+"""
+Maximum value added to the ``fuzz.ratio`` component (0 to 100) of the match score.
+"""
+
+HOT_SIZE: int=100
+"""
+Number of entries in the hot set.
+"""
+
+SAVE_DELAY: float=30
+"""
+Time (in seconds) to wait after a pick before saving, so that consecutive picks are saved together.
+"""
+
+
+def sidecar_path(dictionary_path: str)->str:
+	return dictionary_path+".usage.json"
+
+
+class UsageStats:
+	"""
+	Pick count and last pick time of the entries of a dictionary.
+
+	All methods are thread-safe.
+	"""
+	def __init__(self)->None:
+		self.path: Optional[str]=None
+		self._records: Dict[Entry, List[float]]={}
+		"""
+		Map from the entry to [pick count, time of the last pick].
+		"""
+		self._hot: Optional[List[Entry]]=None
+		"""
+		Cached result of :meth:`hot`. None if it needs to be recomputed.
+		"""
+		self._dirty: bool=False
+		self._timer: Optional[threading.Timer]=None
+		self._lock: threading.Lock=threading.Lock()
+
+	def load(self, path: str, entries: Union[Iterable[Entry], AbstractSet[Entry]])->None:
+		"""
+		Load the statistics from the sidecar file at ``path``, if it exists.
+
+		Records of entries that are not in ``entries`` are dropped.
+		``entries`` is copied into a set, unless it's already a set (such as :class:`.sqlite_store.EntrySet`).
+		"""
+		existing_entries=entries if isinstance(entries, collections.abc.Set) else {*entries}
+		records: Dict[Entry, List[float]]={}
+		try:
+			with open(path, "r", encoding="u8") as f:
+				data=json.load(f)
+		except FileNotFoundError:
+			data={"version": 1, "entries": []}
+		version=data.get("version", 1)
+		assert version==1, f"Unsupported usage file version: {version}"
+		for translation, description, brief, count, last_time in data["entries"]:
+			entry=Entry(translation=translation, description=description, brief=tuple(brief))
+			if entry in existing_entries:
+				records[entry]=[count, last_time]
+		with self._lock:
+			self.path=path
+			self._records=records
+			self._hot=None
+			self._dirty=False
+
+	def save(self)->None:
+		"""
+		Save the statistics to the sidecar file now, if there's any unsaved change.
+		"""
+		with self._lock:
+			if self._timer is not None:
+				self._timer.cancel()
+				self._timer=None
+			if not self._dirty or self.path is None:
+				return
+			path=self.path
+			data=[
+					[entry.translation, entry.description, entry.brief, count, int(last_time)]
+					for entry, (count, last_time) in self._records.items()
+					]
+			self._dirty=False
+		temporary_path=path+".tmp"
+		with open(temporary_path, "w", encoding="u8") as f:
+			f.write('{"version": 1, "entries": [\n' +
+					",\n".join(json.dumps(record, ensure_ascii=False) for record in data) +
+					'\n]}\n')
+		os.replace(temporary_path, path)
+
+	def _changed(self)->None:
+		"""
+		Must be called with the lock held.
+		"""
+		self._hot=None
+		self._dirty=True
+		if self._timer is None and self.path is not None:
+			self._timer=threading.Timer(SAVE_DELAY, self.save)
+			self._timer.daemon=True
+			self._timer.start()
+
+	def record(self, entry: Entry, now: Optional[float]=None)->None:
+		"""
+		Record that the entry is picked.
+		"""
+		if now is None: now=time.time()
+		with self._lock:
+			record=self._records.setdefault(entry, [0, now])
+			record[0]+=1
+			record[1]=now
+			self._changed()
+
+	def rename(self, old: Entry, new: Entry)->None:
+		"""
+		Move the statistics of ``old`` to ``new`` (when the entry is edited).
+		"""
+		with self._lock:
+			if old in self._records:
+				self._records[new]=self._records.pop(old)
+				self._changed()
+
+	def discard(self, entry: Entry)->None:
+		with self._lock:
+			if self._records.pop(entry, None) is not None:
+				self._changed()
+
+	def _weight(self, record: List[float], now: float)->float:
+		count, last_time=record
+		return count*0.5**(max(now-last_time, 0)/HALF_LIFE)
+
+	def boosts(self, now: Optional[float]=None)->Dict[Entry, float]:
+		"""
+		Return the value to add to the match score of each entry that has been picked.
+		"""
+		if now is None: now=time.time()
+		with self._lock:
+			return {
+					entry: min(MAX_BOOST, 5*math.log2(1+self._weight(record, now)))
+					for entry, record in self._records.items()
+					}
+
+	def hot(self)->List[Entry]:
+		"""
+		Return the (at most :const:`HOT_SIZE`) entries with the highest weight, highest first.
+		"""
+		with self._lock:
+			if self._hot is None:
+				now=time.time()
+				self._hot=sorted(
+						self._records,
+						key=lambda entry: self._weight(self._records[entry], now),
+						reverse=True)[:HOT_SIZE]
+			return self._hot
@@ -0,0 +1,55 @@
+"""
+Property tests of :func:`plover_search_translation.dictionary.edit_distance_mod_packed`
+against the reference implementation :func:`plover_search_translation.dictionary.edit_distance_mod`.
+"""
+
+import random
+
+import pytest
+
+from plover_search_translation.dictionary import edit_distance_mod, edit_distance_mod_packed
+
+
+def random_string(rng: random.Random, alphabet: str, max_length: int)->str:
+	return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, max_length)))
+
+
+def check(query: str, description: str)->None:
+	assert edit_distance_mod_packed(query, description)==edit_distance_mod(query, description), (query, description)
+
+
+@pytest.mark.parametrize("query", ["", "a", "ab", "abc abc"])
+def test_empty_description(query: str)->None:
+	check(query, "")
+
+
+@pytest.mark.parametrize("description", ["", "a", "ba", "abc abc"])
+def test_empty_query(description: str)->None:
+	check("", description)
+
+
+# small alphabets, so that there are many matches and consecutive matches
+@pytest.mark.parametrize("alphabet", ["a", "ab", "abc", "ab c", "aé✓ ", "abcdefghijklmnoprstuvwy"])
+def test_random(alphabet: str)->None:
+	rng=random.Random(alphabet)
+	for _ in range(2000):
+		check(random_string(rng, alphabet, 12), random_string(rng, alphabet, 30))
+
+
+@pytest.mark.parametrize("length", [63, 64, 65, 200, 1000])
+def test_longer_than_machine_word(length: int)->None:
+	"""
+	The fields of all the characters of the description don't fit in a machine word.
+	"""
+	rng=random.Random(length)
+	for alphabet in ("ab", "ab c", "abcdefghij "):
+		for _ in range(50):
+			description="".join(rng.choice(alphabet) for _ in range(length))
+			check(random_string(rng, alphabet, 12), description)
+			check(description[rng.randrange(length):][:rng.randint(1, 12)], description)
+
+
+def test_repeated_characters()->None:
+	for query_length in range(8):
+		for description_length in range(70):
+			check("a"*query_length, "a"*description_length)
@@ -0,0 +1,53 @@
+"""
+Tests of the search indexes (see :mod:`plover_search_translation.index`).
+"""
+
+import random
+import time
+from typing import List, Optional, Tuple
+
+from plover_search_translation.index import BKTree, outline_distance, outline_key_bits
+from plover_search_translation.lib import Entry
+from plover_search_translation.scripts.benchmark import random_stroke
+
+
+def linear_scan(entries: List[Entry], outline: Tuple[str, ...], max_distance: int)->List[Tuple[int, Entry]]:
+	strokes=outline_key_bits(outline)
+	result=[(outline_distance(strokes, outline_key_bits(entry.brief)), entry) for entry in entries]
+	return sorted(((distance, entry) for distance, entry in result if distance<=max_distance),
+			key=lambda item: (item[0], item[1].brief))
+
+
+def wait_within(tree: BKTree, outline: Tuple[str, ...], max_distance: int)->List[Tuple[int, Entry]]:
+	deadline=time.monotonic()+10
+	while True:
+		result: Optional[List[Tuple[int, Entry]]]=tree.within(outline, max_distance)
+		if result is not None: return result
+		assert time.monotonic()<deadline
+		time.sleep(0.01)
+
+
+def test_bk_tree_rebuilt_after_removals()->None:
+	"""
+	Once more than half of the nodes are removed, the tree is rebuilt in the background,
+	and the modifications made in the meantime are kept.
+	"""
+	rng=random.Random(0)
+	briefs={(random_stroke(rng), random_stroke(rng)) for _ in range(2000)}
+	entries=[Entry(f"t{i}", f"d{i}", brief) for i, brief in enumerate(sorted(briefs))]
+	tree=BKTree()
+	tree.start_build(entries)()
+
+	rng.shuffle(entries)
+	removed, kept=entries[:len(entries)*2//3], entries[len(entries)*2//3:]
+	for entry in removed:
+		tree.remove(entry)
+	added=[Entry("new", "new", ("TPH-U", "-PBLG"))]
+	tree.add(added[0])
+	for entry in kept[:10]:
+		tree.remove(entry)
+
+	expected=kept[10:]+added
+	for entry in rng.sample(expected, 20):
+		assert wait_within(tree, entry.brief, 2)==linear_scan(expected, entry.brief, 2)
+	assert tree._removed_count*2<=tree._size
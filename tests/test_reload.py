@@ -0,0 +1,56 @@
+"""
+Tests of :meth:`plover_search_translation.dictionary.Dictionary.reload_if_changed`.
+"""
+
+import os
+import pathlib
+from typing import List
+
+import pytest
+
+from plover_search_translation.dictionary import Dictionary
+from plover_search_translation.jst import write_jst
+from plover_search_translation.lib import Entry
+
+
+ENTRIES=[Entry("one", "first", ("WUPB",)), Entry("two", "second", ("TWO",))]
+
+
+def load(path: pathlib.Path)->Dictionary:
+	with open(path, "w", encoding="u8") as f:
+		write_jst(f, {"search_stroke": "", "accept_stroke": ""}, ENTRIES)
+	dictionary=Dictionary.load(str(path))
+	dictionary.wait_for_indexes()
+	return dictionary
+
+
+def test_external_modification(tmp_path: pathlib.Path)->None:
+	path=tmp_path/"dictionary.jst"
+	dictionary=load(path)
+	os.utime(path, ns=(0, 0))
+	with open(path, "w", encoding="u8") as f:
+		write_jst(f, dictionary._header(), [ENTRIES[0], Entry("three", "third", ("THRAOE",))])
+	assert dictionary.reload_if_changed()
+	assert dictionary.entries==[ENTRIES[0], Entry("three", "third", ("THRAOE",))]
+
+
+def test_not_reloaded_while_saving(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch)->None:
+	"""
+	Plover writes a temporary file then replaces the file: in between, the old file must not be reloaded.
+	"""
+	path=tmp_path/"dictionary.jst"
+	dictionary=load(path)
+	new_entry=Entry("three", "third", ("THRAOE",))
+	assert dictionary.add(new_entry)
+
+	reloaded_while_saving: List[bool]=[]
+	original_save=Dictionary._save
+	def save(self: Dictionary, filename: str)->None:
+		original_save(self, filename)
+		assert filename!=str(path)
+		reloaded_while_saving.append(self.reload_if_changed())
+	monkeypatch.setattr(Dictionary, "_save", save)
+	dictionary.save()
+	assert reloaded_while_saving==[False]
+	assert not dictionary.reload_if_changed()
+	assert new_entry in dictionary.entries
@@ -0,0 +1,64 @@
+"""
+Tests of the scorers (see :mod:`plover_search_translation.scorer`) against the original scoring rule,
+:func:`plover_search_translation.scripts.benchmark.reference_match_score`, on a fixed dictionary.
+"""
+
+from typing import Any, List
+
+import pytest
+
+from plover_search_translation.lib import Entry
+from plover_search_translation.scorer import Query, Scorer, get_scorer
+from plover_search_translation.scripts.benchmark import random_entries, random_queries, reference_match_score
+
+
+RESULT_COUNT: int=100
+
+ENTRIES: List[Entry]=random_entries(3000)
+
+QUERIES: List[str]=[
+		*random_queries(ENTRIES, 40),
+		ENTRIES[0].translation,
+		ENTRIES[1].description,
+		"/".join(next(entry for entry in ENTRIES if entry.brief).brief),
+		"ab",
+		"a b c",
+		"",
+		]
+
+
+def reference_scores(query: str)->List[Any]:
+	return [reference_match_score(query, entry) for entry in ENTRIES]
+
+
+def ranking(scores: List[Any])->List[int]:
+	"""
+	Return the indices of the best entries, best first (the ties are in dictionary order, like the search).
+	"""
+	return sorted(range(len(scores)), key=scores.__getitem__, reverse=True)[:RESULT_COUNT]
+
+
+def score(scorer: Scorer, query: str)->List[Any]:
+	return scorer.score_batch(Query.compile(query), ENTRIES, {})
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_fuzzywuzzy(query: str)->None:
+	assert ranking(score(get_scorer("fuzzywuzzy"), query))==ranking(reference_scores(query))
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_rapidfuzz(query: str)->None:
+	"""
+	The similarities of the rapidfuzz scorer are not rounded, so the entries whose rounded similarities are equal
+	might be ordered differently, but the ranking must be consistent with the reference scores.
+	"""
+	try:
+		scorer=get_scorer("rapidfuzz")
+	except RuntimeError:
+		pytest.skip("rapidfuzz is not installed")
+	expected=reference_scores(query)
+	result=ranking(score(scorer, query))
+	result_scores=[expected[i] for i in result]
+	assert result_scores==sorted(result_scores, reverse=True)
+	assert result_scores==[expected[i] for i in ranking(expected)]
@@ -0,0 +1,32 @@
+"""
+Tests of the search (see :class:`plover_search_translation.search.Searcher`) on small dictionaries.
+"""
+
+from typing import List
+
+from plover_search_translation.lib import Entry
+from plover_search_translation.scripts.benchmark import make_dictionary
+
+
+def brief_query_entries()->List[Entry]:
+	"""
+	An entry whose brief is ``A``, and more than 100 other entries that contain ``A``, half of whose briefs start with it.
+	"""
+	return [Entry("a", "the letter a", ("A",))]+[
+			Entry(f"word{i} a", f"A thing {i}", ("A", f"S{i}") if i%2 else ())
+			for i in range(200)]
+
+
+def test_brief_and_outline_prefix_match()->None:
+	"""
+	The entry whose brief is the query is also an outline prefix match, it must only be returned once.
+	"""
+	entries=brief_query_entries()
+	dictionary=make_dictionary(entries)
+	dictionary._substring_index.start_build(dictionary.entries)()
+	result=dictionary.search("A")
+	assert len(result)==len(set(result))==100
+	assert result[0]==entries[0]
+
+	full_scan=make_dictionary(entries).search("A")  # the substring index is not built
+	assert result==full_scan